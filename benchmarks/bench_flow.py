@@ -0,0 +1,193 @@
+"""
+Benchmarks of the flow engine on synthetic DAGs.
+
+    fan_in loaders --> merge --> (depth tasks --> dump) x width
+
+Each scenario reports items/sec, per-batch overhead (msec)
+and peak memory traced by tracemalloc (KiB).
+
+Usage:
+
+    python benchmarks/bench_flow.py                       # run all
+    python benchmarks/bench_flow.py -k wide --repeat 5    # filter by name
+    python benchmarks/bench_flow.py --save base.json      # save a baseline
+    python benchmarks/bench_flow.py --compare base.json   # exit 1 on regressions
+"""
+import argparse
+from dataclasses import asdict, dataclass
+import gc
+import json
+import math
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from typedflow.flow import Flow
+from typedflow.nodes import DumpNode, LoaderNode, TaskNode
+
+
+@dataclass
+class Scenario:
+    name: str
+    n_items: int = 20000
+    batch_size: int = 64
+    item_size: int = 16
+    fan_in: int = 1
+    width: int = 1
+    depth: int = 1
+    workers: int = 1
+    prefetch: int = 0
+
+    @property
+    def n_batches(self) -> int:
+        return math.ceil(self.n_items / self.batch_size)
+
+
+SCENARIOS: List[Scenario] = [
+    Scenario(name='chain'),
+    Scenario(name='small_batch', batch_size=1, n_items=5000),
+    Scenario(name='large_batch', batch_size=4096, n_items=100000),
+    Scenario(name='large_items', item_size=65536, n_items=2000),
+    Scenario(name='deep', depth=50, n_items=5000),
+    Scenario(name='wide', width=20, n_items=5000),
+    Scenario(name='fan_in', fan_in=8),
+    Scenario(name='diamond', fan_in=4, width=4, depth=4, n_items=10000),
+    Scenario(name='wide_threads', width=8, workers=4, n_items=10000),
+    Scenario(name='pipelined', depth=4, prefetch=2),
+]
+
+
+def make_loader(sc: Scenario) -> LoaderNode[str]:
+    def load() -> Iterator[str]:
+        item: str = 'x' * sc.item_size
+        for _ in range(sc.n_items):
+            yield item
+    return LoaderNode(func=load, batch_size=sc.batch_size)
+
+
+def make_merge(fan_in: int) -> Callable[..., str]:
+    """
+    def merge(a0: str, a1: str, ...) -> str
+    """
+    args: str = ', '.join([f'a{i}: str' for i in range(fan_in)])
+    namespace: Dict[str, Any] = dict()
+    exec(f'def merge({args}) -> str:\n    return a0\n', namespace)
+    return namespace['merge']
+
+
+def make_step() -> Callable[[str], str]:
+    def step(s: str) -> str:
+        return s
+    return step
+
+
+def make_sink() -> Callable[[str], None]:
+    def sink(s: str) -> None:
+        pass
+    return sink
+
+
+def build(sc: Scenario) -> Flow:
+    merge: TaskNode[str] = TaskNode(func=make_merge(sc.fan_in))
+    for i in range(sc.fan_in):
+        merge.set_upstream_node(f'a{i}', make_loader(sc))
+    dumps: List[DumpNode] = []
+    for _ in range(sc.width):
+        last: TaskNode[str] = merge
+        for _ in range(sc.depth):
+            task: TaskNode[str] = TaskNode(func=make_step())
+            task.set_upstream_node('s', last)
+            last = task
+        dump: DumpNode = DumpNode(func=make_sink())
+        dump.set_upstream_node('s', last)
+        dumps.append(dump)
+    return Flow(dump_nodes=dumps)
+
+
+def run_once(sc: Scenario, trace: bool = False) -> Dict[str, float]:
+    flow: Flow = build(sc)
+    gc.collect()
+    if trace:
+        tracemalloc.start()
+    start: float = time.perf_counter()
+    flow.run(workers=sc.workers, prefetch=sc.prefetch)
+    elapsed: float = time.perf_counter() - start
+    result: Dict[str, float] = {'sec': elapsed}
+    if trace:
+        result['peak_kib'] = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+    return result
+
+
+def bench(sc: Scenario, repeat: int) -> Dict[str, float]:
+    """
+    Time is the best of repeat runs. Memory is measured in
+    a separate run because tracing slows down everything.
+    """
+    sec: float = min([run_once(sc)['sec'] for _ in range(repeat)])
+    return {
+        'items_per_sec': sc.n_items / sec,
+        'per_batch_ms': sec / sc.n_batches * 1000,
+        'peak_kib': run_once(sc, trace=True)['peak_kib'],
+    }
+
+
+def compare(results: Dict[str, Dict[str, float]],
+            baseline: Dict[str, Dict[str, float]],
+            tolerance: float) -> List[str]:
+    """
+    Return the names of scenarios which are slower or use more memory
+    than the baseline by more than tolerance
+    """
+    regressions: List[str] = []
+    for name, res in results.items():
+        base: Optional[Dict[str, float]] = baseline.get(name)
+        if base is None:
+            continue
+        speed: float = res['items_per_sec'] / base['items_per_sec']
+        memory: float = res['peak_kib'] / max(base['peak_kib'], 1.)
+        flag: str = ''
+        if speed < 1 - tolerance or memory > 1 + tolerance:
+            regressions.append(name)
+            flag = '  <-- regression'
+        print(f'{name:>16}  speed x{speed:.2f}  memory x{memory:.2f}{flag}')
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-k', dest='keyword', default='', help='run scenarios whose name contains this')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--scale', type=float, default=1., help='multiply the number of items')
+    parser.add_argument('--save', help='save results as a baseline (JSON)')
+    parser.add_argument('--compare', help='compare with a baseline (JSON)')
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    results: Dict[str, Dict[str, float]] = dict()
+    print(f'{"scenario":>16}  {"items/sec":>12}  {"ms/batch":>9}  {"peak KiB":>10}')
+    for sc in SCENARIOS:
+        if args.keyword not in sc.name:
+            continue
+        sc = Scenario(**{**asdict(sc), 'n_items': max(1, int(sc.n_items * args.scale))})
+        res: Dict[str, float] = bench(sc, repeat=args.repeat)
+        results[sc.name] = res
+        print(f'{sc.name:>16}  {res["items_per_sec"]:>12.0f}  '
+              f'{res["per_batch_ms"]:>9.3f}  {res["peak_kib"]:>10.0f}')
+
+    if args.save is not None:
+        with open(args.save, 'w') as fout:
+            json.dump(results, fout, indent=2)
+    if args.compare is not None:
+        with open(args.compare) as fin:
+            baseline: Dict[str, Dict[str, float]] = json.load(fin)
+        print()
+        if len(compare(results, baseline, tolerance=args.tolerance)) > 0:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,3 +5,23 @@
 __author__ = """Wataru Hirota"""
 __email__ = 'audreyr@example.com'
 __version__ = '0.1.0'
+
+import importlib
+from typing import Any, Dict, List
+
+# imported on the first access so that `import typedflow` is instant
+_modules: Dict[str, str] = {
+    'Flow': 'typedflow.flow',
+    'FlowSpec': 'typedflow.spec',
+}
+__all__: List[str] = list(_modules)
+
+
+def __getattr__(name: str) -> Any:
+    try:
+        module: str = _modules[name]
+    except KeyError:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}') from None
+    value: Any = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
@@ -1,14 +1,158 @@
-from dataclasses import dataclass
-from typing import Generic, List, Union
+from dataclasses import dataclass, field
+from typing import Any, Dict, Generic, Iterator, List, Optional, Tuple, Union
 
-from typedflow.exceptions import FaultItem
+from typedflow.exceptions import FAULT, FaultItem
 from typedflow.types import T
 
 
-__all__ = ['Batch']
+__all__ = ['Batch', 'ColumnarBatch']
 
 
 @dataclass
 class Batch(Generic[T]):
+    """
+    faults is a bitmask of the items which are FaultItem
+    (None if it is not known yet), and reasons maps positions of
+    the items which failed in the node producing this batch to short
+    descriptions of the errors.
+    """
     batch_id: int
     data: List[Union[T, FaultItem]]
+    faults: Optional[int] = field(default=None, repr=False)
+    reasons: Dict[int, str] = field(default_factory=dict, repr=False)
+
+    def fault_mask(self) -> int:
+        """
+        faults, scanning the items only when it is not known
+        """
+        if self.faults is None:
+            faults: int = 0
+            for i, item in enumerate(self.data):
+                if item is FAULT:
+                    faults |= 1 << i
+            self.faults: int = faults
+        return self.faults
+
+
+@dataclass
+class ColumnarBatch:
+    """
+    Arguments of a consumer node in the columnar layout,
+    i.e. one list per argument instead of one dict per item.
+
+    faults is a bitmask. The i-th bit is set when the i-th row
+    has a FaultItem in any column.
+    """
+    batch_id: int
+    columns: Dict[str, List[Any]]
+    length: int
+    faults: int = 0
+
+    @classmethod
+    def from_columns(cls,
+                     batch_id: int,
+                     columns: Dict[str, List[Any]],
+                     length: int,
+                     faults: Optional[int] = None) -> 'ColumnarBatch':
+        """
+        Columns longer than length are truncated.
+        Values are scanned for FaultItem only when faults is not given.
+        """
+        columns = {key: col if len(col) == length else col[:length]
+                   for key, col in columns.items()}
+        if faults is None:
+            faults: int = 0  # noqa
+            for col in columns.values():
+                for i, val in enumerate(col):
+                    if val is FAULT:
+                        faults |= 1 << i
+        else:
+            faults &= (1 << length) - 1
+        return cls(batch_id=batch_id, columns=columns, length=length, faults=faults)
+
+    @classmethod
+    def from_batches(cls,
+                     batches: List[Batch],
+                     keys: List[str],
+                     length: int) -> 'ColumnarBatch':
+        """
+        Columns of upstream batches (in the order of keys).
+        Their fault masks are merged without looking at the values.
+        """
+        faults: int = 0
+        for batch in batches:
+            faults |= batch.fault_mask()
+        return cls.from_columns(batch_id=batches[0].batch_id,
+                                columns={key: batch.data for key, batch in zip(keys, batches)},
+                                length=length,
+                                faults=faults)
+
+    @classmethod
+    def from_rows(cls,
+                  batch: Batch[Union[Dict[str, Any], FaultItem]],
+                  keys: Optional[List[str]] = None) -> 'ColumnarBatch':
+        """
+        Convert a batch of kwargs. A row which is FaultItem itself
+        is regarded as a fault. Columns are named after the keys of
+        the first valid row, or keys if all the rows are faults.
+        """
+        keys: List[str] = list(keys or [])
+        for item in batch.data:
+            if item is not FAULT:
+                keys = list(item.keys())
+                break
+        columns: Dict[str, List[Any]] = {
+            key: [FAULT if item is FAULT else item[key]
+                  for item in batch.data]
+            for key in keys}
+        return cls.from_columns(batch_id=batch.batch_id,
+                                columns=columns,
+                                length=len(batch.data),
+                                # without columns, faults can't be found in the values
+                                faults=batch.faults if len(keys) > 0 else batch.fault_mask())
+
+    def __len__(self) -> int:
+        return self.length
+
+    def fault_flags(self) -> List[bool]:
+        """
+        Whether each row is a fault
+        """
+        if self.faults == 0:
+            return [False] * self.length
+        bits: str = bin(self.faults)[:1:-1]
+        return [i < len(bits) and bits[i] == '1' for i in range(self.length)]
+
+    def valid_positions(self) -> List[int]:
+        if self.faults == 0:
+            return list(range(self.length))
+        return [i for i, fault in enumerate(self.fault_flags()) if not fault]
+
+    def keys(self) -> List[str]:
+        return list(self.columns.keys())
+
+    def iter_args(self) -> Iterator[Tuple[Any, ...]]:
+        """
+        Values of each row in the order of keys()
+        (empty tuples if there are no columns)
+        """
+        if len(self.columns) == 0:
+            return iter([()] * self.length)
+        return zip(*self.columns.values())
+
+    def select(self, positions: List[int]) -> Dict[str, List[Any]]:
+        """
+        Columns of the given rows. No copy when all the rows are selected.
+        """
+        if len(positions) == self.length:
+            return self.columns
+        return {key: [col[i] for i in positions]
+                for key, col in self.columns.items()}
+
+    @property
+    def data(self) -> List[Dict[str, Any]]:
+        """
+        Materialize rows as kwargs (for compatibility with Batch)
+        """
+        keys: List[str] = self.keys()
+        return [dict(zip(keys, args)) for args in self.iter_args()]
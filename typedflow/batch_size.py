@@ -0,0 +1,107 @@
+"""
+Batch size which adapts to the observed latency and memory
+"""
+from dataclasses import dataclass, field
+import logging
+import math
+import threading
+from typing import Dict, List, Optional
+
+
+__all__ = ['AdaptiveBatchSize', ]
+logger = logging.getLogger(__file__)
+
+
+@dataclass
+class AdaptiveBatchSize:
+    """
+    Batch size shared by all the loaders of a flow.
+    After each batch, the size of the following batches is scaled toward
+    target_latency (sec to process and dump a batch) and/or max_memory
+    (bytes of the items loaded for a batch), whichever is tighter.
+
+    The size of a batch_id is fixed when a loader asks it first,
+    so all the loaders produce the batch with the same size.
+
+    Parameters
+    -----
+    initial
+        The first size. If None, batch_size of loaders is used.
+    max_step
+        The maximum ratio of a change at a time
+    """
+    target_latency: Optional[float] = None
+    max_memory: Optional[int] = None
+    initial: Optional[int] = None
+    min_size: int = 1
+    max_size: int = 1 << 16
+    max_step: float = 2.
+    _size: int = field(init=False, repr=False)
+    _sizes: Dict[int, int] = field(default_factory=dict, repr=False)  # batch_id -> size
+    _memory: Dict[int, int] = field(default_factory=dict, repr=False)  # batch_id -> bytes
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def __post_init__(self):
+        assert self.target_latency is not None or self.max_memory is not None, \
+            'Either target_latency or max_memory is required'
+        assert 0 < self.min_size <= self.max_size
+        assert self.max_step > 1
+        self._size: int = self._clip(self.initial or self.min_size)
+
+    def _clip(self, size: int) -> int:
+        return max(self.min_size, min(self.max_size, size))
+
+    def start(self, batch_size: int) -> None:
+        """
+        Called before a run with batch_size of loaders
+        """
+        with self._lock:
+            self._size = self._clip(self.initial or batch_size)
+            self._sizes.clear()
+            self._memory.clear()
+
+    @property
+    def current(self) -> int:
+        return self._size
+
+    def size_of(self, batch_id: int) -> int:
+        with self._lock:
+            if batch_id not in self._sizes:
+                self._sizes[batch_id] = self._size
+            return self._sizes[batch_id]
+
+    def record_memory(self,
+                      batch_id: int,
+                      size: int) -> None:
+        """
+        Called by loaders with the (estimated) bytes of a loaded batch
+        """
+        with self._lock:
+            self._memory[batch_id] = self._memory.get(batch_id, 0) + size
+
+    def observe(self,
+                batch_id: int,
+                latency: float) -> None:
+        """
+        Called when a batch has been processed. Loaders have
+        already loaded it, so records up to batch_id are discarded.
+        """
+        with self._lock:
+            size: int = self._sizes.get(batch_id, self._size)
+            memory: int = self._memory.get(batch_id, 0)
+            for old in [key for key in self._sizes if key <= batch_id]:
+                del self._sizes[old]
+            for old in [key for key in self._memory if key <= batch_id]:
+                del self._memory[old]
+            ratios: List[float] = []
+            if self.target_latency is not None and latency > 0:
+                ratios.append(self.target_latency / latency)
+            if self.max_memory is not None and memory > 0:
+                ratios.append(self.max_memory / memory)
+            if len(ratios) == 0:
+                return
+            ratio: float = max(1 / self.max_step, min(self.max_step, min(ratios)))
+            new_size: int = self._clip(math.ceil(size * ratio) if ratio > 1 else int(size * ratio))
+            if new_size != self._size:
+                logger.debug(f'batch size: {self._size} -> {new_size}')
+            self._size = new_size
@@ -0,0 +1,131 @@
+"""
+Flow-wide bound of the data in flight
+"""
+from dataclasses import dataclass, field
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+from typedflow.exceptions import StallError
+from typedflow.nodes import ProviderNode
+
+
+__all__ = ['FlowBudget', ]
+logger = logging.getLogger(__file__)
+
+
+@dataclass
+class FlowBudget:
+    """
+    Bounds the batches in flight, i.e. loaded but not dumped yet,
+    and the bytes of values held in memory by the cache tables of all the nodes.
+    A new batch is loaded only when both are under the limits
+    (or nothing is in flight, so that a flow always makes progress).
+    Otherwise loading blocks until downstream nodes release their inputs.
+
+    If nothing is released for stall_timeout sec while loading is blocked,
+    StallError with a report of what each node holds is raised.
+
+    Parameters
+    -----
+    max_memory
+        Bytes (estimated by `CacheTable.sizeof`)
+    max_in_flight
+        The number of batches
+    """
+    max_memory: Optional[int] = None
+    max_in_flight: Optional[int] = None
+    stall_timeout: float = 60.
+    _cond: threading.Condition = field(default_factory=threading.Condition, repr=False, compare=False)
+    _memory: int = field(default=0, repr=False)
+    _usage: Dict[str, int] = field(default_factory=dict, repr=False)  # node name -> bytes
+    _in_flight: Set[int] = field(default_factory=set, repr=False)
+    _last_progress: float = field(default_factory=time.perf_counter, repr=False)
+
+    def __post_init__(self):
+        assert self.max_memory is None or self.max_memory > 0
+        assert self.max_in_flight is None or self.max_in_flight > 0
+        assert self.stall_timeout > 0
+
+    def attach(self, names: Dict[str, ProviderNode]) -> None:
+        """
+        Account the cache tables of the nodes
+        """
+        for name, node in names.items():
+            node.cache_table.tracker = self
+            node.cache_table.tracker_key = name
+            self._usage.setdefault(name, 0)
+
+    def add(self,
+            key: str,
+            size: int) -> None:
+        with self._cond:
+            self._memory += size
+            self._usage[key] = self._usage.get(key, 0) + size
+
+    def release(self,
+                key: str,
+                size: int) -> None:
+        with self._cond:
+            self._memory -= size
+            self._usage[key] = self._usage.get(key, 0) - size
+            self._last_progress = time.perf_counter()
+            self._cond.notify_all()
+
+    def memory(self) -> int:
+        return self._memory
+
+    def in_flight(self) -> List[int]:
+        with self._cond:
+            return sorted(self._in_flight)
+
+    def _has_room(self) -> bool:
+        if len(self._in_flight) == 0:
+            return True
+        if self.max_in_flight is not None and len(self._in_flight) >= self.max_in_flight:
+            return False
+        if self.max_memory is not None and self._memory >= self.max_memory:
+            return False
+        return True
+
+    def report(self) -> str:
+        with self._cond:
+            usage: str = ', '.join([f'{name}: {size}' for name, size in self._usage.items() if size > 0])
+            return (f'batches in flight: {sorted(self._in_flight)} (max {self.max_in_flight}), '
+                    f'bytes in memory: {self._memory} (max {self.max_memory}), '
+                    f'by node: {{{usage}}}')
+
+    def admit(self,
+              batch_id: int,
+              timeout: Optional[float] = None) -> bool:
+        """
+        Wait until the batch can be loaded and register it as in flight.
+        Return False if it cannot be loaded within timeout.
+        """
+        with self._cond:
+            if len(self._in_flight) == 0:
+                self._last_progress = time.perf_counter()
+            deadline: Optional[float] = None if timeout is None else time.perf_counter() + timeout
+            while not self._has_room():
+                stalled: float = time.perf_counter() - self._last_progress
+                if stalled >= self.stall_timeout:
+                    raise StallError(f'Loading batch {batch_id} has been blocked for {stalled:.1f} sec. '
+                                     + self.report())
+                wait: float = self.stall_timeout - stalled
+                if deadline is not None:
+                    wait = min(wait, deadline - time.perf_counter())
+                    if wait <= 0:
+                        return False
+                self._cond.wait(timeout=wait)
+            self._in_flight.add(batch_id)
+            return True
+
+    def done(self, batch_id: int) -> None:
+        """
+        Called when all the dump nodes have dumped the batch
+        """
+        with self._cond:
+            self._in_flight.discard(batch_id)
+            self._last_progress = time.perf_counter()
+            self._cond.notify_all()
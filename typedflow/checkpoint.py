@@ -0,0 +1,85 @@
+"""
+Checkpoint of the progress of a flow, which allows to resume
+a flow after the last batch that was fully dumped.
+"""
+from dataclasses import dataclass
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Union
+
+from typedflow.nodes import LoaderNode
+from typedflow.plan import ExecutionPlan
+
+
+__all__ = ['Checkpointer', ]
+logger = logging.getLogger(__file__)
+
+
+@dataclass
+class Checkpointer:
+    """
+    Saves the last batch_id whose outputs have been dumped by all the
+    dump nodes, and the item offsets of loaders and the positions of
+    dump nodes (`DumpNode.position`) at that time.
+
+    Parameters
+    -----
+    path
+        JSON file. It is replaced atomically.
+    every
+        Save every this many batches
+    """
+    path: Union[str, Path]
+    every: int = 1
+
+    def __post_init__(self):
+        assert self.every > 0, 'every should be positive'
+
+    def _loader_keys(self, plan: ExecutionPlan) -> Dict[str, LoaderNode]:
+        return {plan.names[id(node)]: node for node in plan.loaders}
+
+    def save(self,
+             plan: ExecutionPlan,
+             batch_id: int,
+             force: bool = False) -> None:
+        """
+        Called when batch_id has been dumped. Buffers of dump nodes
+        are flushed first so that the dumped rows are not lost on resume.
+        """
+        if not force and (batch_id + 1) % self.every != 0:
+            return
+        for node in plan.dump_nodes:
+            node.flush()
+        state: Dict[str, Any] = {
+            'batch_id': batch_id,
+            'nodes': [plan.names[id(node)] for node in plan.order],
+            'loaders': {key: loader.offset_after(batch_id)
+                        for key, loader in self._loader_keys(plan).items()},
+            'dumps': {plan.names[id(node)]: node.position() for node in plan.dump_nodes},
+        }
+        tmp: Path = Path(f'{self.path}.tmp')
+        with open(tmp, 'w') as fout:
+            json.dump(state, fout)
+        os.replace(tmp, self.path)
+
+    def restore(self, plan: ExecutionPlan) -> int:
+        """
+        Move loaders to the position after the checkpoint, let dump nodes
+        resume from their positions, and return the batch_id to start from
+        (0 if there are no checkpoints).
+        """
+        if not Path(self.path).exists():
+            return 0
+        with open(self.path) as fin:
+            state: Dict[str, Any] = json.load(fin)
+        keys: List[str] = [plan.names[id(node)] for node in plan.order]
+        assert keys == state['nodes'], f'The checkpoint {self.path} was saved for another flow'
+        start: int = state['batch_id'] + 1
+        for key, loader in self._loader_keys(plan).items():
+            loader.skip_to(batch_id=start, offset=state['loaders'][key])
+        for node in plan.dump_nodes:
+            node.resume(state['dumps'][plan.names[id(node)]])
+        logger.info(f'Resume from batch {start}')
+        return start
@@ -1,40 +1,166 @@
 """
 cache that disappears after n times reading
 """
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from typing import Dict, Generic
+import os
+from pathlib import Path
+import pickle
+import shutil
+import sys
+import tempfile
+import threading
+from typing import Any, Callable, Dict, Generic, Optional
 
 from typedflow.types import T, H
 
 
-__all__ = ['CacheTable', ]
+__all__ = ['CacheTable', 'estimate_size']
+
+
+def estimate_size(value: T) -> int:
+    """
+    Rough size of value in bytes (the object itself and its direct items).
+    Batches are measured by their data.
+    """
+    data = getattr(value, 'data', value)
+    size: int = sys.getsizeof(data)
+    if isinstance(data, (list, tuple)):
+        size += sum([sys.getsizeof(item) for item in data])
+    return size
 
 
 @dataclass
 class CacheItem(Generic[T]):
     count: int
-    value: T
+    value: Optional[T]
+    size: int = 0
+    path: Optional[Path] = None  # set if value is spilled to disk
 
 
 @dataclass
 class CacheTable(Generic[H, T]):
+    """
+    Thread-safe. Consumers of an identical producer may read it
+    from different threads.
+
+    If budget (bytes) is set, the least recently used values are pickled
+    into spill_dir when the values in memory exceed the budget.
+    Spilled values are read back from the file on get, and the file
+    is removed on the last read. If spill_dir is None, a temporary directory
+    is created on the first spill and removed by `close`.
+
+    If tracker (`typedflow.budget.FlowBudget`) is set, bytes of values
+    in memory are reported to it with tracker_key.
+
+    on_remove is called with the key when a value is removed
+    (i.e. read life times or overwritten).
+    """
     life: int
     cache_table: Dict[H, CacheItem[T]] = field(default_factory=dict)
+    budget: Optional[int] = None
+    spill_dir: Optional[Path] = None
+    sizeof: Callable[[T], int] = field(default=estimate_size, repr=False, compare=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+    # keys in memory, from the coldest
+    _in_memory: 'OrderedDict[H, None]' = field(default_factory=OrderedDict, repr=False, compare=False)
+    _mem_size: int = field(default=0, repr=False, compare=False)
+    _n_spilled: int = field(default=0, repr=False, compare=False)
+    tracker: Optional[Any] = field(default=None, repr=False, compare=False)
+    tracker_key: str = field(default='', repr=False, compare=False)
+    hits: int = field(default=0, repr=False, compare=False)
+    misses: int = field(default=0, repr=False, compare=False)
+    on_remove: Optional[Callable[[H], None]] = field(default=None, repr=False, compare=False)
+    _own_spill_dir: bool = field(default=False, repr=False, compare=False)
 
-    def get(self, key: H) -> T:
-        item: CacheItem[T] = self.cache_table[key]
-        if item.count == 1:
-            del self.cache_table[key]
-        elif item.count > 1:
-            item.count -= 1
+    def _spill(self) -> None:
+        if self.spill_dir is None:
+            self.spill_dir: Path = Path(tempfile.mkdtemp(prefix='typedflow-'))
+            self._own_spill_dir: bool = True
+        while self._mem_size > self.budget and len(self._in_memory) > 0:
+            key, _ = self._in_memory.popitem(last=False)
+            item: CacheItem[T] = self.cache_table[key]
+            path: Path = Path(self.spill_dir) / f'{id(self)}-{self._n_spilled}.pkl'
+            self._n_spilled += 1
+            with open(path, 'wb') as fout:
+                pickle.dump(item.value, fout, protocol=pickle.HIGHEST_PROTOCOL)
+            item.path = path
+            item.value = None
+            self._mem_size -= item.size
+            if self.tracker is not None:
+                self.tracker.release(self.tracker_key, item.size)
+
+    def _load(self, item: CacheItem[T]) -> T:
+        with open(item.path, 'rb') as fin:
+            return pickle.load(fin)
+
+    def _remove(self, key: H) -> None:
+        item: CacheItem[T] = self.cache_table.pop(key)
+        if item.path is not None:
+            os.remove(item.path)
         else:
-            raise AssertionError()
-        return item.value
+            self._in_memory.pop(key, None)
+            self._mem_size -= item.size
+            if self.tracker is not None:
+                self.tracker.release(self.tracker_key, item.size)
+        if self.on_remove is not None:
+            self.on_remove(key)
+
+    def get(self, key: H) -> T:
+        with self._lock:
+            try:
+                item: CacheItem[T] = self.cache_table[key]
+            except KeyError:
+                self.misses += 1
+                raise
+            self.hits += 1
+            value: T = item.value if item.path is None else self._load(item)
+            if item.count == 1:
+                self._remove(key)
+            elif item.count > 1:
+                item.count -= 1
+                if key in self._in_memory:
+                    self._in_memory.move_to_end(key)
+            else:
+                raise AssertionError()
+            return value
 
     def set(self,
             key: H,
             value: T) -> None:
-        self.cache_table[key] = CacheItem(count=self.life, value=value)
+        with self._lock:
+            if key in self.cache_table:
+                self._remove(key)
+            if self.budget is None and self.tracker is None:
+                self.cache_table[key] = CacheItem(count=self.life, value=value)
+                return
+            size: int = self.sizeof(value)
+            self.cache_table[key] = CacheItem(count=self.life, value=value, size=size)
+            self._in_memory[key] = None
+            self._mem_size += size
+            if self.tracker is not None:
+                self.tracker.add(self.tracker_key, size)
+            if self.budget is not None and self._mem_size > self.budget:
+                self._spill()
+
+    def close(self) -> None:
+        """
+        Remove the spilled values, and the spill directory if the table created it.
+        Called by Flow at the end of a run.
+        """
+        with self._lock:
+            for key in [key for key, item in self.cache_table.items() if item.path is not None]:
+                self._remove(key)
+            if self._own_spill_dir:
+                shutil.rmtree(self.spill_dir, ignore_errors=True)
+                self.spill_dir: Optional[Path] = None
+                self._own_spill_dir: bool = False
+
+    def memory_size(self) -> int:
+        """
+        Estimated bytes of values in memory (counted only if budget or tracker is set)
+        """
+        return self._mem_size
 
     def __len__(self) -> int:
         return len(self.cache_table)
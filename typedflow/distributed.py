@@ -0,0 +1,307 @@
+"""
+Sharded execution of a flow over worker processes (possibly on other hosts).
+
+A Coordinator splits batch ids into shards of `shard_size` batches
+and hands them to workers connected by `multiprocessing.connection`.
+Each worker builds the same DAG with `flow_factory(shard)` and runs
+batches [shard.start, shard.stop) of it. Outputs can be written per shard
+(e.g. to a file named after shard.index) and merged in the index order.
+
+Loaders skip the items before shard.start, so give them `seek`
+for the throughput to scale with the number of workers. The file loaders
+seek in uncompressed files (except RecordLoaderNode without record_size),
+and compressed ones are read from the beginning in every shard.
+
+Run a worker on another host with
+
+    python -m typedflow.distributed --address host:port --authkey KEY --factory module:make_flow
+"""
+import argparse
+from collections import deque
+from dataclasses import dataclass, field
+import logging
+import multiprocessing
+from multiprocessing import AuthenticationError, Process
+from multiprocessing.connection import Client, Connection, Listener
+import os
+import socket
+import threading
+import traceback
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from typedflow.flow import Flow
+from typedflow.utils import import_string
+
+
+__all__ = ['Coordinator', 'Shard', 'run_local', 'work']
+logger = logging.getLogger(__file__)
+
+
+@dataclass(frozen=True)
+class Shard:
+    """
+    Batches [start, stop) of a flow
+    """
+    index: int
+    start: int
+    stop: int
+
+
+@dataclass
+class Coordinator:
+    """
+    Parameters
+    -----
+    address
+        (host, port) to listen. Port 0 picks a free port,
+        and address is updated to the actual one.
+    authkey
+        Shared with workers. Random by default.
+    shard_size
+        The number of batches in a shard
+    max_retries
+        How many times a shard is handed out again when its worker
+        disconnects before finishing it
+    """
+    address: Tuple[str, int] = ('localhost', 0)
+    authkey: bytes = field(default_factory=lambda: os.urandom(16), repr=False)
+    shard_size: int = 16
+    max_retries: int = 2
+    _listener: Listener = field(init=False, repr=False)
+    _cond: threading.Condition = field(default_factory=threading.Condition, repr=False)
+    _next_index: int = field(default=0, repr=False)
+    _end: Optional[int] = field(default=None, repr=False)  # no shards from this index have data
+    _retry: Deque[int] = field(default_factory=deque, repr=False)
+    _n_retries: Dict[int, int] = field(default_factory=dict, repr=False)
+    _running: Set[int] = field(default_factory=set, repr=False)
+    _done: Set[int] = field(default_factory=set, repr=False)
+    _errors: List[str] = field(default_factory=list, repr=False)
+    _closed: bool = field(default=False, repr=False)
+    _thread: Optional[threading.Thread] = field(default=None, repr=False)
+
+    def __post_init__(self):
+        assert self.shard_size > 0, 'shard_size should be positive'
+        self._listener: Listener = Listener(self.address, authkey=self.authkey)
+        self.address: Tuple[str, int] = self._listener.address
+
+    def _shard(self, index: int) -> Shard:
+        return Shard(index=index, start=index * self.shard_size, stop=(index + 1) * self.shard_size)
+
+    def _next_shard(self) -> Optional[Shard]:
+        """
+        Wait while other workers are running the last shards
+        because they may fail and be handed out again.
+        Return None when all the shards have been processed (or failed).
+        """
+        with self._cond:
+            while True:
+                if len(self._errors) > 0:
+                    return None
+                if len(self._retry) > 0:
+                    index: int = self._retry.popleft()
+                    break
+                if self._end is None or self._next_index < self._end:
+                    index: int = self._next_index  # noqa
+                    self._next_index += 1
+                    break
+                if len(self._running) == 0:
+                    return None
+                self._cond.wait()
+            self._running.add(index)
+            return self._shard(index)
+
+    def _finish(self,
+                shard: Shard,
+                exhausted: bool,
+                empty: bool) -> None:
+        """
+        When the data end exactly at the end of a shard, it is not exhausted
+        but the next one is, without any data
+        """
+        with self._cond:
+            self._running.discard(shard.index)
+            self._done.add(shard.index)
+            if exhausted:
+                end: int = shard.index if empty else shard.index + 1
+                self._end = end if self._end is None else min(self._end, end)
+            self._cond.notify_all()
+
+    def _fail(self,
+              shard: Shard,
+              error: Optional[str]) -> None:
+        """
+        error is None if the worker is disconnected
+        """
+        with self._cond:
+            self._running.discard(shard.index)
+            if error is not None:
+                self._errors.append(error)
+            elif self._n_retries.get(shard.index, 0) < self.max_retries:
+                logger.warning(f'Worker is lost. Shard {shard.index} is handed out again')
+                self._n_retries[shard.index] = self._n_retries.get(shard.index, 0) + 1
+                self._retry.append(shard.index)
+            else:
+                self._errors.append(f'Shard {shard.index} failed {self.max_retries + 1} times')
+            self._cond.notify_all()
+
+    def _serve(self, conn: Connection) -> None:
+        try:
+            while True:
+                shard: Optional[Shard] = self._next_shard()
+                if shard is None:
+                    conn.send(('stop', ))
+                    return
+                try:
+                    conn.send(('run', shard))
+                    message: Tuple[Any, ...] = conn.recv()
+                except (EOFError, OSError):
+                    self._fail(shard, error=None)
+                    return
+                if message[0] == 'done':
+                    self._finish(shard, exhausted=message[1], empty=message[2])
+                else:
+                    self._fail(shard, error=message[1])
+        except (EOFError, OSError):
+            return
+        finally:
+            conn.close()
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                conn: Connection = self._listener.accept()
+            except (OSError, EOFError, AuthenticationError):
+                if self._closed:
+                    return
+                logger.warning(traceback.format_exc())
+                continue
+            if self._closed:
+                conn.close()
+                return
+            threading.Thread(target=self._serve, args=(conn, ), daemon=True).start()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._accept, daemon=True)
+        self._thread.start()
+
+    def finished(self) -> bool:
+        with self._cond:
+            if len(self._errors) > 0:
+                return len(self._running) == 0
+            return self._end is not None and len(self._running) == 0 and len(self._retry) == 0\
+                and all([index in self._done for index in range(self._end)])
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Return whether all the shards have been processed (or failed)
+        """
+        with self._cond:
+            return self._cond.wait_for(self.finished, timeout=timeout)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            # wake up accept() by a connection which fails the authentication
+            try:
+                socket.create_connection(self.address, timeout=1).close()
+            except OSError:
+                pass
+            self._thread.join()
+        self._listener.close()
+
+    def shards(self) -> List[Shard]:
+        """
+        Shards having data in the index order.
+        Raise RuntimeError if any shard failed.
+        """
+        with self._cond:
+            if len(self._errors) > 0:
+                raise RuntimeError('Some shards failed:\n' + '\n'.join(self._errors))
+            return [self._shard(index) for index in sorted(self._done) if index < self._end]
+
+    def run(self) -> List[Shard]:
+        """
+        Serve until all the shards are processed
+        """
+        self.start()
+        try:
+            self.wait()
+        finally:
+            self.close()
+        return self.shards()
+
+
+def work(address: Tuple[str, int],
+         authkey: bytes,
+         flow_factory: Callable[[Shard], Flow],
+         **run_kwargs) -> None:
+    """
+    Run shards given by a coordinator until it says stop.
+    run_kwargs are passed to `Flow.run`.
+    """
+    with Client(address, authkey=authkey) as conn:
+        while True:
+            message: Tuple[Any, ...] = conn.recv()
+            if message[0] == 'stop':
+                return
+            shard: Shard = message[1]
+            try:
+                flow: Flow = flow_factory(shard)
+                flow.run(start=shard.start, stop=shard.stop, **run_kwargs)
+            except Exception:
+                conn.send(('error', f'Shard {shard.index}: {traceback.format_exc()}'))
+                continue
+            # dump nodes are finished when the source is exhausted,
+            # and loaders have no batches if the shard is empty
+            conn.send(('done',
+                       all([node.finished for node in flow.dump_nodes]),
+                       not any([loader.has_batch(shard.start) for loader in flow.graph.loaders])))
+
+
+def run_local(flow_factory: Callable[[Shard], Flow],
+              n_workers: int,
+              shard_size: int = 16,
+              **run_kwargs) -> List[Shard]:
+    """
+    Run a flow on n_workers processes of this machine.
+    flow_factory has to be picklable (i.e. defined at the top level of a module).
+    Workers are spawned (not forked) so that they don't hold the listening socket.
+    """
+    assert n_workers > 0, 'n_workers should be positive'
+    coordinator: Coordinator = Coordinator(shard_size=shard_size)
+    context = multiprocessing.get_context('spawn')
+    workers: List[Process] = [context.Process(target=work,
+                                              args=(coordinator.address, coordinator.authkey, flow_factory),
+                                              kwargs=run_kwargs,
+                                              daemon=True)
+                              for _ in range(n_workers)]
+    for worker in workers:
+        worker.start()
+    coordinator.start()
+    try:
+        while not coordinator.wait(timeout=0.5):
+            if not any([worker.is_alive() for worker in workers]):
+                raise RuntimeError('All the workers exited before the flow finished')
+    finally:
+        coordinator.close()
+        for worker in workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+    return coordinator.shards()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Run a typedflow worker')
+    parser.add_argument('--address', required=True, help='host:port of the coordinator')
+    parser.add_argument('--authkey', required=True)
+    parser.add_argument('--factory', required=True, help='module:function which returns a Flow for a Shard')
+    args = parser.parse_args(argv)
+    host, port = args.address.rsplit(':', 1)
+    work((host, int(port)), args.authkey.encode(), import_string(args.factory))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Where failures of items in tasks are reported
+"""
+from dataclasses import dataclass, field
+import json
+import logging
+from pathlib import Path
+import threading
+import time
+import traceback
+from typing import Any, Dict, IO, Optional
+
+
+__all__ = ['ErrorSink', 'default_sink']
+logger = logging.getLogger(__file__)
+
+
+@dataclass
+class ErrorSink:
+    """
+    Failures are logged with their tracebacks at most `burst` at once
+    and `rate` per second on average (a token bucket). The others are
+    only counted, so a broken source failing thousands of items neither
+    floods the log nor slows down the flow by formatting tracebacks.
+
+    Parameters
+    -----
+    rate
+        Failures logged per second after a burst
+    burst
+        Failures logged at once
+    path
+        If given, logged failures are also appended to it as JSON lines
+        (node, batch_id, row, error, message and traceback)
+    """
+    rate: float = 1.
+    burst: int = 10
+    path: Optional[Path] = None
+    counts: Dict[str, int] = field(default_factory=dict)  # by '<node>: <error type>'
+    suppressed: int = 0
+    _tokens: Optional[float] = field(default=None, repr=False)
+    _last: float = field(default_factory=time.monotonic, repr=False)
+    _unlogged: int = field(default=0, repr=False)
+    _handle: Optional[IO] = field(default=None, repr=False, compare=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def __post_init__(self):
+        assert self.rate >= 0, 'rate should not be negative'
+        assert self.burst > 0, 'burst should be positive'
+
+    def _take(self) -> bool:
+        """
+        Whether a failure can be logged now (called with the lock)
+        """
+        now: float = time.monotonic()
+        if self._tokens is None:
+            self._tokens: float = float(self.burst)
+        else:
+            self._tokens = min(float(self.burst), self._tokens + (now - self._last) * self.rate)
+        self._last: float = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def report(self,
+               node: str,
+               batch_id: int,
+               row: Optional[int],
+               error: Exception) -> str:
+        """
+        Record a failure of a row (None for the whole batch)
+        and return its reason kept in `Batch.reasons`
+        """
+        reason: str = f'{type(error).__name__}: {error}'
+        with self._lock:
+            key: str = f'{node}: {type(error).__name__}'
+            self.counts[key] = self.counts.get(key, 0) + 1
+            if not self._take():
+                self.suppressed += 1
+                self._unlogged += 1
+                return reason
+            unlogged, self._unlogged = self._unlogged, 0
+        tb: str = ''.join(traceback.format_exception(type(error), error, error.__traceback__))
+        where: str = f'batch {batch_id}' if row is None else f'row {row} of batch {batch_id}'
+        note: str = '' if unlogged == 0 else f' ({unlogged} failures since the last one were not logged)'
+        logger.warning(f'{node} failed on {where}{note}: {reason}\n{tb}')
+        if self.path is not None:
+            self._write({'node': node, 'batch_id': batch_id, 'row': row,
+                         'error': type(error).__name__, 'message': str(error), 'traceback': tb})
+        return reason
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            if self._handle is None:
+                self._handle: IO = open(self.path, 'a')
+            self._handle.write(json.dumps(record, default=str) + '\n')
+
+    def close(self) -> None:
+        """
+        Log how many failures were not logged. Called by Flow at the end of a run.
+        """
+        with self._lock:
+            if self.suppressed > 0:
+                logger.warning(f'{self.suppressed} failures were not logged. By node and error: {self.counts}')
+                self.suppressed = 0
+                self._unlogged = 0
+            if self._handle is not None:
+                self._handle.close()
+                self._handle: Optional[IO] = None
+
+
+# used by tasks outside any Flow
+default_sink: ErrorSink = ErrorSink()
@@ -1,4 +1,4 @@
-__all__ = ['BatchIsEmpty', 'EndOfBatch', 'FaultItem']
+__all__ = ['BatchIsEmpty', 'CircuitOpenError', 'EndOfBatch', 'FAULT', 'FaultItem', 'StallError']
 
 
 class BatchIsEmpty(Exception):
@@ -9,7 +9,39 @@ class EndOfBatch(Exception):
     pass
 
 
+class CircuitOpenError(Exception):
+    """
+    A call is failed fast by a CircuitBreaker
+    """
+    pass
+
+
+class StallError(Exception):
+    """
+    A flow makes no progress within its budget
+    """
+    pass
+
+
 class FaultItem:
+    """
+    Placeholder of an item which failed. There is only one instance,
+    `FAULT` (`FaultItem()` returns it), so faults can be found by `is`.
+    Why an item failed is kept in `Batch.reasons`.
+    """
+    _instance: 'FaultItem' = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __reduce__(self):
+        return 'FAULT'
+
+    def __repr__(self):
+        return 'FAULT'
+
     def __hash__(self):
         return hash('faultitem')
 
@@ -18,3 +50,6 @@ class FaultItem:
             return True
         else:
             return False
+
+
+FAULT: FaultItem = FaultItem()
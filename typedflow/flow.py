@@ -1,9 +1,24 @@
 from __future__ import annotations
-from dataclasses import dataclass
+import asyncio
+import functools
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
 import logging
-from typing import Deque, Dict, List, Tuple, Type, Union, Set, Generic, get_args, get_origin, Optional
+from pathlib import Path
+import time
+from typing import Any, Callable, Dict, List, Tuple, Type, Union, Set, Generic, get_args, get_origin, Optional
 
-from typedflow.nodes import ConsumerNode, ProviderNode, DumpNode, LoaderNode
+from typedflow.batch import ColumnarBatch
+from typedflow.batch_size import AdaptiveBatchSize
+from typedflow.budget import FlowBudget
+from typedflow.checkpoint import Checkpointer
+from typedflow.errors import ErrorSink
+from typedflow.gc_policy import GCPolicy
+from typedflow.graph import Graph
+from typedflow.nodes import ConsumerNode, ProviderNode, DumpNode, LoaderNode, TaskNode
+from typedflow.pipeline import Pipeline
+from typedflow.plan import ExecutionPlan
+from typedflow.stats import NodeStats, Profiler
 
 __all__ = ['Flow']
 
@@ -12,10 +27,79 @@ logger = logging.getLogger(__file__)
 Node = Union[ProviderNode, ConsumerNode]
 
 
+def _is_inherited(sub: Type, sup: Type) -> bool:
+    """
+    See `Flow.is_inherited`. Results are memoized
+    as long as the types are hashable.
+    """
+    try:
+        return _is_inherited_cached(sub, sup)
+    except TypeError:  # unhashable
+        return _check_inheritance(sub, sup)
+
+
+def _check_inheritance(sub: Type, sup: Type) -> bool:
+    if sub == sup or sub is Any or sup is Any:
+        return True
+    _sub_orig: Optional[Type] = get_origin(sub)
+    if _sub_orig is None:  # i.e. sub_orig is primitive
+        return False
+    sub_orig: Type = _sub_orig
+    _sup_orig: Optional[Type] = get_origin(sup)
+    if _sup_orig is None:
+        return False
+    sup_orig: Type = _sup_orig
+
+    if issubclass(sub_orig, Generic) and issubclass(sup_orig, Generic):
+        # Compare original type
+        if not _is_inherited(sup_orig, sub_orig):
+            return False
+
+        # compare arguments
+        for sub_arg, sup_arg in zip(get_args(sub), get_args(sup)):
+            if not _is_inherited(sub_arg, sup_arg):
+                return False
+    return True
+
+
+_is_inherited_cached: Callable[[Type, Type], bool] = functools.lru_cache(maxsize=4096)(_check_inheritance)
+
+
 @dataclass
 class Flow:
+    """
+    Parameters
+    -----
+    dump_nodes
+        Sinks of the DAG
+    debug
+        If True, exceptions in tasks are raised instead of
+        turning items into FaultItem
+    cache_budget
+        If set, the cache table of each node keeps at most
+        this many bytes in memory and spills the rest to spill_dir
+        (a temporary directory by default). See `CacheTable`.
+    gc_policy
+        When to force garbage collection between batches.
+        Never by default. See `GCPolicy`.
+    error_sink
+        Where tasks report failed items. See `ErrorSink`.
+    """
     dump_nodes: List[DumpNode]
     debug: bool = False
+    cache_budget: Optional[int] = None
+    spill_dir: Optional[Path] = None
+    gc_policy: GCPolicy = field(default_factory=GCPolicy)
+    error_sink: ErrorSink = field(default_factory=ErrorSink)
+    graph: Graph = field(init=False, repr=False, compare=False)
+    _profiler: Optional[Profiler] = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        # the DAG has to be built before the flow
+        self.graph: Graph = Graph(dump_nodes=self.dump_nodes)
+        for node in self.graph.nodes:
+            if isinstance(node, ConsumerNode):
+                node.compile()
 
     def validate(self) -> None:
         """
@@ -27,48 +111,249 @@ class Flow:
     def get_loader_nodes_with_broadcast(self) -> List[LoaderNode]:
         """
         Get load nodes. While node checking, all the debug status
+        (and the cache budget and the error sink unless a task has its own)
         is attachced to all nodes.
         Therefore, this method should pass all the nodes in the DAG.
         """
-        loaders: List[LoaderNode] = []
-        visited: List[Node] = []
-        cands: Deque[Node] = Deque()
-        cands.extend(self.dump_nodes)
-        while True:
-            try:
-                node: Node = cands.pop()
-            except IndexError:
-                return loaders
-            if node in visited:
-                continue
-            else:
-                visited.append(node)
-
+        for node in self.graph.nodes:
             node.debug: bool = self.debug
-            if isinstance(node, LoaderNode):
-                if node not in loaders:
-                    loaders.append(node)
-            else:
-                cands.extend([n for n in node.precs.values()
-                              if n not in visited])
+            if isinstance(node, TaskNode) and node.error_sink is None:
+                node.error_sink: ErrorSink = self.error_sink
+            if isinstance(node, ProviderNode) and self.cache_budget is not None:
+                node.cache_table.budget = self.cache_budget
+                node.cache_table.spill_dir = self.spill_dir
+        return list(self.graph.loaders)
+
+    def _close_transports(self) -> None:
+        """
+        Remove the temporary directories of the transports of tasks
+        (a transport may be shared by tasks)
+        """
+        closed: Set[int] = set()
+        for node in self.graph.nodes:
+            if isinstance(node, TaskNode) and node.transport is not None\
+                    and id(node.transport) not in closed:
+                node.transport.close()
+                closed.add(id(node.transport))
+
+    def _close_cache_tables(self) -> None:
+        for node in self.graph.nodes:
+            if isinstance(node, ProviderNode):
+                node.cache_table.close()
+
+    def _close_error_sinks(self) -> None:
+        """
+        Close the sink of the flow and the ones given to tasks
+        """
+        sinks: List[ErrorSink] = [self.error_sink]
+        for node in self.graph.nodes:
+            if isinstance(node, TaskNode) and node.error_sink is not None\
+                    and all([node.error_sink is not sink for sink in sinks]):
+                sinks.append(node.error_sink)
+        for sink in sinks:
+            sink.close()
+
+    @staticmethod
+    def _dump_all(plan: ExecutionPlan,
+                  accepted: List[Tuple[DumpNode, ColumnarBatch]],
+                  executor: Optional[Executor]) -> None:
+        if executor is None:
+            for node, batch in accepted:
+                plan.dump(node, batch)
+            return
+        futures: List[Future] = [executor.submit(plan.dump, node, batch)
+                                 for node, batch in accepted]
+        for future in futures:
+            future.result()
 
     def run(self,
-            validate: bool = True) -> None:
+            validate: bool = True,
+            prefetch: int = 0,
+            workers: int = 1,
+            checkpoint: Optional[Union[str, Path, Checkpointer]] = None,
+            resume: bool = False,
+            profile: Union[bool, Profiler] = False,
+            adaptive: Optional[AdaptiveBatchSize] = None,
+            budget: Optional[FlowBudget] = None,
+            start: int = 0,
+            stop: Optional[int] = None) -> None:
         """
-        Run flow.
+        Run flow. The DAG is compiled into an ExecutionPlan
+        and each batch is processed in its topological order.
+
+        Parameters
+        -----
+        validate
+            Check types before running
+        prefetch
+            If positive, loading, processing and dumping run
+            in a pipeline whose stages can run ahead of the next stage
+            by `prefetch` batches. See `typedflow.pipeline.Pipeline`.
+        workers
+            If more than 1, independent branches of the DAG
+            (and dump nodes) run at the same time on a thread pool
+            of this size. For CPU-bound tasks, give TaskNode
+            a ProcessPoolExecutor as well.
+        checkpoint
+            A file (or Checkpointer) where the progress is saved
+            after batches are dumped
+        resume
+            Restart from the checkpoint if it exists. Batches which
+            have been dumped are skipped without running any tasks.
+            Loaders having `seek` don't even read the skipped items.
+        profile
+            If True (or a Profiler, which can emit snapshots periodically),
+            each node is measured. See `stats()`.
+        adaptive
+            If given, all the loaders share this batch size, which is
+            adjusted after each batch by the time taken for it.
+            batch_size of loaders is the initial size.
+        budget
+            Bounds the batches in flight and the bytes held by cache tables
+            when stages are pipelined (`prefetch > 0`). Loading blocks
+            (backpressure) until they are under the budget, and StallError
+            is raised if nothing is released for `budget.stall_timeout` sec.
+            Without prefetch, a batch is fully dumped before the next one
+            is loaded, so only one batch is in flight anyway.
+        start, stop
+            Run only batches in [start, stop). Loaders skip the items
+            before start (assuming full batches), which is cheap
+            for loaders having `seek`. See `typedflow.distributed`.
         """
+        assert workers > 0, 'workers should be positive'
+        assert not resume or checkpoint is not None, 'resume requires checkpoint'
+        assert start == 0 or not resume, 'start cannot be given with resume'
+        assert start == 0 or adaptive is None, 'adaptive batch size cannot start from the middle'
         if validate:
             self.validate()
-        batch_id: int = 0
-        while True:
+        loaders: List[LoaderNode] = self.get_loader_nodes_with_broadcast()
+        if adaptive is not None:
+            adaptive.start(batch_size=loaders[0].batch_size)
+            for loader in loaders:
+                loader.sizer = adaptive
+        if profile is True:
+            profile: Profiler = Profiler()
+        self._profiler: Optional[Profiler] = profile or None
+        plan: ExecutionPlan = ExecutionPlan(dump_nodes=self.dump_nodes,
+                                            profiler=self._profiler,
+                                            graph=self.graph)
+        if budget is not None and prefetch > 0:
+            budget.attach({name: node for node, name in zip(self.graph.nodes, self.graph.names)
+                           if isinstance(node, ProviderNode)})
+        if checkpoint is not None and not isinstance(checkpoint, Checkpointer):
+            checkpoint: Checkpointer = Checkpointer(path=checkpoint)
+        if resume:
+            start: int = checkpoint.restore(plan)
+        elif start > 0:
+            for loader in loaders:
+                loader.skip_to(batch_id=start, offset=start * loader.batch_size)
+        callbacks: List[Callable[[int], None]] = [self.gc_policy.after_batch]
+        if checkpoint is not None:
+            callbacks.append(functools.partial(checkpoint.save, plan))
+        if self._profiler is not None:
+            callbacks.append(self._profiler.tick)
+
+        ended: List[int] = []  # the last batch which has been dumped
+
+        def on_batch_end(batch_id: int) -> None:
+            for callback in callbacks:
+                callback(batch_id)
+            ended[:] = [batch_id]
+
+        executor: Optional[Executor] = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+        self.gc_policy.setup()
+        try:
+            if prefetch > 0:
+                Pipeline(plan=plan,
+                         prefetch=prefetch,
+                         executor=executor,
+                         start=start,
+                         stop=stop,
+                         on_batch_end=on_batch_end,
+                         on_batch_processed=adaptive.observe if adaptive is not None else None,
+                         budget=budget).run()
+            else:
+                batch_id: int = start
+                while not plan.finished() and (stop is None or batch_id < stop):
+                    started: float = time.perf_counter()
+                    plan.load(batch_id=batch_id)
+                    self._dump_all(plan,
+                                   plan.process(batch_id=batch_id, executor=executor),
+                                   executor=executor)
+                    if adaptive is not None:
+                        adaptive.observe(batch_id, time.perf_counter() - started)
+                    on_batch_end(batch_id)
+                    batch_id += 1
+            # batches after the last multiple of checkpoint.every
+            if checkpoint is not None and len(ended) > 0:
+                checkpoint.save(plan, ended[0], force=True)
+        finally:
+            for loader in loaders:
+                loader.close()
             for node in self.dump_nodes:
-                node.run_and_dump(batch_id=batch_id)
-            if all([node.finished for node in self.dump_nodes]):
-                return
+                node.close()
+            if executor is not None:
+                executor.shutdown()
+            self._close_cache_tables()
+            self._close_transports()
+            if self._profiler is not None:
+                self._profiler.close()
+            self._close_error_sinks()
+            self.gc_policy.teardown()
+
+    def stats(self) -> Dict[str, NodeStats]:
+        """
+        Stats of each node in the last profiled run (`run(profile=True)`),
+        keyed by the position in the execution plan and the function name.
+        Can be called from another thread while running.
+        """
+        if self._profiler is None:
+            return dict()
+        return self._profiler.stats()
+
+    async def arun(self,
+                   validate: bool = True,
+                   concurrency: int = 16) -> None:
+        """
+        Run flow in the running event loop.
+        `async def` functions and async generator functions are
+        accepted as well as sync ones.
+
+        Parameters
+        -----
+        validate
+            Check types before running
+        concurrency
+            The maximum number of items processed at the same time.
+            This is shared among all the nodes.
+        """
+        assert concurrency > 0, 'concurrency should be positive'
+        if validate:
+            self.validate()
+        loaders: List[LoaderNode] = self.get_loader_nodes_with_broadcast()
+        plan: ExecutionPlan = ExecutionPlan(dump_nodes=self.dump_nodes, graph=self.graph)
+        semaphore: asyncio.Semaphore = asyncio.Semaphore(concurrency)
+        self.gc_policy.setup()
+        try:
+            batch_id: int = 0
+            while not plan.finished():
+                await plan.aload(batch_id=batch_id)
+                for node, batch in await plan.aprocess(batch_id=batch_id, semaphore=semaphore):
+                    await node.adump(batch, semaphore=semaphore)
+                self.gc_policy.after_batch(batch_id)
+                batch_id += 1
+        finally:
+            for loader in loaders:
+                loader.close()
+            for node in self.dump_nodes:
+                node.close()
+            self._close_cache_tables()
+            self._close_error_sinks()
+            self.gc_policy.teardown()
 
     def is_inherited(self, sub: Type, sup: Type) -> bool:
         """
-        This is not a static method in order to be used recursively.
+        Results are memoized over all the flows.
 
         >>> is_inherited(int, object)
         True
@@ -81,57 +366,33 @@ class Flow:
 
         >>> is_inherited(Iterable[int], List[int])
         False
-        """
-        if sub == sup:
-            return True
-        _sub_orig: Optional[Type] = get_origin(sub)
-        if _sub_orig is None:  # i.e. sub_orig is primitive
-            return False
-        sub_orig: Type = _sub_orig
-        _sup_orig: Optional[Type] = get_origin(sup)
-        if _sup_orig is None:
-            return False
-        sup_orig: Type = _sup_orig
-
-        if issubclass(sub_orig, Generic) and issubclass(sup_orig, Generic):
-            # Compare original type
-            if not self.is_inherited(sup_orig, sub_orig):
-                return False
 
-            # compare arguments
-            for sub_arg, sup_arg in zip(get_args(sub), get_args(sup)):
-                if not self.is_inherited(sub_arg, sup_arg):
-                    return False
-        return True
+        >>> is_inherited(int, Any)
+        True
+        """
+        return _is_inherited(sub, sup)
 
     def typecheck(self) -> None:
         """
         Check type consistency with inputs/outputs.
         Return nothing when there are no errors, unless raise AssertionError.
+        Each node is checked once even if it is shared by many consumers.
         """
-        cands: Deque[Tuple[ConsumerNode, Dict[str, ProviderNode]]] = Deque()
-        # initially check all dumps
-        for node in self.dump_nodes:
-            cands.append(
-                (node, {name: ups_node.get_return_type()
-                        for name, ups_node in node.precs.items()}))
-        while True:
-            try:
-                node, ups_dict = cands.pop()
-            except IndexError:
-                break
-            arg_types: Type = node.get_arg_types()
+        return_types: List[Optional[Type]] = [
+            node.get_return_type() if isinstance(node, ProviderNode) else None
+            for node in self.graph.nodes]
+        for node, precs in zip(self.graph.nodes, self.graph.precs):
+            if not isinstance(node, ConsumerNode):
+                continue
+            ups_dict: Dict[str, Type] = {name: return_types[prec] for name, prec in precs.items()}
+            arg_types: Dict[str, Type] = node.call_plan.arg_types
+            if arg_types is None:
+                arg_types = node.get_arg_types()  # raises why type hints cannot be resolved
             keys: Set[str] = set(arg_types.keys())
             assert keys == set(ups_dict.keys()), f'Invalid arguments. Expected: {arg_types}, Actual: {ups_dict}'
             for key in keys:
-                if not self.is_inherited(ups_dict[key], arg_types[key]):
+                if not _is_inherited(ups_dict[key], arg_types[key]):
                     raise AssertionError(f'Invalid type for arg {key}: Expected {arg_types[key]}, Actual {ups_dict[key]}')
-            for new_node in node.precs.values():
-                if isinstance(new_node, ConsumerNode):
-                    cands.append(
-                        (new_node, {name: ups_node.get_return_type()
-                                    for name, ups_node in new_node.precs.items()}))
 
         # check batch_size
-        loaders: List[LoaderNode] = self.get_loader_nodes_with_broadcast()
-        assert len({ld.batch_size for ld in loaders}) == 1
+        assert len({ld.batch_size for ld in self.graph.loaders}) == 1
@@ -0,0 +1,92 @@
+"""
+When a flow runs the garbage collector
+"""
+from dataclasses import dataclass, field
+import gc
+import logging
+import os
+import threading
+from typing import Optional
+
+
+__all__ = ['GCPolicy', ]
+logger = logging.getLogger(__file__)
+
+
+def _rss() -> Optional[int]:
+    """
+    Current resident set size in bytes from /proc (Linux) or psutil if installed.
+    None if neither is available. The peak RSS of `resource.getrusage`
+    is not used because it never decreases after a collection.
+    """
+    try:
+        with open('/proc/self/statm') as fin:
+            return int(fin.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import psutil
+    except ImportError:  # optional
+        return None
+    return psutil.Process().memory_info().rss
+
+
+@dataclass
+class GCPolicy:
+    """
+    Full collections (`gc.collect()`) run only when this policy says.
+    Python's automatic generational collection is not affected.
+    The default is to never force collections.
+
+    Parameters
+    -----
+    every
+        Collect after every this many batches
+    threshold
+        Collect after a batch when RSS (bytes) exceeds this.
+        If RSS stays above it after a collection, the next one runs
+        when RSS grows by 10% more, not after every batch.
+        RSS is read from /proc or by psutil. Without them, it is ignored.
+    freeze
+        Move all the objects created before the first batch
+        (DAG, loaded models, ...) to the permanent generation by `gc.freeze()`
+        so that collections don't traverse them
+    """
+    every: Optional[int] = None
+    threshold: Optional[int] = None
+    freeze: bool = False
+    _n_batches: int = field(default=0, repr=False)
+    _rss_limit: int = field(default=0, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def __post_init__(self):
+        assert self.every is None or self.every > 0, 'every should be positive'
+        assert self.threshold is None or self.threshold > 0, 'threshold should be positive'
+
+    def setup(self) -> None:
+        """
+        Called before the first batch
+        """
+        self._n_batches = 0
+        self._rss_limit = self.threshold or 0
+        if self.threshold is not None and _rss() is None:
+            logger.warning('threshold of GCPolicy is ignored because RSS is not available '
+                           '(no /proc and psutil is not installed)')
+        if self.freeze:
+            gc.collect()
+            gc.freeze()
+
+    def after_batch(self, batch_id: int) -> None:
+        with self._lock:
+            self._n_batches += 1
+            due: bool = self.every is not None and self._n_batches % self.every == 0
+        rss: Optional[int] = None if due or self.threshold is None else _rss()
+        if rss is not None and rss > self._rss_limit:
+            gc.collect()
+            self._rss_limit = max(self.threshold, int((_rss() or 0) * 1.1))
+        elif due:
+            gc.collect()
+
+    def teardown(self) -> None:
+        if self.freeze:
+            gc.unfreeze()
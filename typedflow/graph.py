@@ -0,0 +1,94 @@
+"""
+Indexed model of a DAG. Nodes are identified by their positions
+in a topological order because dataclass nodes are not hashable
+(and comparing them with == walks all of their upstream nodes).
+"""
+from dataclasses import dataclass, field
+import logging
+from typing import Dict, List, Set, Tuple, Union
+
+from typedflow.nodes import ConsumerNode, DumpNode, LoaderNode, ProviderNode
+
+
+__all__ = ['Graph', ]
+logger = logging.getLogger(__file__)
+Node = Union[ProviderNode, ConsumerNode]
+
+
+def _sort_topologically(dump_nodes: List[DumpNode]) -> List[Node]:
+    """
+    Iterative DFS (post-order) from dump nodes, i.e. every node comes
+    after all of its upstream nodes.
+    """
+    order: List[Node] = []
+    visited: Set[int] = set()
+    for root in dump_nodes:
+        if id(root) in visited:
+            continue
+        visited.add(id(root))
+        stack: List[Tuple[Node, List[Node]]] = [(root, list(getattr(root, 'precs', {}).values()))]
+        while len(stack) > 0:
+            node, precs = stack[-1]
+            if len(precs) == 0:
+                stack.pop()
+                order.append(node)
+                continue
+            prec: Node = precs.pop()
+            if id(prec) in visited:
+                continue
+            visited.add(id(prec))
+            stack.append((prec, list(getattr(prec, 'precs', {}).values())))
+    return order
+
+
+def _node_name(index: int, node: Node) -> str:
+    """
+    Position in the topological order and the function name.
+    This is stable as long as the DAG is built in the same way.
+    """
+    return f'{index}:{getattr(node.func, "__qualname__", repr(node.func))}'
+
+
+@dataclass
+class Graph:
+    """
+    Built once from dump nodes.
+
+    nodes
+        All the nodes in a topological order. Indices in this list are node ids.
+    precs
+        Upstream node ids of each node keyed by the argument names
+    succs
+        Downstream node ids of each node (one entry per edge)
+    """
+    dump_nodes: List[DumpNode] = field(repr=False)
+    nodes: List[Node] = field(init=False, repr=False)
+    ids: Dict[int, int] = field(init=False, repr=False)  # id(node) -> node id
+    names: List[str] = field(init=False, repr=False)
+    precs: List[Dict[str, int]] = field(init=False, repr=False)
+    succs: List[List[int]] = field(init=False, repr=False)
+    loaders: List[LoaderNode] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.nodes: List[Node] = _sort_topologically(self.dump_nodes)
+        self.ids: Dict[int, int] = {id(node): i for i, node in enumerate(self.nodes)}
+        self.names: List[str] = [_node_name(i, node) for i, node in enumerate(self.nodes)]
+        self.precs: List[Dict[str, int]] = [
+            {key: self.ids[id(prec)] for key, prec in node.precs.items()}
+            if isinstance(node, ConsumerNode) else dict()
+            for node in self.nodes]
+        self.succs: List[List[int]] = [[] for _ in self.nodes]
+        for i, precs in enumerate(self.precs):
+            for prec in precs.values():
+                self.succs[prec].append(i)
+        self.loaders: List[LoaderNode] = [node for node in self.nodes
+                                          if isinstance(node, LoaderNode)]
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def id_of(self, node: Node) -> int:
+        return self.ids[id(node)]
+
+    def name_of(self, node: Node) -> str:
+        return self.names[self.ids[id(node)]]
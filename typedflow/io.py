@@ -0,0 +1,70 @@
+"""
+Opening (optionally compressed) files for built-in loaders and dump nodes
+"""
+import bz2
+import gzip
+import io
+import lzma
+from pathlib import Path
+from typing import IO, Dict, Optional, Union
+
+
+__all__ = ['infer_compression', 'open_file']
+COMPRESSIONS: Dict[str, str] = {
+    '.gz': 'gzip',
+    '.bz2': 'bz2',
+    '.xz': 'xz',
+    '.zst': 'zstd',
+}
+
+
+def infer_compression(path: Union[str, Path]) -> Optional[str]:
+    return COMPRESSIONS.get(Path(path).suffix)
+
+
+def _open_zstd(path: Union[str, Path],
+               mode: str,
+               **kwargs) -> IO:
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError('zstandard is required for zstd compression')
+    raw: IO[bytes] = open(path, mode.replace('t', '').replace('b', '') + 'b')
+    if 'r' in mode:
+        stream: IO[bytes] = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+    else:
+        stream: IO[bytes] = zstandard.ZstdCompressor().stream_writer(raw, closefd=True)  # noqa
+    if 'b' in mode:
+        return stream
+    return io.TextIOWrapper(stream, **kwargs)
+
+
+def open_file(path: Union[str, Path],
+              mode: str = 'rb',
+              compression: Optional[str] = 'infer',
+              **kwargs) -> IO:
+    """
+    Parameters
+    -----
+    mode
+        'r', 'w' or 'a' followed by 'b' or 't'
+    compression
+        None, 'gzip', 'bz2', 'xz', 'zstd' (requires zstandard) or
+        'infer' (from the suffix of path)
+    kwargs
+        Passed to `open` (e.g. encoding, newline)
+    """
+    assert 'b' in mode or 't' in mode, 'mode should be either binary or text'
+    if compression == 'infer':
+        compression = infer_compression(path)
+    if compression is None:
+        return open(path, mode, **kwargs)
+    elif compression == 'gzip':
+        return gzip.open(path, mode, **kwargs)
+    elif compression == 'bz2':
+        return bz2.open(path, mode, **kwargs)
+    elif compression == 'xz':
+        return lzma.open(path, mode, **kwargs)
+    elif compression == 'zstd':
+        return _open_zstd(path, mode, **kwargs)
+    raise AssertionError(f'Unknown compression: {compression}')
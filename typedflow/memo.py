@@ -0,0 +1,123 @@
+"""
+Persistent, content-addressed store of task results.
+"""
+from dataclasses import dataclass, field
+import hashlib
+import inspect
+import logging
+from pathlib import Path
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, List, Optional, Union
+
+from typedflow.batch import ColumnarBatch
+
+
+__all__ = ['ResultStore', 'func_digest', 'batch_digest']
+logger = logging.getLogger(__file__)
+
+
+def func_digest(func: Callable) -> str:
+    """
+    Identity of a function: its qualified name and a hash of its source.
+    The bytecode is used when the source is not available.
+    """
+    try:
+        src: bytes = inspect.getsource(func).encode()
+    except (OSError, TypeError):
+        code = getattr(func, '__code__', None)
+        src: bytes = code.co_code if code is not None else repr(func).encode()  # noqa
+    name: str = f'{getattr(func, "__module__", "")}.{getattr(func, "__qualname__", repr(func))}'
+    return hashlib.sha256(name.encode() + b'\0' + src).hexdigest()
+
+
+def batch_digest(batch: ColumnarBatch) -> Optional[str]:
+    """
+    Hash of the contents of a batch (batch_id is not included).
+    None if the contents are not picklable.
+    """
+    try:
+        payload: bytes = pickle.dumps((batch.keys(), list(batch.columns.values()), batch.faults),
+                                      protocol=4)
+    except Exception as e:
+        logger.debug(f'Batch {batch.batch_id} is not picklable: {repr(e)}')
+        return None
+    return hashlib.sha256(payload).hexdigest()
+
+
+@dataclass
+class ResultStore:
+    """
+    SQLite file which maps (function, input batch) to the results.
+    If max_bytes is set, the least recently used results are evicted
+    when the total size of results exceeds it.
+
+    A store can be shared among nodes (and threads).
+    """
+    path: Union[str, Path]
+    max_bytes: Optional[int] = None
+    _conn: sqlite3.Connection = field(init=False, repr=False, compare=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def __post_init__(self):
+        self._conn: sqlite3.Connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._conn:
+            self._conn.execute('CREATE TABLE IF NOT EXISTS results '
+                               '(key TEXT PRIMARY KEY, value BLOB, size INTEGER, accessed REAL)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)')
+
+    @staticmethod
+    def make_key(func_id: str,
+                 batch: ColumnarBatch) -> Optional[str]:
+        digest: Optional[str] = batch_digest(batch)
+        if digest is None:
+            return None
+        return hashlib.sha256(f'{func_id}:{digest}'.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[List[Any]]:
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM results WHERE key = ?', (key, )).fetchone()
+            if row is None:
+                return None
+            with self._conn:
+                self._conn.execute('UPDATE results SET accessed = ? WHERE key = ?', (time.time(), key))
+        return pickle.loads(row[0])
+
+    def put(self,
+            key: str,
+            value: List[Any]) -> None:
+        try:
+            payload: bytes = pickle.dumps(value, protocol=4)
+        except Exception as e:
+            logger.debug(f'Results are not picklable: {repr(e)}')
+            return
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                               (key, payload, len(payload), time.time()))
+            if self.max_bytes is not None:
+                self._evict()
+
+    def _evict(self) -> None:
+        total: int = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        victims: List[str] = []
+        for key, size in self._conn.execute('SELECT key, size FROM results ORDER BY accessed'):
+            if total <= self.max_bytes:
+                break
+            victims.append(key)
+            total -= size
+        self._conn.executemany('DELETE FROM results WHERE key = ?', [(key, ) for key in victims])
+
+    def total_size(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def close(self) -> None:
+        self._conn.close()
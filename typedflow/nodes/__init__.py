@@ -1,5 +1,50 @@
-# flake8: noqa
-from .base import *
-from .task import *
-from .dump import *
-from .load import *
+"""
+Node classes are imported on the first access (PEP 562), e.g.
+`from typedflow.nodes import LoaderNode` doesn't import the file sinks.
+"""
+import importlib
+from typing import TYPE_CHECKING, Any, Dict, List
+
+if TYPE_CHECKING:
+    from .base import *  # noqa: F401,F403
+    from .task import *  # noqa: F401,F403
+    from .dump import *  # noqa: F401,F403
+    from .load import *  # noqa: F401,F403
+    from .sink import *  # noqa: F401,F403
+    from .source import *  # noqa: F401,F403
+
+
+# class name -> module
+_modules: Dict[str, str] = {
+    'CallPlan': 'base',
+    'ConsumerNode': 'base',
+    'ProviderNode': 'base',
+    'BatchTaskNode': 'task',
+    'TaskNode': 'task',
+    'DumpNode': 'dump',
+    'LoaderNode': 'load',
+    'CsvDumpNode': 'sink',
+    'FileDumpNode': 'sink',
+    'JsonlDumpNode': 'sink',
+    'ParquetDumpNode': 'sink',
+    'CsvLoaderNode': 'source',
+    'FileLoaderNode': 'source',
+    'JsonlLoaderNode': 'source',
+    'RecordLoaderNode': 'source',
+    'TextLoaderNode': 'source',
+}
+__all__: List[str] = list(_modules)
+
+
+def __getattr__(name: str) -> Any:
+    try:
+        module: str = _modules[name]
+    except KeyError:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}') from None
+    value: Any = getattr(importlib.import_module(f'.{module}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
@@ -1,5 +1,7 @@
 from __future__ import annotations
+import asyncio
 from dataclasses import dataclass, field
+import inspect
 import logging
 from typing import (
     get_type_hints,
@@ -7,20 +9,44 @@ from typing import (
     Callable,
     Dict,
     Generic,
+    Iterator,
     List,
+    Optional,
+    Tuple,
     Type,
-    TypeVar
+    TypeVar,
+    Union,
 )
-from typedflow.batch import Batch
+from typedflow.batch import Batch, ColumnarBatch
 from typedflow.counted_cache import CacheTable
 from typedflow.types import K
 
 
-__all__ = ['ConsumerNode', 'ProviderNode']
+__all__ = ['CallPlan', 'ConsumerNode', 'ProviderNode']
 logger = logging.getLogger(__file__)
 T = TypeVar('T')
 
 
+@dataclass(frozen=True)
+class CallPlan:
+    """
+    What a consumer node resolves once instead of for every batch
+
+    keys
+        Argument names in the order of columns
+    positional
+        Whether func can be called with values in the order of keys
+    precs
+        Upstream nodes in the order of keys
+    arg_types
+        None if type hints could not be resolved (`get_arg_types` raises then)
+    """
+    keys: List[str]
+    positional: bool
+    precs: List[ProviderNode] = field(repr=False)
+    arg_types: Optional[Dict[str, Type]]
+
+
 @dataclass
 class ConsumerNode:
     """
@@ -31,17 +57,46 @@ class ConsumerNode:
     func: Callable[..., Any]
     debug: bool = False
     precs: Dict[str, ProviderNode] = field(init=False)
+    _call_plan: Optional[CallPlan] = field(init=False, repr=False, compare=False)
 
     def __post_init__(self):
         self.precs: Dict[str, ProviderNode] = dict()
+        self._call_plan: Optional[CallPlan] = None
 
     def set_upstream_node(self,
                           key: str,
                           node: ProviderNode) -> None:
         assert key not in self.precs
         self.precs[key] = node
+        self._call_plan: Optional[CallPlan] = None
         node.add_succ()
 
+    def compile(self) -> CallPlan:
+        """
+        Resolve the signature of func and the upstream nodes.
+        Flow does it for all the nodes when it is created.
+        """
+        positional: Optional[List[str]] = self._positional_keys()
+        keys: List[str] = positional or list(self.precs.keys())
+        try:
+            arg_types: Optional[Dict[str, Type]] = self.get_arg_types()
+        except (NameError, TypeError):  # e.g. unresolvable forward references
+            arg_types: Optional[Dict[str, Type]] = None  # noqa
+        self._call_plan: CallPlan = CallPlan(keys=keys,
+                                             positional=positional is not None,
+                                             precs=[self.precs[key] for key in keys],
+                                             arg_types=arg_types)
+        return self._call_plan
+
+    @property
+    def call_plan(self) -> CallPlan:
+        if self._call_plan is None:
+            return self.compile()
+        return self._call_plan
+
+    def is_async(self) -> bool:
+        return inspect.iscoroutinefunction(self.func)
+
     def get_arg_types(self) -> Dict[str, Type]:
         args: Dict[str, Type] = {key: typ
                                  for key, typ
@@ -63,32 +118,98 @@ class ConsumerNode:
             logger.warn([len(batch.data) for batch in batches])
         return batch_len
 
+    def _positional_keys(self) -> Optional[List[str]]:
+        """
+        Argument names in the order of func's parameters
+        if all of them can be passed positionally. Otherwise None.
+        """
+        try:
+            params: List[inspect.Parameter] = list(inspect.signature(self.func).parameters.values())
+        except (TypeError, ValueError):  # some builtins
+            return None
+        keys: List[str] = []
+        for param in params:
+            if param.name not in self.precs:
+                break
+            if param.kind not in (inspect.Parameter.POSITIONAL_ONLY,
+                                  inspect.Parameter.POSITIONAL_OR_KEYWORD):
+                return None
+            keys.append(param.name)
+        if set(keys) != set(self.precs.keys()):
+            return None
+        return keys
+
+    def _merge(self,
+               keys: List[str],
+               batches: List[Batch]) -> ColumnarBatch:
+        """
+        batches are in the order of keys
+        """
+        self._get_batch_id(batches)
+        return ColumnarBatch.from_batches(batches=batches,
+                                          keys=keys,
+                                          length=self._get_batch_len(batches))
+
     def _merge_batches(self,
-                       materials: Dict[str, Batch]) -> Batch[Dict[str, Any]]:
+                       materials: Dict[str, Batch]) -> ColumnarBatch:
         """
-        return kwargs (without any type checks)
+        return arguments in the columnar layout (without any type checks).
+        Columns are ordered as func's parameters when possible
+        so that func can be called with positional arguments.
         """
-        mat_batches: List[Batch] = list(materials.values())
-        batch_len: int = self._get_batch_len(mat_batches)
-        keys: List[str] = list(materials.keys())
-        data: List[Dict[str, Any]] = list()
-        for i in range(batch_len):
-            data.append({key: materials[key].data[i] for key in keys})
-        batch_id: int = self._get_batch_id(mat_batches)
-        batch = Batch(batch_id=batch_id, data=data)
-        return batch
+        keys: List[str] = self.call_plan.keys
+        if set(keys) != materials.keys():
+            keys = list(materials.keys())
+        return self._merge(keys, [materials[key] for key in keys])
+
+    def _call_args(self,
+                   batch: ColumnarBatch) -> Tuple[Optional[List[str]], Iterator[Tuple[Any, ...]]]:
+        """
+        Return keys (None if func can be called positionally) and
+        argument tuples of rows
+        """
+        keys: List[str] = batch.keys()
+        plan: CallPlan = self.call_plan
+        if plan.positional and keys == plan.keys:
+            return None, batch.iter_args()
+        return keys, batch.iter_args()
+
+    def _call(self,
+              keys: Optional[List[str]],
+              args: Tuple[Any, ...]) -> Any:
+        if keys is None:
+            return self.func(*args)
+        return self.func(**dict(zip(keys, args)))
+
+    def _to_columnar(self,
+                     batch: Union[Batch[Dict[str, Any]], ColumnarBatch]) -> ColumnarBatch:
+        if isinstance(batch, ColumnarBatch):
+            return batch
+        return ColumnarBatch.from_rows(batch, keys=self.call_plan.keys)
 
     def accept(self,
-               batch_id: int) -> Batch[Dict[str, Any]]:
+               batch_id: int) -> ColumnarBatch:
         """
         merge all the arguments items into an instance of T (=arg_type)
         """
-        materials: Dict[str, Batch] = dict()
-        for key, prec in self.precs.items():
-            materials[key] = prec.get_or_produce_batch(batch_id=batch_id)
-        # check lengths of batches
-        merged_batch: Batch[Dict[str, Any]] = self._merge_batches(materials=materials)
-        return merged_batch
+        plan: CallPlan = self.call_plan
+        return self._merge(plan.keys,
+                           [prec.get_or_produce_batch(batch_id=batch_id) for prec in plan.precs])
+
+    async def aaccept(self,
+                      batch_id: int,
+                      semaphore: asyncio.Semaphore) -> ColumnarBatch:
+        """
+        async version of accept.
+        Upstream nodes are awaited one by one not to compute
+        a shared upstream node twice.
+        """
+        plan: CallPlan = self.call_plan
+        batches: List[Batch] = []
+        for prec in plan.precs:
+            batches.append(await prec.aget_or_produce_batch(batch_id=batch_id,
+                                                            semaphore=semaphore))
+        return self._merge(plan.keys, batches)
 
     def lt_op(self,
               another: ProviderNode) -> Callable[[str], None]:
@@ -141,6 +262,11 @@ class ProviderNode(Generic[K]):
                              batch_id: int) -> Batch[K]:
         ...
 
+    async def aget_or_produce_batch(self,
+                                    batch_id: int,
+                                    semaphore: asyncio.Semaphore) -> Batch[K]:
+        ...
+
     def add_succ(self):
         self._succ_count += 1
         self.cache_table.life += 1
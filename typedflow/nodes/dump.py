@@ -1,14 +1,18 @@
 from __future__ import annotations
+import asyncio
 from dataclasses import dataclass
 import logging
-import gc
 from typing import (
     Any,
     Dict,
+    List,
+    Optional,
+    Tuple,
+    Union,
 )
 
-from typedflow.batch import Batch
-from typedflow.exceptions import EndOfBatch, FaultItem
+from typedflow.batch import Batch, ColumnarBatch
+from typedflow.exceptions import EndOfBatch
 
 from . import ConsumerNode
 
@@ -25,19 +29,86 @@ class DumpNode(ConsumerNode):
                      batch_id: int) -> None:
         if not self.finished:
             try:
-                batch: Batch[Dict[str, Any]] = self.accept(batch_id=batch_id)
+                batch: ColumnarBatch = self.accept(batch_id=batch_id)
                 self.dump(batch)
-                gc.collect()
             except EndOfBatch:
                 self.finished: bool = True
         else:
             return
 
-    def dump(self, batch: Batch) -> None:
-        for item in batch.data:
-            if isinstance(item, FaultItem):
-                continue
-            elif any([isinstance(val, FaultItem) for val in item.values()]):
-                continue
-            else:
-                self.func(**item)
+    def dump(self,
+             batch: Union[ColumnarBatch, Batch[Dict[str, Any]]]) -> None:
+        """
+        Rows which have a FaultItem are skipped
+        """
+        assert not self.is_async(), f'{self.func.__name__} is async. Use Flow.arun instead'
+        batch: ColumnarBatch = self._to_columnar(batch)
+        keys, rows = self._call_args(batch)
+        if batch.faults == 0:
+            for args in rows:
+                self._call(keys, args)
+            return
+        for fault, args in zip(batch.fault_flags(), rows):
+            if not fault:
+                self._call(keys, args)
+
+    def flush(self) -> None:
+        """
+        Write buffered rows out. Called before a checkpoint is saved.
+        """
+        pass
+
+    def position(self) -> Any:
+        """
+        State of the outputs saved in a checkpoint after `flush()`
+        (e.g. the size of a file). It has to be JSON serializable.
+        """
+        return None
+
+    def resume(self,
+               position: Any = None) -> None:
+        """
+        Called when the flow resumes from a checkpoint with the position
+        saved in it (e.g. to append to the outputs of the previous run)
+        """
+        pass
+
+    def close(self) -> None:
+        """
+        Called by Flow at the end of a run (e.g. to flush buffers)
+        """
+        pass
+
+    async def _acall(self,
+                     keys: Optional[List[str]],
+                     args: Tuple[Any, ...],
+                     semaphore: asyncio.Semaphore) -> None:
+        async with semaphore:
+            await self._call(keys, args)
+
+    async def adump(self,
+                    batch: Union[ColumnarBatch, Batch[Dict[str, Any]]],
+                    semaphore: asyncio.Semaphore) -> None:
+        """
+        Items are dumped concurrently when func is async.
+        """
+        if not self.is_async():
+            self.dump(batch)
+            return
+        batch: ColumnarBatch = self._to_columnar(batch)
+        keys, rows = self._call_args(batch)
+        await asyncio.gather(*[self._acall(keys, args, semaphore)
+                               for fault, args in zip(batch.fault_flags(), rows)
+                               if not fault])
+
+    async def arun_and_dump(self,
+                            batch_id: int,
+                            semaphore: asyncio.Semaphore) -> None:
+        if self.finished:
+            return
+        try:
+            batch: ColumnarBatch = await self.aaccept(batch_id=batch_id,
+                                                      semaphore=semaphore)
+            await self.adump(batch, semaphore=semaphore)
+        except EndOfBatch:
+            self.finished: bool = True
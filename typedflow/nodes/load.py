@@ -1,17 +1,30 @@
 from __future__ import annotations
+import asyncio
 from dataclasses import dataclass, field
+import inspect
+import itertools
 import logging
+from queue import Full, Queue
+import threading
 from typing import (
     get_args,
     get_type_hints,
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
     Iterator,
     Iterable,
     Generator,
     List,
+    Optional,
     Type,
+    Union,
 )
 
 from typedflow.batch import Batch
+from typedflow.batch_size import AdaptiveBatchSize
+from typedflow.counted_cache import estimate_size
 from typedflow.exceptions import EndOfBatch
 from typedflow.types import K
 
@@ -20,6 +33,7 @@ from . import ProviderNode
 
 __all__ = ['LoaderNode', ]
 logger = logging.getLogger(__file__)
+_END = object()  # marks the end of prefetched batches
 
 
 @dataclass
@@ -30,13 +44,76 @@ class LoaderNode(ProviderNode[K]):
     typing information from a genarator.
     This behavior may change if Python supports getting typings from
     a generator
+
+    An async generator function is also accepted as func.
+    Such a loader can be used only with `Flow.arun`.
+
+    Batches are read from a single batching iterator (`load()`),
+    so they are stamped with consecutive batch ids.
+    If prefetch > 0, the next `prefetch` batches are read ahead
+    on a background thread (sync loaders only).
+
+    seek is an optional function which returns the items
+    from the given item offset, e.g.
+
+    >>> def seek(offset: int) -> Iterator[str]:
+    ...     return read_lines(path, start=offset)
+
+    It is used to restart a flow from a checkpoint without reading
+    the source from the beginning.
+
+    If sizer is set (by `Flow.run(adaptive=...)`), the size of each
+    batch is given by it instead of batch_size.
+
+    func is called when the first batch is pulled (or never,
+    if the loader is restarted by seek), so creating a loader
+    doesn't open any files or connections.
     """
     batch_size: int = 16
-    itr: Iterator[K] = field(init=False)
+    prefetch: int = 0
+    seek: Optional[Callable[[int], Iterable[K]]] = None
+    sizer: Optional[AdaptiveBatchSize] = field(default=None, repr=False, compare=False)
+    _itr: Optional[Union[Iterator[K], AsyncIterator[K]]] = field(init=False, repr=False, compare=False)
+    finished: bool = field(init=False)
+    _batches: Iterator[Batch[K]] = field(init=False)
+    _next_batch_id: int = field(init=False)
+    _offset: int = field(init=False)
+    _offsets: Dict[int, int] = field(init=False)
+    _pruned: int = field(init=False)
+    _queue: Optional[Queue] = field(init=False)
+    _thread: Optional[threading.Thread] = field(init=False)
+    _closed: threading.Event = field(init=False)
 
     def __post_init__(self):
         ProviderNode.__post_init__(self)
-        self.itr: Iterator[K] = iter(self.func())
+        assert self.prefetch >= 0
+        assert self.prefetch == 0 or not self.is_async(), 'prefetch is not supported for async loaders'
+        self._itr: Optional[Union[Iterator[K], AsyncIterator[K]]] = None
+        self.finished: bool = False
+        self._batches: Iterator[Batch[K]] = self.load()
+        self._next_batch_id: int = 0
+        self._offset: int = 0  # the number of items produced so far
+        self._offsets: Dict[int, int] = dict()  # batch_id -> offset after the batch
+        self._pruned: int = 0
+        self._queue: Optional[Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._closed: threading.Event = threading.Event()
+
+    def is_async(self) -> bool:
+        return inspect.isasyncgenfunction(self.func)
+
+    @property
+    def itr(self) -> Union[Iterator[K], AsyncIterator[K]]:
+        """
+        The source, opened on the first access
+        """
+        if self._itr is None:
+            self._itr = self.func() if self.is_async() else iter(self.func())
+        return self._itr
+
+    @itr.setter
+    def itr(self, itr: Union[Iterator[K], AsyncIterator[K]]) -> None:
+        self._itr = itr
 
     def get_return_type(self) -> Type[K]:
         typ: Type[Iterable[K]] = get_type_hints(self.func)['return']
@@ -45,23 +122,146 @@ class LoaderNode(ProviderNode[K]):
         except IndexError:
             raise AssertionError(f'function {self.func.__name__} may not return iterbale')
 
-    def load(self) -> Generator[Batch[K], None, None]:
-        lst: List[K] = []
-        batch_id: int = 0
+    def _size_of(self, batch_id: int) -> int:
+        if self.sizer is None:
+            return self.batch_size
+        return self.sizer.size_of(batch_id)
+
+    def load(self,
+             start: int = 0) -> Generator[Batch[K], None, None]:
+        """
+        Items of a batch are taken at once with islice,
+        which is much faster than calling next() for each item.
+        """
+        batch_id: int = start
         while True:
-            for _ in range(self.batch_size):
-                try:
-                    item: K = next(self.itr)
-                except StopIteration:
-                    batch: Batch[K] = Batch[K](batch_id=batch_id, data=lst)
-                    if len(batch.data) > 0:
-                        yield batch
-                    return
-                lst.append(item)
-            batch: Batch[K] = Batch[K](batch_id=batch_id, data=lst)
-            yield batch
+            size: int = self._size_of(batch_id)
+            lst: List[K] = list(itertools.islice(self.itr, size))
+            if len(lst) > 0:
+                yield Batch[K](batch_id=batch_id, data=lst)
+            if len(lst) < size:
+                return
             batch_id += 1
-            lst: List[K] = []  # noqa
+
+    def _read_ahead(self) -> None:
+        """
+        Target of the prefetching thread.
+        Exceptions are passed to the consumer through the queue.
+        """
+        try:
+            for batch in self._batches:
+                if not self._put(batch):
+                    return
+            self._put(_END)
+        except BaseException as e:
+            self._put(e)
+
+    def _put(self, item: Any) -> bool:
+        """
+        Return False if the loader is closed while waiting
+        """
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _next_batch(self) -> Batch[K]:
+        """
+        Raise StopIteration at the end of the source
+        """
+        if self.prefetch == 0:
+            return next(self._batches)
+        if self._thread is None:
+            self._queue: Queue = Queue(maxsize=self.prefetch)
+            self._thread: threading.Thread = threading.Thread(target=self._read_ahead,
+                                                              daemon=True)
+            self._thread.start()
+        item: Any = self._queue.get()
+        if item is _END:
+            raise StopIteration()
+        elif isinstance(item, BaseException):
+            raise item
+        return item
+
+    def _register(self,
+                  batch_id: int,
+                  size: int) -> None:
+        assert batch_id == self._next_batch_id, \
+            f'{self.func.__name__} is going to produce batch {self._next_batch_id} but {batch_id} is requested'
+        self._offset += size
+        self._offsets[batch_id] = self._offset
+        self._next_batch_id += 1
+
+    def produce_batch(self,
+                      batch_id: int) -> Batch[K]:
+        """
+        Load the next batch, put it into the cache table and return it.
+        Once the source is exhausted, this always raises EndOfBatch
+        without touching the iterator again.
+        """
+        assert not self.is_async(), f'{self.func.__name__} is async. Use Flow.arun instead'
+        if self.finished:
+            raise EndOfBatch()
+        try:
+            batch: Batch[K] = self._next_batch()
+        except StopIteration:
+            self.finished: bool = True
+            raise EndOfBatch()
+        self._register(batch_id=batch_id, size=len(batch.data))
+        if self.sizer is not None:
+            self.sizer.record_memory(batch_id, estimate_size(batch))
+        self.cache_table.set(key=batch_id, value=batch)
+        return batch
+
+    def has_batch(self,
+                  batch_id: int) -> bool:
+        """
+        Whether this loader has already produced the batch
+        """
+        return batch_id < self._next_batch_id
+
+    def offset_after(self,
+                     batch_id: int) -> int:
+        """
+        The number of items in batches up to batch_id.
+        Records of older batches are discarded, i.e. batch_id should not
+        decrease over calls.
+        """
+        offset: int = self._offsets.get(batch_id, self._offset)
+        for old in range(self._pruned, batch_id):
+            self._offsets.pop(old, None)
+        self._pruned: int = max(self._pruned, batch_id)
+        return offset
+
+    def skip_to(self,
+                batch_id: int,
+                offset: int) -> None:
+        """
+        Skip the first `offset` items so that the next batch is batch_id.
+        This uses seek if available, otherwise it reads and discards the items.
+        This has to be called before producing any batches.
+        """
+        assert not self.is_async(), 'async loaders cannot skip batches'
+        assert self._next_batch_id == 0 and self._thread is None, 'Batches have been already produced'
+        if self.seek is not None:
+            self.itr: Iterator[K] = iter(self.seek(offset))
+        else:
+            next(itertools.islice(self.itr, offset, offset), None)
+        self._offset: int = offset
+        self._next_batch_id: int = batch_id
+        self._pruned: int = batch_id
+        self._batches: Iterator[Batch[K]] = self.load(start=batch_id)
+
+    def close(self) -> None:
+        """
+        Stop the prefetching thread if any
+        """
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join()
 
     def get_or_produce_batch(self,
                              batch_id: int) -> Batch[K]:
@@ -72,9 +272,36 @@ class LoaderNode(ProviderNode[K]):
         try:
             return self.cache_table.get(batch_id)
         except KeyError:
+            self.produce_batch(batch_id=batch_id)
+            return self.cache_table.get(batch_id)
+
+    async def aproduce_batch(self,
+                             batch_id: int) -> None:
+        """
+        async version of produce_batch. This also works with sync loaders.
+        """
+        if not self.is_async():
+            self.produce_batch(batch_id=batch_id)
+            return
+        if self.finished:
+            raise EndOfBatch()
+        lst: List[K] = []
+        for _ in range(self._size_of(batch_id)):
             try:
-                batch: Batch[K] = next(self.load())
-            except StopIteration:
-                raise EndOfBatch()
-            self.cache_table.set(key=batch_id, value=batch)
+                lst.append(await self.itr.__anext__())
+            except StopAsyncIteration:
+                break
+        if len(lst) == 0:
+            self.finished: bool = True
+            raise EndOfBatch()
+        self._register(batch_id=batch_id, size=len(lst))
+        self.cache_table.set(key=batch_id, value=Batch[K](batch_id=batch_id, data=lst))
+
+    async def aget_or_produce_batch(self,
+                                    batch_id: int,
+                                    semaphore: asyncio.Semaphore) -> Batch[K]:
+        try:
+            return self.cache_table.get(batch_id)
+        except KeyError:
+            await self.aproduce_batch(batch_id=batch_id)
             return self.cache_table.get(batch_id)
@@ -0,0 +1,241 @@
+"""
+DumpNodes which write batches into a file
+"""
+from __future__ import annotations
+from abc import ABC, abstractmethod
+import csv
+import dataclasses
+from dataclasses import dataclass
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, IO, List, Optional, Type, Union
+
+from typedflow.batch import Batch, ColumnarBatch
+from typedflow.io import infer_compression, open_file
+
+from .dump import DumpNode
+
+
+__all__ = ['CsvDumpNode', 'FileDumpNode', 'JsonlDumpNode', 'ParquetDumpNode']
+logger = logging.getLogger(__file__)
+
+
+@dataclass(init=False)
+class FileDumpNode(DumpNode, ABC):
+    """
+    Base class of sinks. Rows are buffered in the columnar layout
+    and written every buffer_size rows into a file which is opened once
+    and kept open until `close()` (called by Flow at the end of a run).
+    Buffered rows are also written before a checkpoint is saved, and
+    the size of the file is saved in it. When the flow resumes from
+    the checkpoint, the file is truncated to that size and appended.
+    Compressed files are not truncated, so rows dumped after
+    the checkpoint may be written twice.
+
+    Columns are named after the keys of upstream nodes, in the order
+    they are set. Rows which have a FaultItem are skipped.
+
+    Parameters
+    -----
+    path
+        Output file. It is truncated unless append is True
+        or the flow resumes from a checkpoint.
+    compression
+        See `typedflow.io.open_file`
+    """
+    path: Path
+    compression: Optional[str]
+    buffer_size: int
+    append: bool
+
+    def __init__(self,
+                 path: Union[str, Path],
+                 compression: Optional[str] = 'infer',
+                 buffer_size: int = 8192,
+                 append: bool = False):
+        super().__init__(func=type(self)._write)
+        assert buffer_size > 0, 'buffer_size should be positive'
+        self.path: Path = Path(path)
+        self.compression: Optional[str] = compression
+        self.buffer_size: int = buffer_size
+        self.append: bool = append
+        self._buffer: Dict[str, List[Any]] = dict()
+        self._n_rows: int = 0
+        self._handle: Optional[IO] = None
+        self._resumed: bool = False
+
+    def get_arg_types(self) -> Dict[str, Type]:
+        return {key: Any for key in self.precs}
+
+    def _mode(self) -> str:
+        return 'at' if self.append or self._resumed else 'wt'
+
+    def _open(self) -> IO:
+        return open_file(self.path, self._mode(),
+                         compression=self.compression, encoding='utf-8')
+
+    @abstractmethod
+    def _write(self, columns: Dict[str, List[Any]]) -> None:
+        ...
+
+    def dump(self,
+             batch: Union[ColumnarBatch, Batch[Dict[str, Any]]]) -> None:
+        batch: ColumnarBatch = self._to_columnar(batch)
+        positions: List[int] = batch.valid_positions()
+        if len(positions) == 0:
+            return
+        for key, col in batch.select(positions).items():
+            self._buffer.setdefault(key, []).extend(col)
+        self._n_rows += len(positions)
+        if self._n_rows >= self.buffer_size:
+            self._write_buffer()
+
+    def _write_buffer(self) -> None:
+        if self._n_rows == 0:
+            return
+        if self._handle is None:
+            self._handle: IO = self._open()
+        self._write(self._buffer)
+        self._buffer: Dict[str, List[Any]] = dict()
+        self._n_rows: int = 0
+
+    def flush(self) -> None:
+        """
+        Write the buffered rows and flush the file
+        """
+        self._write_buffer()
+        if self._handle is not None:
+            self._handle.flush()
+
+    def position(self) -> Optional[int]:
+        """
+        Size of the file (None if it is compressed)
+        """
+        compression: Optional[str] = infer_compression(self.path) if self.compression == 'infer' else self.compression
+        if compression is not None:
+            return None
+        elif self._handle is None and self._mode() == 'wt':
+            return 0  # truncated when opened
+        return self.path.stat().st_size if self.path.exists() else 0
+
+    def resume(self,
+               position: Optional[int] = None) -> None:
+        assert self._handle is None, f'{self.path} is already open'
+        self._resumed: bool = position != 0  # the file is rewritten if nothing was saved
+        if self._resumed and position is not None and self.path.exists():
+            os.truncate(self.path, position)
+
+    def close(self) -> None:
+        self._write_buffer()
+        if self._handle is not None:
+            self._handle.close()
+            self._handle: Optional[IO] = None
+        self._resumed: bool = False
+
+
+def _to_json(obj: Any) -> Any:
+    """
+    default of json.dumps
+    """
+    if hasattr(obj, 'to_dict'):  # dataclasses_json
+        return obj.to_dict()
+    elif dataclasses.is_dataclass(obj):
+        return dataclasses.asdict(obj)
+    elif isinstance(obj, Path):
+        return str(obj)
+    raise TypeError(f'{type(obj)} is not JSON serializable')
+
+
+@dataclass(init=False)
+class JsonlDumpNode(FileDumpNode):
+    """
+    One JSON object per row. Dataclasses are serialized
+    by `to_dict()` (dataclasses_json) or `dataclasses.asdict`.
+    """
+
+    def _write(self, columns: Dict[str, List[Any]]) -> None:
+        keys: List[str] = list(columns.keys())
+        lines: List[str] = [json.dumps(dict(zip(keys, row)), default=_to_json, ensure_ascii=False)
+                            for row in zip(*columns.values())]
+        self._handle.write('\n'.join(lines) + '\n')
+
+
+@dataclass(init=False)
+class CsvDumpNode(FileDumpNode):
+    """
+    The header is written first unless header is False or
+    the file is appended. fmtparams are passed to `csv.writer`.
+    """
+    header: bool
+    fmtparams: Dict[str, Any]
+
+    def __init__(self,
+                 path: Union[str, Path],
+                 compression: Optional[str] = 'infer',
+                 buffer_size: int = 8192,
+                 append: bool = False,
+                 header: bool = True,
+                 **fmtparams):
+        super().__init__(path=path, compression=compression,
+                         buffer_size=buffer_size, append=append)
+        self.header: bool = header and not append
+        self.fmtparams: Dict[str, Any] = fmtparams
+        self._writer: Optional[Any] = None
+
+    def _open(self) -> IO:
+        return open_file(self.path, self._mode(),
+                         compression=self.compression, encoding='utf-8', newline='')
+
+    def _write(self, columns: Dict[str, List[Any]]) -> None:
+        if self._writer is None:
+            self._writer = csv.writer(self._handle, **self.fmtparams)
+            if self.header and not self._resumed:
+                self._writer.writerow(list(columns.keys()))
+        self._writer.writerows(zip(*columns.values()))
+
+    def close(self) -> None:
+        super().close()
+        self._writer: Optional[Any] = None
+
+
+@dataclass(init=False)
+class ParquetDumpNode(FileDumpNode):
+    """
+    Each flush is written as a row group. Requires pyarrow.
+    compression is the codec of parquet (e.g. 'snappy', 'zstd', 'gzip' or None),
+    and append (including resuming a flow) is not supported.
+    """
+
+    def __init__(self,
+                 path: Union[str, Path],
+                 compression: Optional[str] = 'snappy',
+                 buffer_size: int = 65536):
+        try:
+            import pyarrow.parquet  # noqa
+        except ImportError:
+            raise ImportError('pyarrow is required for ParquetDumpNode')
+        super().__init__(path=path, compression=compression, buffer_size=buffer_size)
+
+    def _open(self) -> Any:
+        return None  # opened with the schema of the first rows
+
+    def flush(self) -> None:
+        self._write_buffer()  # the writer has no flush
+
+    def position(self) -> None:
+        return None
+
+    def resume(self,
+               position: None = None) -> None:
+        raise AssertionError(f'{self.path} cannot be appended. ParquetDumpNode does not support resume')
+
+    def _write(self, columns: Dict[str, List[Any]]) -> None:
+        import pyarrow
+        import pyarrow.parquet
+        table: pyarrow.Table = pyarrow.table(columns)
+        if self._handle is None:
+            self._handle = pyarrow.parquet.ParquetWriter(str(self.path), table.schema,
+                                                         compression=self.compression or 'none')
+        self._handle.write_table(table)
@@ -0,0 +1,416 @@
+"""
+LoaderNodes which read records from a file
+"""
+from __future__ import annotations
+from abc import ABC, abstractmethod
+import bisect
+import codecs
+import csv
+from dataclasses import dataclass
+import io
+import itertools
+import json
+import logging
+import mmap
+import os
+from pathlib import Path
+import struct
+from typing import Any, ClassVar, Dict, Iterator, List, Optional, Tuple, Type, Union
+
+from typedflow.io import infer_compression, open_file
+
+from .load import LoaderNode
+
+
+__all__ = ['CsvLoaderNode', 'FileLoaderNode', 'JsonlLoaderNode', 'RecordLoaderNode', 'TextLoaderNode']
+logger = logging.getLogger(__file__)
+# (parameters, path, size, mtime) -> byte offsets of some records and the numbers of records before them
+_indexes: Dict[Tuple[Any, ...], Tuple[List[int], List[int]]] = dict()
+
+
+@dataclass(init=False)
+class FileLoaderNode(LoaderNode, ABC):
+    """
+    Base class of file loaders. The file is opened on the first batch
+    (so creating a node is instant whatever the size of the file is)
+    and read by chunk_size bytes. Records are parsed chunk by chunk,
+    and each batch is taken at once from them.
+
+    Loaders of an uncompressed file seek to the n-th record (e.g. to start
+    a shard or resume from a checkpoint) without parsing the ones before it.
+    RecordLoaderNode with record_size computes the byte offset.
+    Text, Jsonl and Csv loaders build an index of the byte offsets by
+    scanning the file on the first seek, which is kept in the process
+    until the file is modified, so a worker running N shards scans it once.
+    Length-prefixed records and compressed files are read from the beginning.
+
+    Parameters
+    -----
+    path
+        Input file
+    compression
+        See `typedflow.io.open_file`
+    chunk_size
+        Bytes read at a time
+    use_mmap
+        Map an uncompressed file into memory instead of reading it
+    """
+    item_type: ClassVar[Type] = Any
+    path: Path
+    compression: Optional[str]
+    chunk_size: int
+    use_mmap: bool
+
+    def __init__(self,
+                 path: Union[str, Path],
+                 batch_size: int = 16,
+                 prefetch: int = 0,
+                 compression: Optional[str] = 'infer',
+                 chunk_size: int = 1 << 22,
+                 use_mmap: bool = False):
+        assert chunk_size > 0, 'chunk_size should be positive'
+        self.path: Path = Path(path)
+        self.compression: Optional[str] = compression
+        self.chunk_size: int = chunk_size
+        self.use_mmap: bool = use_mmap and self._compression() is None
+
+        def records() -> Iterator[Any]:
+            for chunk in self._parse():
+                yield from chunk
+
+        super().__init__(func=records, batch_size=batch_size, prefetch=prefetch)
+
+    def get_return_type(self) -> Type:
+        return self.item_type
+
+    def _compression(self) -> Optional[str]:
+        if self.compression == 'infer':
+            return infer_compression(self.path)
+        return self.compression
+
+    def _read_chunks(self,
+                     start: int = 0) -> Iterator[bytes]:
+        """
+        Chunks from the byte offset start (of an uncompressed file)
+        """
+        assert start == 0 or self._compression() is None, 'compressed files cannot be sought'
+        if self.use_mmap:
+            with open(self.path, 'rb') as fin:
+                if fin.seek(0, io.SEEK_END) == 0:  # empty files cannot be mapped
+                    return
+                with mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    for pos in range(start, len(mm), self.chunk_size):
+                        yield mm[pos:pos + self.chunk_size]
+            return
+        with open_file(self.path, 'rb', compression=self.compression) as fin:
+            fin.seek(start)
+            while True:
+                chunk: bytes = fin.read(self.chunk_size)
+                if len(chunk) == 0:
+                    return
+                yield chunk
+
+    def _read_lines(self,
+                    start: int = 0) -> Iterator[Tuple[int, List[bytes]]]:
+        """
+        Lines (without newlines) of each chunk and the byte offset of
+        the first one. A line across chunks is carried over to the next one.
+        """
+        pos: int = start
+        rest: bytes = b''
+        for chunk in self._read_chunks(start):
+            buf: bytes = rest + chunk
+            lines: List[bytes] = buf.split(b'\n')
+            rest = lines.pop()
+            yield pos, lines
+            pos += len(buf) - len(rest)
+        if len(rest) > 0:
+            yield pos, [rest]
+
+    @abstractmethod
+    def _parse(self) -> Iterator[List[Any]]:
+        """
+        Records of each chunk
+        """
+        ...
+
+
+@dataclass(init=False)
+class _IndexedLoaderNode(FileLoaderNode, ABC):
+    """
+    File loaders which seek by an index of the byte offsets of records
+    """
+
+    def __init__(self,
+                 path: Union[str, Path],
+                 **kwargs):
+        super().__init__(path=path, **kwargs)
+        if self._compression() is None:
+            self.seek = self._seek
+
+    def _index_key(self) -> Tuple[Any, ...]:
+        """
+        Parameters which change the byte offsets of records
+        """
+        return (type(self).__name__, )
+
+    def _index(self) -> Tuple[List[int], List[int]]:
+        """
+        Byte offsets of some records and the numbers of records before them
+        """
+        stat: os.stat_result = os.stat(self.path)
+        key: Tuple[Any, ...] = (self._index_key(), str(self.path.resolve()), stat.st_size, stat.st_mtime_ns)
+        if key not in _indexes:
+            entries: List[Tuple[int, int]] = list(self._scan())
+            _indexes[key] = ([pos for pos, _ in entries], [n for _, n in entries])
+        return _indexes[key]
+
+    def _seek(self, offset: int) -> Iterator[Any]:
+        """
+        Records from the offset-th one
+        """
+        positions, counts = self._index()
+        i: int = bisect.bisect_right(counts, offset) - 1
+        if i < 0:
+            return
+        for records in self._parse(start=positions[i], skip=offset - counts[i]):
+            yield from records
+
+    @abstractmethod
+    def _scan(self) -> Iterator[Tuple[int, int]]:
+        """
+        (byte offset, the number of records before it) of some records
+        in the ascending order, which starts from the first record
+        """
+        ...
+
+    @abstractmethod
+    def _parse(self,
+               start: int = 0,
+               skip: int = 0) -> Iterator[List[Any]]:
+        """
+        Records of each chunk from the byte offset start
+        except the first skip ones
+        """
+        ...
+
+
+@dataclass(init=False)
+class _LineLoaderNode(_IndexedLoaderNode, ABC):
+    """
+    File loaders whose records are (some of) the lines
+    """
+
+    def _records(self, lines: List[bytes]) -> List[bytes]:
+        """
+        Lines which are records
+        """
+        return lines
+
+    def _scan(self) -> Iterator[Tuple[int, int]]:
+        """
+        (byte offset, the number of records before it) of the first line of each chunk
+        """
+        n: int = 0
+        for pos, lines in self._read_lines():
+            yield pos, n
+            n += len(self._records(lines))
+
+    def _parse(self,
+               start: int = 0,
+               skip: int = 0) -> Iterator[List[Any]]:
+        for _, lines in self._read_lines(start):
+            records: List[bytes] = self._records(lines)
+            if skip > 0:
+                records, skip = records[skip:], max(skip - len(records), 0)
+            if len(records) > 0:
+                yield self._decode(records)
+
+    @abstractmethod
+    def _decode(self, records: List[bytes]) -> List[Any]:
+        """
+        Parse the records of a chunk
+        """
+        ...
+
+
+@dataclass(init=False)
+class TextLoaderNode(_LineLoaderNode):
+    """
+    Newline-delimited text. Each line is a str without the newline.
+    """
+    item_type: ClassVar[Type] = str
+    encoding: str
+
+    def __init__(self,
+                 path: Union[str, Path],
+                 encoding: str = 'utf-8',
+                 **kwargs):
+        self.encoding: str = encoding
+        super().__init__(path=path, **kwargs)
+
+    def _decode(self, records: List[bytes]) -> List[str]:
+        return b'\n'.join(records).decode(self.encoding).split('\n')
+
+
+@dataclass(init=False)
+class JsonlLoaderNode(_LineLoaderNode):
+    """
+    One JSON value per line. Empty lines are skipped.
+    All the lines in a chunk are parsed by a single `json.loads`.
+    """
+    item_type: ClassVar[Type] = Dict[str, Any]
+
+    def _records(self, lines: List[bytes]) -> List[bytes]:
+        return [line for line in lines if len(line.strip()) > 0]
+
+    def _decode(self, records: List[bytes]) -> List[Any]:
+        try:
+            parsed: List[Any] = json.loads(b''.join([b'[', b','.join(records), b']']))
+        except json.JSONDecodeError:
+            parsed: Optional[List[Any]] = None  # noqa
+        if parsed is not None and len(parsed) == len(records):
+            return parsed
+        # find the invalid line (e.g. '1, 2' is taken as two values when joined)
+        return [json.loads(record) for record in records]
+
+
+@dataclass(init=False)
+class CsvLoaderNode(_IndexedLoaderNode):
+    """
+    Rows are dicts keyed by the header if header is True,
+    otherwise lists of str. fmtparams are passed to `csv.reader`.
+    Quoted fields may contain newlines, so the file is read through
+    the buffered text stream by the csv module (chunk_size and use_mmap
+    are not used), and the index has the byte offset of every
+    `csv_index_every`-th row.
+    """
+    csv_index_every: ClassVar[int] = 4096
+    item_type: ClassVar[Type] = Dict[str, str]
+    header: bool
+    encoding: str
+    fmtparams: Dict[str, Any]
+
+    def __init__(self,
+                 path: Union[str, Path],
+                 header: bool = True,
+                 encoding: str = 'utf-8',
+                 fmtparams: Optional[Dict[str, Any]] = None,
+                 **kwargs):
+        self.header: bool = header
+        self.encoding: str = encoding
+        self.fmtparams: Dict[str, Any] = fmtparams or dict()
+        super().__init__(path=path, **kwargs)
+
+    def get_return_type(self) -> Type:
+        return Dict[str, str] if self.header else List[str]
+
+    def _index_key(self) -> Tuple[Any, ...]:
+        return (type(self).__name__, self.header, self.encoding, repr(sorted(self.fmtparams.items())))
+
+    def _scan(self) -> Iterator[Tuple[int, int]]:
+        with open_file(self.path, 'rt', compression=self.compression,
+                       encoding=self.encoding, newline='') as fin:
+            encoder: codecs.IncrementalEncoder = codecs.getincrementalencoder(self.encoding)()
+            end: List[int] = [0]  # of the lines given to the reader
+
+            def lines() -> Iterator[str]:
+                for line in fin:
+                    end[0] += len(encoder.encode(line))
+                    yield line
+
+            # the reader does not read lines beyond the row it returns
+            reader: Iterator[List[str]] = csv.reader(lines(), **self.fmtparams)
+            if self.header:
+                next(reader, None)
+            pos: int = end[0]
+            for n, _ in enumerate(reader):
+                if n % self.csv_index_every == 0:
+                    yield pos, n
+                pos = end[0]
+
+    def _parse(self,
+               start: int = 0,
+               skip: int = 0) -> Iterator[List[Any]]:
+        keys: Optional[List[str]] = None
+        if start > 0 and self.header:
+            with open_file(self.path, 'rt', compression=self.compression,
+                           encoding=self.encoding, newline='') as fin:
+                keys: Optional[List[str]] = next(csv.reader(fin, **self.fmtparams), None)  # noqa
+        with open_file(self.path, 'rb', compression=self.compression) as raw:
+            if start > 0:
+                raw.seek(start)
+            fin: io.TextIOWrapper = io.TextIOWrapper(raw, encoding=self.encoding, newline='')
+            reader: Iterator[List[str]] = csv.reader(fin, **self.fmtparams)
+            if start == 0 and self.header:
+                keys: Optional[List[str]] = next(reader, None)  # noqa
+            next(itertools.islice(reader, skip, skip), None)
+            while True:
+                rows: List[List[str]] = list(itertools.islice(reader, 4096))
+                if len(rows) == 0:
+                    return
+                if keys is None:
+                    yield rows
+                else:
+                    yield [dict(zip(keys, row)) for row in rows]
+
+
+@dataclass(init=False)
+class RecordLoaderNode(FileLoaderNode):
+    """
+    Binary records. Each record is either record_size bytes
+    or prefixed by its length packed in length_format (`struct` format).
+    With record_size, an uncompressed file is sought to the byte offset
+    of the first record instead of reading the skipped ones.
+    """
+    item_type: ClassVar[Type] = bytes
+    record_size: Optional[int]
+    length_format: str
+
+    def __init__(self,
+                 path: Union[str, Path],
+                 record_size: Optional[int] = None,
+                 length_format: str = '<I',
+                 **kwargs):
+        assert record_size is None or record_size > 0, 'record_size should be positive'
+        self.record_size: Optional[int] = record_size
+        self.length_format: str = length_format
+        super().__init__(path=path, **kwargs)
+        if record_size is not None and self._compression() is None:
+            self.seek = self._seek
+
+    def _seek(self, offset: int) -> Iterator[bytes]:
+        """
+        Records from the offset-th one
+        """
+        for records in self._parse(start=offset * self.record_size):
+            yield from records
+
+    def _parse(self,
+               start: int = 0) -> Iterator[List[bytes]]:
+        rest: bytes = b''
+        for chunk in self._read_chunks(start):
+            buf: bytes = rest + chunk
+            records, consumed = self._split(buf)
+            rest = buf[consumed:]
+            yield records
+        assert len(rest) == 0, f'{self.path} ends with an incomplete record'
+
+    def _split(self, buf: bytes) -> Tuple[List[bytes], int]:
+        """
+        Return complete records in buf and the number of bytes they occupy
+        """
+        if self.record_size is not None:
+            n: int = len(buf) // self.record_size * self.record_size
+            return [buf[i:i + self.record_size] for i in range(0, n, self.record_size)], n
+        header: struct.Struct = struct.Struct(self.length_format)
+        records: List[bytes] = []
+        pos: int = 0
+        while pos + header.size <= len(buf):
+            length: int = header.unpack_from(buf, pos)[0]
+            end: int = pos + header.size + length
+            if end > len(buf):
+                break
+            records.append(buf[pos + header.size:end])
+            pos = end
+        return records, pos
@@ -1,76 +1,497 @@
 from __future__ import annotations
+import asyncio
+from collections import deque
+from concurrent.futures import Executor, Future
 from dataclasses import dataclass
+import functools
 import logging
+import time
 from typing import (
+    TYPE_CHECKING,
+    get_args,
+    get_origin,
     get_type_hints,
     Any,
     Callable,
+    Deque,
     Dict,
     Iterable,
+    Iterator,
     List,
+    Optional,
+    Tuple,
     Union,
     Type,
 )
-import traceback
 
-from typedflow.batch import Batch
-from typedflow.exceptions import EndOfBatch, FaultItem
+from typedflow.batch import Batch, ColumnarBatch
+from typedflow.errors import default_sink, ErrorSink
+from typedflow.exceptions import CircuitOpenError, EndOfBatch, FAULT, FaultItem
+from typedflow.policy import call_with_timeout, CircuitBreaker, Retry
 from typedflow.types import K
 
 from . import ConsumerNode, ProviderNode
 
+if TYPE_CHECKING:  # imported when a task is given them
+    from typedflow.memo import ResultStore
+    from typedflow.transport import ShmTransport
 
-__all__ = ['TaskNode', ]
+
+__all__ = ['BatchTaskNode', 'TaskNode', ]
 logger = logging.getLogger(__file__)
 
 
+def _apply_chunk(func: Callable[..., K],
+                 keys: Optional[List[str]],
+                 rows: List[Tuple[Any, ...]],
+                 retry: Optional[Retry] = None,
+                 transport: Optional[ShmTransport] = None,
+                 timeout: Optional[float] = None) -> List[Tuple[bool, Any]]:
+    """
+    Run func over rows in a worker (positionally if keys is None).
+    This is a module-level function so that it can be pickled
+    by ProcessPoolExecutor. Exceptions are returned instead of raised
+    so that a single failure doesn't discard the other results of the chunk.
+    timeout applies to each row (and each retry of it).
+    """
+    results: List[Tuple[bool, Any]] = []
+    for args in rows:
+        if transport is not None:
+            try:
+                args = transport.resolve_row(args)
+            except Exception as e:
+                results.append((False, e))
+                continue
+        call: Callable[[], K] = functools.partial(func, *args) if keys is None\
+            else functools.partial(func, **dict(zip(keys, args)))
+        attempt: int = 0
+        while True:
+            try:
+                results.append((True, call() if timeout is None else call_with_timeout(call, timeout)))
+                break
+            except Exception as e:
+                delay: Optional[float] = None if retry is None else retry.delay(attempt, e)
+                if delay is None:
+                    results.append((False, e))
+                    break
+                time.sleep(delay)
+                attempt += 1
+    if transport is not None:
+        return [(ok, transport.export(val) if ok else val) for ok, val in results]
+    return results
+
+
 @dataclass(init=False)
-class TaskNode(ConsumerNode, ProviderNode[K], Callable):
+class TaskNode(ConsumerNode, ProviderNode[K]):
     """
     This is not a dataclass because it dataclass doesn't work
     if it is inherited from multiple super classes
+
+    When executor is given, items of a batch are distributed to it
+    in chunks of `chunksize`. With ProcessPoolExecutor, func has to be
+    picklable (i.e. defined at the module level).
+
+    When store is given, results are memoized on disk by the identity
+    of func (name and source) and the contents of the input batch.
+    Batches having FaultItem are not stored so that they are retried.
+
+    Items which raise become FAULT, and the reasons are kept in
+    `Batch.reasons` of the product. Tracebacks go to error_sink
+    (the one of the Flow, or `typedflow.errors.default_sink`).
+
+    Parameters
+    -----
+    timeout
+        Seconds an item may take. An item taking longer fails with TimeoutError
+        (the call is left running in a background thread,
+        which is in the worker with an executor).
+    retry
+        Retries of failed items with exponential backoff. See `Retry`.
+    breaker
+        Fails items fast while the dependency of func seems down.
+        See `CircuitBreaker`. With an executor, a chunk is a call
+        to the breaker, and chunks are submitted as the results arrive
+        (as many as the workers at a time) so that the open circuit
+        fails the rest of the batch.
+    transport
+        Sends large arrays and bytes to the executor (and results back)
+        through memory-mapped files. Files of a product are removed when
+        all the consumers have read it from the cache table. See `ShmTransport`.
     """
+    executor: Optional[Executor]
+    chunksize: int
+    store: Optional[ResultStore]
+    error_sink: Optional[ErrorSink]
+    timeout: Optional[float]
+    retry: Optional[Retry]
+    breaker: Optional[CircuitBreaker]
+    transport: Optional[ShmTransport]
 
     def __init__(self,
-                 func: Callable[..., K]):
+                 func: Callable[..., K],
+                 executor: Optional[Executor] = None,
+                 chunksize: int = 1,
+                 store: Optional[ResultStore] = None,
+                 error_sink: Optional[ErrorSink] = None,
+                 timeout: Optional[float] = None,
+                 retry: Optional[Retry] = None,
+                 breaker: Optional[CircuitBreaker] = None,
+                 transport: Optional[ShmTransport] = None):
+        assert chunksize > 0
+        assert timeout is None or timeout > 0, 'timeout should be positive'
         ConsumerNode.__init__(self, func=func)
         ConsumerNode.__post_init__(self)
         ProviderNode.__init__(self, func=func)
         ProviderNode.__post_init__(self)
+        self.executor: Optional[Executor] = executor
+        self.chunksize: int = chunksize
+        self.store: Optional[ResultStore] = store
+        self.error_sink: Optional[ErrorSink] = error_sink
+        self.timeout: Optional[float] = timeout
+        self.retry: Optional[Retry] = retry
+        self.breaker: Optional[CircuitBreaker] = breaker
+        self.transport: Optional[ShmTransport] = transport
+        # files holding results of each batch (with transport)
+        self._shared_files: Dict[int, List[str]] = dict()
+        self.cache_table.on_remove = self._remove_shared_files
+        self._func_id: Optional[str] = None
 
     def get_return_type(self) -> Type[K]:
         typ: Type[Iterable[K]] = get_type_hints(self.func)['return']
         return typ
 
-    def process(self,
-                batch: Batch[Union[Dict[str, Any]], FaultItem]) -> Batch[K]:
-        if len(batch.data) == 0:
-            raise EndOfBatch()
-        products: List[Union[FaultItem, Dict[str, Any]]] = []
-        for item in batch.data:
-            if isinstance(item, FaultItem):
-                products.append(FaultItem())
+    def _handle_exception(self,
+                          e: Exception,
+                          batch_id: int,
+                          row: Optional[int]) -> str:
+        """
+        Report the failure of a row (None for all the rows) and return the reason
+        """
+        if self.debug:
+            raise e
+        sink: ErrorSink = self.error_sink or default_sink
+        return sink.report(node=getattr(self.func, '__qualname__', repr(self.func)),
+                           batch_id=batch_id,
+                           row=row,
+                           error=e)
+
+    def _has_policies(self) -> bool:
+        return self.timeout is not None or self.retry is not None or self.breaker is not None
+
+    def _call_with_policies(self, call: Callable[[], K]) -> K:
+        """
+        call() under the timeout, the retries and the circuit breaker
+        """
+        attempt: int = 0
+        while True:
+            if self.breaker is not None:
+                self.breaker.before()
+            try:
+                result: K = call() if self.timeout is None else call_with_timeout(call, self.timeout)
+            except Exception as e:
+                if self.breaker is not None:
+                    self.breaker.record(False)
+                delay: Optional[float] = None if self.retry is None else self.retry.delay(attempt, e)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
                 continue
+            if self.breaker is not None:
+                self.breaker.record(True)
+            return result
+
+    def _call_guarded(self,
+                      keys: Optional[List[str]],
+                      args: Tuple[Any, ...]) -> K:
+        return self._call_with_policies(functools.partial(self._call, keys, args))
+
+    async def _acall_with_policies(self,
+                                   call: Callable[[], Any],
+                                   semaphore: asyncio.Semaphore) -> K:
+        """
+        async version of `_call_with_policies`.
+        The semaphore is not held while waiting for a retry.
+        """
+        attempt: int = 0
+        while True:
+            if self.breaker is not None:
+                self.breaker.before()
             try:
-                products.append(self.func(**item))
+                async with semaphore:
+                    if self.timeout is None:
+                        result: K = await call()
+                    else:
+                        try:
+                            result: K = await asyncio.wait_for(call(), self.timeout)  # noqa
+                        except asyncio.TimeoutError:
+                            raise TimeoutError(f'Did not finish in {self.timeout} sec')
             except Exception as e:
-                if self.debug:
-                    raise e
-                else:
-                    logger.warn(repr(e))
-                    traceback.print_tb(e.__traceback__)
-                    products.append(FaultItem())
+                if self.breaker is not None:
+                    self.breaker.record(False)
+                delay: Optional[float] = None if self.retry is None else self.retry.delay(attempt, e)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            if self.breaker is not None:
+                self.breaker.record(True)
+            return result
+
+    @staticmethod
+    def _to_product(batch: ColumnarBatch,
+                    products: List[Union[K, FaultItem]],
+                    reasons: Dict[int, str]) -> Batch[K]:
+        """
+        Rows which were faults or failed here are marked in the bitmask
+        """
+        faults: int = batch.faults
+        for pos in reasons:
+            faults |= 1 << pos
         return Batch[K](batch_id=batch.batch_id,
-                        data=products)
+                        data=products,
+                        faults=faults,
+                        reasons=reasons)
+
+    def _process_serially(self,
+                          batch: ColumnarBatch) -> Batch[K]:
+        keys, rows = self._call_args(batch)
+        call: Callable[[Optional[List[str]], Tuple[Any, ...]], K]\
+            = self._call_guarded if self._has_policies() else self._call
+        products: List[Union[K, FaultItem]] = []
+        reasons: Dict[int, str] = dict()
+        if batch.faults == 0:
+            for args in rows:
+                try:
+                    products.append(call(keys, args))
+                except Exception as e:
+                    reasons[len(products)] = self._handle_exception(e, batch.batch_id, len(products))
+                    products.append(FAULT)
+            return self._to_product(batch, products, reasons)
+        for fault, args in zip(batch.fault_flags(), rows):
+            if fault:
+                products.append(FAULT)
+                continue
+            try:
+                products.append(call(keys, args))
+            except Exception as e:
+                reasons[len(products)] = self._handle_exception(e, batch.batch_id, len(products))
+                products.append(FAULT)
+        return self._to_product(batch, products, reasons)
+
+    def _remove_shared_files(self, batch_id: int) -> None:
+        if self.transport is not None:
+            self.transport.remove(self._shared_files.pop(batch_id, []))
+
+    def _submit(self,
+                keys: Optional[List[str]],
+                rows: List[Tuple[Any, ...]]) -> Tuple[Future, List[str]]:
+        """
+        Submit a chunk unless the circuit is open.
+        Return the future and files held for the chunk.
+        """
+        if self.breaker is not None:
+            try:
+                self.breaker.before()
+            except CircuitOpenError as e:
+                future: Future = Future()
+                future.set_result([(False, e)] * len(rows))
+                return future, []
+        created: List[str] = []
+        if self.transport is not None:
+            rows, created = self.transport.export_rows(rows)
+        return self.executor.submit(_apply_chunk, self.func, keys, rows,
+                                    self.retry, self.transport, self.timeout), created
+
+    def _chunk_results(self,
+                       future: Future) -> List[Tuple[bool, Any]]:
+        """
+        Wait for a chunk and record it to the breaker (unless the breaker rejected it).
+        Rows time out in the worker, so a chunk doesn't hang.
+        """
+        results: List[Tuple[bool, Any]] = future.result()
+        if self.breaker is not None and not all([isinstance(val, CircuitOpenError) for _, val in results]):
+            self.breaker.record(all([ok for ok, _ in results]))
+        return results
+
+    def _process_with_executor(self,
+                               batch: ColumnarBatch) -> Batch[K]:
+        """
+        Submit valid rows in chunks and put the results back
+        in the original order.
+        """
+        if self.transport is not None:
+            from typedflow.transport import Shared
+        keys, rows = self._call_args(batch)
+        valid: List[Tuple[int, Tuple[Any, ...]]] = [
+            (i, args) for fault, (i, args) in zip(batch.fault_flags(), enumerate(rows))
+            if not fault]
+        chunks: Iterator[List[Tuple[int, Tuple[Any, ...]]]] = iter(
+            [valid[start:start + self.chunksize] for start in range(0, len(valid), self.chunksize)])
+        # chunks in flight (future, files held for it, positions of its rows)
+        pending: Deque[Tuple[Future, List[str], List[int]]] = deque()
+        window: Optional[int] = None if self.breaker is None else max(getattr(self.executor, '_max_workers', 1), 1)
+        products: List[Union[K, FaultItem]] = [FAULT] * len(batch)
+        reasons: Dict[int, str] = dict()
+        try:
+            while True:
+                for chunk in chunks:
+                    pending.append((*self._submit(keys, [args for _, args in chunk]), [i for i, _ in chunk]))
+                    if window is not None and len(pending) >= window:
+                        break
+                if len(pending) == 0:
+                    break
+                future, created, positions = pending.popleft()
+                try:
+                    results: List[Tuple[bool, Any]] = self._chunk_results(future)
+                    for pos, (ok, val) in zip(positions, results):
+                        if not ok:
+                            reasons[pos] = self._handle_exception(val, batch.batch_id, pos)
+                        elif self.transport is not None and isinstance(val, Shared):
+                            # an input sent back by the same handle is held by the product too
+                            if val.path in created:
+                                self.transport.retain(val.path)
+                            self._shared_files.setdefault(batch.batch_id, []).append(val.path)
+                            try:
+                                products[pos] = self.transport.resolve(val)
+                            except Exception as e:
+                                reasons[pos] = self._handle_exception(e, batch.batch_id, pos)
+                        else:
+                            products[pos] = val
+                finally:
+                    if self.transport is not None:
+                        self.transport.remove(created)
+        except Exception:
+            for future, created, _ in pending:
+                future.cancel()
+                if self.transport is not None:
+                    self.transport.remove(created)
+            raise
+        return self._to_product(batch, products, reasons)
+
+    def process(self,
+                batch: Union[ColumnarBatch, Batch[Dict[str, Any]]]) -> Batch[K]:
+        """
+        Rows which have a FaultItem are not passed to func
+        and become FaultItem.
+        """
+        assert not self.is_async(), f'{self.func.__name__} is async. Use Flow.arun instead'
+        batch: ColumnarBatch = self._to_columnar(batch)
+        if len(batch) == 0:
+            raise EndOfBatch()
+        if self.executor is None:
+            return self._process_serially(batch)
+        return self._process_with_executor(batch)
+
+    def _lookup(self,
+                arg: ColumnarBatch) -> Tuple[Optional[str], Optional[Batch[K]]]:
+        """
+        Return the key in the store and the memoized product if any
+        """
+        if self.store is None or len(arg) == 0:
+            return None, None
+        if self._func_id is None:
+            from typedflow.memo import func_digest
+            self._func_id: str = func_digest(self.func)
+        key: Optional[str] = self.store.make_key(self._func_id, arg)
+        if key is None:
+            return None, None
+        data: Optional[List[K]] = self.store.get(key)
+        if data is None:
+            return key, None
+        return key, Batch[K](batch_id=arg.batch_id, data=data, faults=0)
+
+    def _save(self,
+              key: Optional[str],
+              product: Batch[K]) -> None:
+        if key is None:
+            return
+        if product.fault_mask() != 0:
+            return
+        self.store.put(key, product.data)
+
+    def produce_batch(self,
+                      batch_id: int) -> Batch[K]:
+        """
+        Process the batch, put the product into the cache table and return it
+        """
+        arg: ColumnarBatch = self.accept(batch_id=batch_id)
+        key, product = self._lookup(arg)
+        if product is None:
+            product: Batch[K] = self.process(arg)
+            self._save(key, product)
+        self.cache_table.set(key=batch_id, value=product)
+        return product
 
     def get_or_produce_batch(self,
                              batch_id: int) -> Batch[K]:
         try:
             return self.cache_table.get(batch_id)
         except KeyError:
-            arg: Batch[Dict[str, Any]] = self.accept(batch_id=batch_id)
-            product: Batch[K] = self.process(arg)
-            self.cache_table.set(key=batch_id, value=product)
+            self.produce_batch(batch_id=batch_id)
+            return self.cache_table.get(batch_id)
+
+    async def _acall(self,
+                     keys: Optional[List[str]],
+                     args: Tuple[Any, ...],
+                     fault: bool,
+                     semaphore: asyncio.Semaphore) -> Tuple[bool, Any]:
+        """
+        Exceptions are returned as (False, exception) to be reported in the order of rows
+        (so that an exception returned by func is a product)
+        """
+        if fault:
+            return True, FAULT
+        try:
+            return True, await self._acall_with_policies(functools.partial(self._call, keys, args), semaphore)
+        except Exception as e:
+            return False, e
+
+    async def aprocess(self,
+                       batch: Union[ColumnarBatch, Batch[Dict[str, Any]]],
+                       semaphore: asyncio.Semaphore) -> Batch[K]:
+        """
+        Items are awaited concurrently. The number of items running
+        at the same time is limited by semaphore.
+        Sync functions are processed by `process`.
+        """
+        if not self.is_async():
+            return self.process(batch)
+        batch: ColumnarBatch = self._to_columnar(batch)
+        if len(batch) == 0:
+            raise EndOfBatch()
+        keys, rows = self._call_args(batch)
+        results: List[Tuple[bool, Any]] = await asyncio.gather(
+            *[self._acall(keys, args, fault, semaphore)
+              for fault, args in zip(batch.fault_flags(), rows)])
+        products: List[Union[K, FaultItem]] = [FAULT] * len(results)
+        reasons: Dict[int, str] = dict()
+        for pos, (ok, result) in enumerate(results):
+            if ok:
+                products[pos] = result
+            else:
+                reasons[pos] = self._handle_exception(result, batch.batch_id, pos)
+        return self._to_product(batch, products, reasons)
+
+    async def aproduce_batch(self,
+                             batch_id: int,
+                             semaphore: asyncio.Semaphore) -> None:
+        arg: ColumnarBatch = await self.aaccept(batch_id=batch_id,
+                                                semaphore=semaphore)
+        key, product = self._lookup(arg)
+        if product is None:
+            product: Batch[K] = await self.aprocess(arg, semaphore=semaphore)
+            self._save(key, product)
+        self.cache_table.set(key=batch_id, value=product)
+
+    async def aget_or_produce_batch(self,
+                                    batch_id: int,
+                                    semaphore: asyncio.Semaphore) -> Batch[K]:
+        try:
+            return self.cache_table.get(batch_id)
+        except KeyError:
+            await self.aproduce_batch(batch_id=batch_id, semaphore=semaphore)
             return self.cache_table.get(batch_id)
 
     def __lt__(self,
@@ -84,3 +505,118 @@ class TaskNode(ConsumerNode, ProviderNode[K], Callable):
     def __gt__(self,
                another: ConsumerNode) -> Callable[[str], None]:
         return self.gt_op(another=another)
+
+
+def _element_type(typ: Type) -> Type:
+    """
+    List[int] -> int. Any for a type without arguments (e.g. np.ndarray)
+    """
+    args: Tuple[Type, ...] = get_args(typ)
+    if get_origin(typ) is None or len(args) == 0:
+        return Any
+    return args[0]
+
+
+@dataclass(init=False)
+class BatchTaskNode(TaskNode[K]):
+    """
+    A task whose function takes whole columns of a batch at once
+    and returns a column of results, e.g.
+
+    >>> def embed(s: List[str]) -> List[np.ndarray]:
+    ...     return list(model.encode(s))
+
+    Types are checked on the element types (str and np.ndarray above).
+    Rows that have a FaultItem are not passed to func and remain FaultItem.
+    If func raises, all the rows of the batch become FaultItem.
+    timeout, retry and breaker apply to each call of func (i.e. a batch).
+
+    Parameters
+    -----
+    to_column
+        Applied to each column (list) before calling func, e.g. np.asarray
+    """
+    to_column: Optional[Callable[[List[Any]], Any]]
+
+    def __init__(self,
+                 func: Callable[..., List[K]],
+                 to_column: Optional[Callable[[List[Any]], Any]] = None,
+                 store: Optional[ResultStore] = None,
+                 timeout: Optional[float] = None,
+                 retry: Optional[Retry] = None,
+                 breaker: Optional[CircuitBreaker] = None):
+        TaskNode.__init__(self, func=func, store=store,
+                          timeout=timeout, retry=retry, breaker=breaker)
+        self.to_column: Optional[Callable[[List[Any]], Any]] = to_column
+
+    def get_arg_types(self) -> Dict[str, Type]:
+        return {key: _element_type(typ)
+                for key, typ in TaskNode.get_arg_types(self).items()}
+
+    def get_return_type(self) -> Type[K]:
+        return _element_type(TaskNode.get_return_type(self))
+
+    def _to_columns(self,
+                    batch: ColumnarBatch) -> Tuple[List[int], Dict[str, Any]]:
+        """
+        Return positions of valid rows and their columns. The columns
+        are copied so that func can't modify the inputs of other consumers.
+        """
+        positions: List[int] = batch.valid_positions()
+        columns: Dict[str, Any] = batch.select(positions)
+        if len(positions) == len(batch):  # not copied by select
+            columns = {key: list(col) for key, col in columns.items()}
+        if self.to_column is not None:
+            columns = {key: self.to_column(col) for key, col in columns.items()}
+        return positions, columns
+
+    def _to_batch(self,
+                  batch: ColumnarBatch,
+                  positions: List[int],
+                  results: Union[List[K], Exception]) -> Batch[K]:
+        """
+        If func raised, the failure is reported once for the batch
+        and all the valid rows share the reason
+        """
+        products: List[Union[K, FaultItem]] = [FAULT] * len(batch)
+        if isinstance(results, Exception):
+            reason: str = self._handle_exception(results, batch.batch_id, None)
+            return self._to_product(batch, products, {pos: reason for pos in positions})
+        assert len(results) == len(positions), \
+            f'{self.func.__name__} returned {len(results)} items for {len(positions)} items'
+        for pos, res in zip(positions, results):
+            products[pos] = res
+        return self._to_product(batch, products, dict())
+
+    def process(self,
+                batch: Union[ColumnarBatch, Batch[Dict[str, Any]]]) -> Batch[K]:
+        assert not self.is_async(), f'{self.func.__name__} is async. Use Flow.arun instead'
+        batch: ColumnarBatch = self._to_columnar(batch)
+        if len(batch) == 0:
+            raise EndOfBatch()
+        positions, columns = self._to_columns(batch)
+        if len(positions) == 0:
+            return self._to_batch(batch, positions, [])
+        try:
+            results: Union[List[K], Exception] = self._call_with_policies(lambda: self.func(**columns))
+        except Exception as e:
+            results: Union[List[K], Exception] = e  # noqa
+        return self._to_batch(batch, positions, results)
+
+    async def aprocess(self,
+                       batch: Union[ColumnarBatch, Batch[Dict[str, Any]]],
+                       semaphore: asyncio.Semaphore) -> Batch[K]:
+        if not self.is_async():
+            return self.process(batch)
+        batch: ColumnarBatch = self._to_columnar(batch)
+        if len(batch) == 0:
+            raise EndOfBatch()
+        positions, columns = self._to_columns(batch)
+        if len(positions) == 0:
+            return self._to_batch(batch, positions, [])
+        try:
+            results: Union[List[K], Exception] = await self._acall_with_policies(
+                lambda: self.func(**columns), semaphore)
+        except Exception as e:
+            results: Union[List[K], Exception] = e  # noqa
+        return self._to_batch(batch, positions, results)
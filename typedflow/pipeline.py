@@ -0,0 +1,206 @@
+"""
+Pipelined scheduler which overlaps loading, processing and dumping.
+
+Three stages run at the same time and are joined by bounded queues:
+
+load (thread) --> process (caller's thread) --> dump (thread)
+
+so loaders can read batch N+1 while tasks work on batch N and
+dump nodes write batch N-1.
+"""
+from concurrent.futures import Executor
+from dataclasses import dataclass
+import logging
+from queue import Empty, Full, Queue
+import threading
+import time
+from typing import Any, Callable, List, Optional, Tuple, Union
+
+from typedflow.batch import ColumnarBatch
+from typedflow.budget import FlowBudget
+from typedflow.nodes import DumpNode
+from typedflow.plan import ExecutionPlan
+
+
+__all__ = ['Pipeline', ]
+logger = logging.getLogger(__file__)
+
+
+@dataclass
+class _BatchEnd:
+    """
+    Put after all the inputs of dump nodes for a batch
+    """
+    batch_id: int
+
+
+class _Stopped(Exception):
+    """
+    Raised inside a stage when another stage asked to stop
+    """
+    pass
+
+
+@dataclass
+class Pipeline:
+    """
+    Parameters
+    -----
+    plan
+        Compiled DAG
+    prefetch
+        The maximum number of batches each queue holds,
+        i.e. how many batches a stage can run ahead of the next one.
+    executor
+        If given, independent branches run on it at the same time.
+        See `ExecutionPlan.process`.
+    start
+        The first batch_id
+    stop
+        If given, batches from this batch_id are not loaded
+    on_batch_end
+        Called with batch_id after all the dump nodes have dumped the batch
+    on_batch_processed
+        Called with batch_id and the time (sec) to process the batch
+    budget
+        If given, loading blocks while the batches in flight or the bytes
+        in cache tables exceed it
+    poll_interval
+        Interval (sec) to check whether other stages have stopped
+        while a stage is blocked on a queue
+    """
+    plan: ExecutionPlan
+    prefetch: int = 1
+    executor: Optional[Executor] = None
+    start: int = 0
+    stop: Optional[int] = None
+    on_batch_end: Optional[Callable[[int], None]] = None
+    on_batch_processed: Optional[Callable[[int, float], None]] = None
+    budget: Optional[FlowBudget] = None
+    poll_interval: float = 0.1
+
+    def __post_init__(self):
+        assert self.prefetch > 0, 'prefetch should be positive'
+
+    def _put(self,
+             queue: Queue,
+             item: Any,
+             stop: threading.Event) -> None:
+        while True:
+            if stop.is_set():
+                raise _Stopped()
+            try:
+                queue.put(item, timeout=self.poll_interval)
+                return
+            except Full:
+                continue
+
+    def _get(self,
+             queue: Queue,
+             stop: threading.Event) -> Any:
+        while True:
+            if stop.is_set():
+                raise _Stopped()
+            try:
+                return queue.get(timeout=self.poll_interval)
+            except Empty:
+                continue
+
+    def _load(self,
+              loaded: Queue,
+              stop: threading.Event) -> None:
+        """
+        Put batches of all the loaders into their cache tables in advance,
+        then tell the process stage the batch_id which is ready.
+        """
+        batch_id: int = self.start
+        while not self.plan.exhausted() and (self.stop is None or batch_id < self.stop):
+            if self.budget is not None:
+                while not self.budget.admit(batch_id, timeout=self.poll_interval):
+                    if stop.is_set():
+                        raise _Stopped()
+            self.plan.load(batch_id=batch_id)
+            self._put(loaded, batch_id, stop)
+            batch_id += 1
+        self._put(loaded, None, stop)
+
+    def _process(self,
+                 loaded: Queue,
+                 accepted: Queue,
+                 stop: threading.Event) -> None:
+        while not self.plan.finished():
+            batch_id: Optional[int] = self._get(loaded, stop)
+            if batch_id is None:
+                break
+            start: float = time.perf_counter()
+            items: List[Tuple[DumpNode, ColumnarBatch]] = self.plan.process(batch_id=batch_id,
+                                                                            executor=self.executor)
+            if self.on_batch_processed is not None:
+                self.on_batch_processed(batch_id, time.perf_counter() - start)
+            for item in items:
+                self._put(accepted, item, stop)
+            self._put(accepted, _BatchEnd(batch_id=batch_id), stop)
+        self._put(accepted, None, stop)
+
+    def _dump(self,
+              accepted: Queue,
+              stop: threading.Event) -> None:
+        while True:
+            item: Union[None, _BatchEnd, Tuple[DumpNode, ColumnarBatch]] = self._get(accepted, stop)
+            if item is None:
+                return
+            elif isinstance(item, _BatchEnd):
+                if self.budget is not None:
+                    self.budget.done(item.batch_id)
+                if self.on_batch_end is not None:
+                    self.on_batch_end(item.batch_id)
+                continue
+            node, batch = item
+            self.plan.dump(node, batch)
+
+    @staticmethod
+    def _guard(target: Callable[..., None],
+               errors: List[BaseException],
+               abort: threading.Event,
+               *args) -> None:
+        try:
+            target(*args)
+        except _Stopped:
+            return
+        except BaseException as e:
+            errors.append(e)
+            abort.set()
+
+    def run(self) -> None:
+        loaded: Queue = Queue(maxsize=self.prefetch)
+        accepted: Queue = Queue(maxsize=self.prefetch)
+        abort: threading.Event = threading.Event()  # stop all the stages
+        stop_loading: threading.Event = threading.Event()
+        errors: List[BaseException] = []
+
+        load_thread: threading.Thread = threading.Thread(
+            target=self._guard,
+            args=(self._load, errors, abort, loaded, stop_loading),
+            daemon=True)
+        dump_thread: threading.Thread = threading.Thread(
+            target=self._guard,
+            args=(self._dump, errors, abort, accepted, abort),
+            daemon=True)
+        load_thread.start()
+        dump_thread.start()
+        try:
+            self._process(loaded, accepted, abort)
+        except _Stopped:
+            pass
+        except BaseException:
+            abort.set()
+            raise
+        finally:
+            # loaders may be still running ahead
+            stop_loading.set()
+            if errors:
+                abort.set()
+            dump_thread.join()
+            load_thread.join()
+        if errors:
+            raise errors[0]
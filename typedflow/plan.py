@@ -0,0 +1,286 @@
+"""
+Execution plan which runs a DAG batch by batch in a topological order
+instead of pulling upstream batches recursively from dump nodes.
+"""
+from __future__ import annotations
+import asyncio
+from concurrent.futures import Executor, Future, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+import logging
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple, Union
+
+from typedflow.batch import Batch, ColumnarBatch
+from typedflow.exceptions import EndOfBatch
+from typedflow.graph import Graph
+from typedflow.nodes import ConsumerNode, DumpNode, LoaderNode, ProviderNode, TaskNode
+from typedflow.stats import Profiler
+
+
+__all__ = ['ExecutionPlan', ]
+logger = logging.getLogger(__file__)
+Node = Union[ProviderNode, ConsumerNode]
+
+
+@dataclass
+class ExecutionPlan:
+    """
+    A compiled DAG. A batch is processed by `load` and then `process`.
+
+    Each product is stored in the cache table of its node and removed
+    when its last consumer reads it. Nodes which cannot be run anymore
+    (an upstream node has finished) are marked as done, and they still
+    release what they would read so that no cache entry remains.
+
+    If profiler is given, loading, running and dumping of each node
+    are measured. Otherwise nothing is measured.
+
+    The DAG is analyzed by Graph, which is built from dump_nodes
+    unless given (e.g. `Flow.graph`).
+    """
+    dump_nodes: List[DumpNode]
+    profiler: Optional[Profiler] = None
+    graph: Optional[Graph] = field(default=None, repr=False)
+    order: List[Node] = field(init=False)
+    names: Dict[int, str] = field(init=False)
+    loaders: List[LoaderNode] = field(init=False)
+    succs: Dict[int, List[ConsumerNode]] = field(init=False)
+    _done: Set[int] = field(init=False)
+
+    def __post_init__(self):
+        if self.graph is None:
+            self.graph: Graph = Graph(dump_nodes=self.dump_nodes)
+        self.order: List[Node] = self.graph.nodes
+        self.names: Dict[int, str] = {id(node): name
+                                      for node, name in zip(self.graph.nodes, self.graph.names)}
+        self.loaders: List[LoaderNode] = self.graph.loaders
+        self.succs: Dict[int, List[ConsumerNode]] = {
+            id(node): [self.graph.nodes[succ] for succ in succs]
+            for node, succs in zip(self.graph.nodes, self.graph.succs)}
+        self._done: Set[int] = set()
+        if self.profiler is not None:
+            self.profiler.attach({self.names[id(node)]: node for node in self.order})
+
+    def _measure(self,
+                 node: Node,
+                 func: Callable[..., Any],
+                 **kwargs) -> Any:
+        if self.profiler is None:
+            return func(**kwargs)
+        start: Tuple[float, float] = self.profiler.start()
+        result: Any = func(**kwargs)
+        # products of loaders and tasks are counted (dump nodes are counted on dump)
+        self.profiler.record(self.names[id(node)], start,
+                             batch=result if isinstance(result, Batch) else None)
+        return result
+
+    def is_done(self, node: Node) -> bool:
+        if isinstance(node, DumpNode):
+            return node.finished
+        elif isinstance(node, LoaderNode):
+            return node.finished or self._is_unnecessary(node)
+        else:
+            return id(node) in self._done
+
+    def _is_unnecessary(self, node: ProviderNode) -> bool:
+        return all([self.is_done(succ) for succ in self.succs[id(node)]])
+
+    def _mark_done(self, node: ConsumerNode) -> None:
+        if isinstance(node, DumpNode):
+            node.finished: bool = True
+        else:
+            self._done.add(id(node))
+
+    def finished(self) -> bool:
+        return all([node.finished for node in self.dump_nodes])
+
+    def exhausted(self) -> bool:
+        """
+        Whether no loader produces batches anymore
+        """
+        return all([self.is_done(ld) for ld in self.loaders])
+
+    def load(self, batch_id: int) -> None:
+        for loader in self.loaders:
+            if self.is_done(loader):
+                continue
+            try:
+                self._measure(loader, loader.produce_batch, batch_id=batch_id)
+            except EndOfBatch:
+                continue
+
+    async def aload(self, batch_id: int) -> None:
+        for loader in self.loaders:
+            if self.is_done(loader):
+                continue
+            try:
+                await loader.aproduce_batch(batch_id=batch_id)
+            except EndOfBatch:
+                continue
+
+    def _has_batch(self,
+                   node: ProviderNode,
+                   batch_id: int,
+                   available: Set[int]) -> bool:
+        if isinstance(node, LoaderNode):
+            return node.has_batch(batch_id)
+        return id(node) in available
+
+    def _release(self,
+                 node: ConsumerNode,
+                 batch_id: int,
+                 available: Set[int]) -> None:
+        """
+        Read (and discard) upstream batches which a done node would read
+        """
+        for prec in node.precs.values():
+            if self._has_batch(prec, batch_id, available):
+                prec.cache_table.get(batch_id)
+
+    def _prepare(self,
+                 node: ConsumerNode,
+                 batch_id: int,
+                 available: Set[int]) -> bool:
+        """
+        Return True if node can run on the batch.
+        Otherwise mark node as done.
+        """
+        if not self.is_done(node):
+            if isinstance(node, DumpNode) or not self._is_unnecessary(node):
+                if all([self._has_batch(prec, batch_id, available) for prec in node.precs.values()]):
+                    return True
+            self._mark_done(node)
+        self._release(node, batch_id, available)
+        return False
+
+    def _run_node(self,
+                  node: ConsumerNode,
+                  batch_id: int) -> Optional[ColumnarBatch]:
+        """
+        Run a task or accept the inputs of a dump node
+        """
+        if isinstance(node, TaskNode):
+            self._measure(node, node.produce_batch, batch_id=batch_id)
+            return None
+        else:
+            return self._measure(node, node.accept, batch_id=batch_id)
+
+    def dump(self,
+             node: DumpNode,
+             batch: ColumnarBatch) -> None:
+        """
+        Dump a batch returned by `process`
+        """
+        if self.profiler is None:
+            node.dump(batch)
+            return
+        start: Tuple[float, float] = self.profiler.start()
+        node.dump(batch)
+        self.profiler.record(self.names[id(node)], start, batch=batch)
+
+    def process(self,
+                batch_id: int,
+                executor: Optional[Executor] = None) -> List[Tuple[DumpNode, ColumnarBatch]]:
+        """
+        Run all the tasks on the batch, and return the inputs of dump nodes.
+        `load(batch_id)` has to be called in advance.
+
+        If executor is given, nodes which don't depend on each other
+        (i.e. independent branches) run on it at the same time.
+        """
+        if executor is not None:
+            return self._process_in_parallel(batch_id=batch_id, executor=executor)
+        available: Set[int] = set()
+        accepted: List[Tuple[DumpNode, ColumnarBatch]] = []
+        for node in self.order:
+            if isinstance(node, LoaderNode):
+                continue
+            if not self._prepare(node, batch_id, available):
+                continue
+            try:
+                merged: Optional[ColumnarBatch] = self._run_node(node, batch_id)
+            except EndOfBatch:
+                self._mark_done(node)
+                continue
+            if isinstance(node, TaskNode):
+                available.add(id(node))
+            else:
+                accepted.append((node, merged))
+        return accepted
+
+    def _process_in_parallel(self,
+                             batch_id: int,
+                             executor: Executor) -> List[Tuple[DumpNode, ColumnarBatch]]:
+        """
+        A node is submitted as soon as all of its upstream tasks are resolved
+        (i.e. produced the batch or turned out to be done).
+        Bookkeeping is done only in the caller's thread.
+        """
+        available: Set[int] = set()
+        merged_batches: Dict[int, ColumnarBatch] = dict()
+        consumers: List[ConsumerNode] = [node for node in self.order
+                                         if not isinstance(node, LoaderNode)]
+        # the number of unresolved upstream edges
+        waiting: Dict[int, int] = {
+            id(node): len([prec for prec in node.precs.values()
+                           if not isinstance(prec, LoaderNode)])
+            for node in consumers}
+        ready: Deque[ConsumerNode] = Deque([node for node in consumers
+                                            if waiting[id(node)] == 0])
+        running: Dict[Future, ConsumerNode] = dict()
+
+        def resolve(node: ConsumerNode) -> None:
+            for succ in self.succs[id(node)]:
+                waiting[id(succ)] -= 1
+                if waiting[id(succ)] == 0:
+                    ready.append(succ)
+
+        try:
+            while len(ready) > 0 or len(running) > 0:
+                while len(ready) > 0:
+                    node: ConsumerNode = ready.popleft()
+                    if self._prepare(node, batch_id, available):
+                        running[executor.submit(self._run_node, node, batch_id)] = node
+                    else:
+                        resolve(node)
+                if len(running) == 0:
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    node: ConsumerNode = running.pop(future)  # noqa
+                    try:
+                        merged: Optional[ColumnarBatch] = future.result()
+                    except EndOfBatch:
+                        self._mark_done(node)
+                    else:
+                        if isinstance(node, TaskNode):
+                            available.add(id(node))
+                        else:
+                            merged_batches[id(node)] = merged
+                    resolve(node)
+        except BaseException:
+            for future in running:
+                future.cancel()
+            wait(running)
+            raise
+        return [(node, merged_batches[id(node)]) for node in consumers
+                if id(node) in merged_batches]
+
+    async def aprocess(self,
+                       batch_id: int,
+                       semaphore: asyncio.Semaphore) -> List[Tuple[DumpNode, ColumnarBatch]]:
+        available: Set[int] = set()
+        accepted: List[Tuple[DumpNode, ColumnarBatch]] = []
+        for node in self.order:
+            if isinstance(node, LoaderNode):
+                continue
+            if not self._prepare(node, batch_id, available):
+                continue
+            try:
+                if isinstance(node, TaskNode):
+                    await node.aproduce_batch(batch_id=batch_id, semaphore=semaphore)
+                    available.add(id(node))
+                else:
+                    accepted.append((node, node.accept(batch_id=batch_id)))
+            except EndOfBatch:
+                self._mark_done(node)
+        return accepted
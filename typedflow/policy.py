@@ -0,0 +1,177 @@
+"""
+Execution policies of tasks: per-item timeouts, retries and circuit breakers
+"""
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+import logging
+import queue
+import random
+import threading
+import time
+from typing import Callable, Deque, Optional, Tuple, Type, TypeVar
+
+from typedflow.exceptions import CircuitOpenError
+
+
+__all__ = ['CircuitBreaker', 'Retry', 'call_with_timeout']
+logger = logging.getLogger(__file__)
+R = TypeVar('R')
+
+
+@dataclass
+class Retry:
+    """
+    Parameters
+    -----
+    attempts
+        The number of calls including the first one
+    on
+        Exceptions which are retried. The others fail immediately.
+    backoff
+        Seconds to wait before the first retry. It is multiplied by factor
+        after each retry up to max_backoff.
+    jitter
+        Wait a random time between 0 and the backoff instead
+        so that retries of many items don't hit a dependency at the same time
+    """
+    attempts: int = 3
+    on: Tuple[Type[Exception], ...] = (Exception, )
+    backoff: float = 0.1
+    factor: float = 2.
+    max_backoff: float = 10.
+    jitter: bool = False
+
+    def __post_init__(self):
+        assert self.attempts > 0, 'attempts should be positive'
+        assert self.backoff >= 0, 'backoff should not be negative'
+        assert self.factor >= 1, 'factor should be at least 1'
+
+    def delay(self,
+              attempt: int,
+              error: Exception) -> Optional[float]:
+        """
+        Seconds to wait before retrying after the attempt-th call (from 0) failed.
+        None if it should not be retried.
+        """
+        if attempt + 1 >= self.attempts or not isinstance(error, self.on)\
+                or isinstance(error, CircuitOpenError):
+            return None
+        delay: float = min(self.backoff * self.factor ** attempt, self.max_backoff)
+        return random.uniform(0, delay) if self.jitter else delay
+
+
+@dataclass
+class CircuitBreaker:
+    """
+    Fails calls fast with CircuitOpenError for `cooldown` sec
+    once the ratio of failures in the last `window` calls reaches `threshold`.
+    After the cooldown, one call is let through (half-open):
+    the breaker closes if it succeeds and opens again otherwise.
+    """
+    threshold: float = 0.5
+    window: int = 20
+    cooldown: float = 30.
+    _outcomes: Deque[bool] = field(default_factory=deque, repr=False)  # True on failures
+    _n_failures: int = field(default=0, repr=False)
+    _opened_at: Optional[float] = field(default=None, repr=False)
+    _probing: bool = field(default=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def __post_init__(self):
+        assert 0 < self.threshold <= 1, 'threshold should be in (0, 1]'
+        assert self.window > 0, 'window should be positive'
+
+    @property
+    def state(self) -> str:
+        """
+        'closed', 'open' or 'half-open'
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if self._probing or time.monotonic() - self._opened_at >= self.cooldown:
+                return 'half-open'
+            return 'open'
+
+    def before(self) -> None:
+        """
+        Raise CircuitOpenError unless a call is allowed now
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if not self._probing and time.monotonic() - self._opened_at >= self.cooldown:
+                self._probing = True
+                return
+        raise CircuitOpenError(f'Circuit is open (failure ratio >= {self.threshold})')
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            if self._probing:
+                self._probing = False
+                if ok:
+                    self._opened_at = None
+                    self._outcomes.clear()
+                    self._n_failures = 0
+                else:
+                    self._opened_at = time.monotonic()
+                return
+            if self._opened_at is not None:  # calls started before it opened
+                return
+            self._outcomes.append(not ok)
+            self._n_failures += not ok
+            if len(self._outcomes) > self.window:
+                self._n_failures -= self._outcomes.popleft()
+            if len(self._outcomes) == self.window and self._n_failures >= self.threshold * self.window:
+                logger.warning(f'Circuit opens for {self.cooldown} sec '
+                               f'({self._n_failures} failures in the last {self.window} calls)')
+                self._opened_at = time.monotonic()
+
+
+class _Caller:
+    """
+    A daemon thread running calls one by one. When a call times out,
+    the thread is abandoned (it exits after the call returns if ever).
+    """
+
+    def __init__(self):
+        self.requests: queue.SimpleQueue = queue.SimpleQueue()
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def _loop(self) -> None:
+        while True:
+            request: Optional[Tuple[Callable[[], R], Future]] = self.requests.get()
+            if request is None:
+                return
+            func, future = request
+            try:
+                future.set_result(func())
+            except BaseException as e:
+                future.set_exception(e)
+
+
+_callers: threading.local = threading.local()
+
+
+def call_with_timeout(func: Callable[[], R],
+                      timeout: float) -> R:
+    """
+    Return func() or raise TimeoutError if it takes more than timeout sec.
+    Python cannot interrupt a thread, so a call which timed out keeps running
+    in the background and its result is discarded.
+    """
+    caller: Optional[_Caller] = getattr(_callers, 'caller', None)
+    if caller is None:
+        caller: _Caller = _Caller()  # noqa
+        _callers.caller = caller
+    future: Future = Future()
+    caller.requests.put((func, future))
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        if future.done():  # func raised TimeoutError (the same class since Python 3.11)
+            raise
+    caller.requests.put(None)
+    _callers.caller = None
+    raise TimeoutError(f'Did not finish in {timeout} sec')
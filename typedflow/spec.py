@@ -0,0 +1,140 @@
+"""
+Declarative flows. Functions and node classes are referred to by import strings,
+so a flow can be declared, saved and loaded without importing them
+(and their heavy dependencies) until it is built.
+
+    {
+        "nodes": {
+            "lines": {"kind": "TextLoaderNode", "params": {"path": "in.txt"}},
+            "embed": {"kind": "TaskNode", "func": "jobs.embed:embed", "inputs": {"s": "lines"}},
+            "out": {"kind": "JsonlDumpNode", "inputs": {"vec": "embed"}, "params": {"path": "out.jsonl"}}
+        },
+        "params": {"cache_budget": 100000000}
+    }
+
+Run it with
+
+    python -m typedflow.spec flow.json
+"""
+from __future__ import annotations
+import argparse
+from dataclasses import asdict, dataclass, field
+import json
+import logging
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Type, Union
+
+from typedflow.utils import import_string
+
+if TYPE_CHECKING:
+    from typedflow.flow import Flow
+
+
+__all__ = ['FlowSpec', 'NodeSpec']
+logger = logging.getLogger(__file__)
+
+
+@dataclass
+class NodeSpec:
+    """
+    Parameters
+    -----
+    kind
+        A class name in `typedflow.nodes` (e.g. 'TaskNode')
+        or an import string of a node class
+    func
+        Import string of the function ('package.module:name').
+        None for nodes which don't take func (e.g. JsonlDumpNode).
+    inputs
+        Argument name -> name of the upstream node
+    params
+        Other keyword arguments of the class
+    """
+    kind: str
+    func: Optional[str] = None
+    inputs: Dict[str, str] = field(default_factory=dict)
+    params: Dict[str, Any] = field(default_factory=dict)
+
+    def node_class(self) -> Type:
+        if ':' in self.kind or '.' in self.kind:
+            return import_string(self.kind)
+        import typedflow.nodes
+        return getattr(typedflow.nodes, self.kind)
+
+    def build(self) -> Any:
+        cls: Type = self.node_class()
+        if self.func is None:
+            return cls(**self.params)
+        func: Callable = import_string(self.func)
+        return cls(func=func, **self.params)
+
+
+@dataclass
+class FlowSpec:
+    """
+    nodes are keyed by their names. Dump nodes are the sinks of the flow
+    (in the order of nodes). params are keyword arguments of Flow.
+    """
+    nodes: Dict[str, NodeSpec]
+    params: Dict[str, Any] = field(default_factory=dict)
+
+    def __post_init__(self):
+        for name, node in self.nodes.items():
+            for key, prec in node.inputs.items():
+                assert prec in self.nodes, f'Input {key} of {name} is unknown node {prec}'
+
+    @classmethod
+    def from_dict(cls, dic: Dict[str, Any]) -> FlowSpec:
+        return cls(nodes={name: NodeSpec(**node) for name, node in dic['nodes'].items()},
+                   params=dic.get('params', dict()))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> FlowSpec:
+        with open(path) as fin:
+            return cls.from_dict(json.load(fin))
+
+    def save(self, path: Union[str, Path]) -> None:
+        with open(path, 'w') as fout:
+            json.dump(self.to_dict(), fout, indent=2)
+
+    def build(self) -> Flow:
+        """
+        Import functions and create the nodes and the flow
+        """
+        from typedflow.flow import Flow
+        from typedflow.nodes import DumpNode
+
+        nodes: Dict[str, Any] = {name: spec.build() for name, spec in self.nodes.items()}
+        for name, spec in self.nodes.items():
+            for key, prec in spec.inputs.items():
+                nodes[name].set_upstream_node(key, nodes[prec])
+        dump_nodes: List[DumpNode] = [node for node in nodes.values() if isinstance(node, DumpNode)]
+        assert len(dump_nodes) > 0, 'A flow needs at least one dump node'
+        return Flow(dump_nodes=dump_nodes, **self.params)
+
+    def run(self, **run_kwargs) -> Flow:
+        """
+        Build the flow and run it. run_kwargs are passed to `Flow.run`.
+        """
+        flow: Flow = self.build()
+        flow.run(**run_kwargs)
+        return flow
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Run a flow declared in a JSON file')
+    parser.add_argument('path')
+    parser.add_argument('--prefetch', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--no-validate', action='store_true')
+    args = parser.parse_args(argv)
+    FlowSpec.load(args.path).run(validate=not args.no_validate,
+                                 prefetch=args.prefetch,
+                                 workers=args.workers)
+
+
+if __name__ == '__main__':
+    main()
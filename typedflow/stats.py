@@ -0,0 +1,157 @@
+"""
+Per-node instrumentation of a flow
+"""
+from dataclasses import asdict, dataclass, field
+import json
+import logging
+from pathlib import Path
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from typedflow.batch import Batch, ColumnarBatch
+from typedflow.nodes import ProviderNode
+
+
+__all__ = ['NodeStats', 'Profiler', 'LATENCY_BOUNDS']
+logger = logging.getLogger(__file__)
+# upper bounds (sec) of buckets of the latency histogram
+LATENCY_BOUNDS: Tuple[float, ...] = (0.001, 0.01, 0.1, 1., 10.)
+
+
+def _count(batch: Union[Batch, ColumnarBatch]) -> Tuple[int, int]:
+    """
+    The number of items and faults in a batch
+    """
+    if isinstance(batch, ColumnarBatch):
+        return len(batch), bin(batch.faults).count('1')
+    return len(batch.data), bin(batch.fault_mask()).count('1')
+
+
+@dataclass
+class NodeStats:
+    """
+    Counters of a node. latency[i] is the number of batches
+    which took at most LATENCY_BOUNDS[i] sec. The last bucket is for the rest.
+    Times include both loading / processing / dumping and
+    merging the inputs.
+    """
+    name: str
+    batches: int = 0
+    items: int = 0
+    faults: int = 0
+    wall_time: float = 0.
+    cpu_time: float = 0.
+    cache_hits: int = 0
+    cache_misses: int = 0
+    latency: List[int] = field(default_factory=lambda: [0] * (len(LATENCY_BOUNDS) + 1))
+
+    def items_per_sec(self) -> float:
+        return self.items / self.wall_time if self.wall_time > 0 else 0.
+
+    def to_dict(self) -> Dict[str, Any]:
+        dic: Dict[str, Any] = asdict(self)
+        dic['items_per_sec'] = self.items_per_sec()
+        return dic
+
+
+@dataclass
+class Profiler:
+    """
+    Collects NodeStats of nodes in an ExecutionPlan.
+    CPU time is measured in the thread running the node.
+
+    Parameters
+    -----
+    sink
+        JSON-lines file to which snapshots of all the stats are appended.
+        If None, snapshots are logged.
+    interval
+        Emit a snapshot every this many seconds (checked after each batch)
+        and at the end of a run. If None, no snapshots are emitted.
+    """
+    sink: Optional[Union[str, Path]] = None
+    interval: Optional[float] = None
+    _stats: Dict[str, NodeStats] = field(default_factory=dict, repr=False)
+    _providers: Dict[str, ProviderNode] = field(default_factory=dict, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+    _last_emit: float = field(default_factory=time.perf_counter, repr=False)
+
+    def attach(self,
+               names: Dict[str, Any]) -> None:
+        """
+        Register nodes by their names
+        """
+        for name, node in names.items():
+            self._stats.setdefault(name, NodeStats(name=name))
+            if isinstance(node, ProviderNode):
+                self._providers[name] = node
+
+    @staticmethod
+    def start() -> Tuple[float, float]:
+        return time.perf_counter(), time.thread_time()
+
+    def record(self,
+               name: str,
+               start: Tuple[float, float],
+               batch: Optional[Union[Batch, ColumnarBatch]] = None) -> None:
+        """
+        Add the time since start. If batch is given, it is counted
+        as a batch the node has produced (or dumped).
+        """
+        wall: float = time.perf_counter() - start[0]
+        cpu: float = time.thread_time() - start[1]
+        if batch is not None:
+            n_items, n_faults = _count(batch)
+        with self._lock:
+            stats: NodeStats = self._stats.setdefault(name, NodeStats(name=name))
+            stats.wall_time += wall
+            stats.cpu_time += cpu
+            if batch is None:
+                return
+            stats.batches += 1
+            stats.items += n_items
+            stats.faults += n_faults
+            for i, bound in enumerate(LATENCY_BOUNDS):
+                if wall <= bound:
+                    stats.latency[i] += 1
+                    break
+            else:
+                stats.latency[-1] += 1
+
+    def stats(self) -> Dict[str, NodeStats]:
+        """
+        A snapshot of the stats
+        """
+        with self._lock:
+            snapshot: Dict[str, NodeStats] = {
+                name: NodeStats(**{**asdict(stats), 'latency': list(stats.latency)})
+                for name, stats in self._stats.items()}
+        for name, node in self._providers.items():
+            snapshot[name].cache_hits = node.cache_table.hits
+            snapshot[name].cache_misses = node.cache_table.misses
+        return snapshot
+
+    def emit(self, batch_id: Optional[int] = None) -> None:
+        record: Dict[str, Any] = {
+            'time': time.time(),
+            'batch_id': batch_id,
+            'nodes': {name: stats.to_dict() for name, stats in self.stats().items()},
+        }
+        self._last_emit = time.perf_counter()
+        if self.sink is None:
+            logger.info(json.dumps(record))
+            return
+        with open(self.sink, 'a') as fout:
+            fout.write(json.dumps(record) + '\n')
+
+    def tick(self, batch_id: int) -> None:
+        """
+        Called after each batch
+        """
+        if self.interval is not None and time.perf_counter() - self._last_emit >= self.interval:
+            self.emit(batch_id)
+
+    def close(self) -> None:
+        if self.interval is not None:
+            self.emit()
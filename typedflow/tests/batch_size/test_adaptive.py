@@ -0,0 +1,68 @@
+from typing import List
+
+import pytest
+
+from typedflow.batch_size import AdaptiveBatchSize
+from typedflow.flow import Flow
+from typedflow.nodes import DumpNode, LoaderNode, TaskNode
+
+
+def test_grow_and_shrink():
+    sizer = AdaptiveBatchSize(target_latency=1., initial=10)
+    assert sizer.size_of(0) == 10
+    sizer.observe(0, latency=0.1)
+    assert sizer.size_of(1) == 20  # at most doubled
+    sizer.observe(1, latency=1.25)
+    assert sizer.size_of(2) == 16
+    # the size of a batch is fixed once asked
+    sizer.observe(2, latency=10.)
+    assert sizer.size_of(3) == 8
+
+
+def test_memory_ceiling():
+    sizer = AdaptiveBatchSize(max_memory=1000, initial=100, max_size=150)
+    sizer.record_memory(0, 1000)
+    sizer.record_memory(0, 1000)
+    sizer.observe(0, latency=1.)
+    assert sizer.current == 50
+    sizer.record_memory(1, 100)
+    sizer.observe(1, latency=1.)
+    assert sizer.current == 100
+    sizer.record_memory(2, 100)
+    sizer.observe(2, latency=1.)
+    assert sizer.current == 150
+
+
+def test_invalid():
+    with pytest.raises(AssertionError):
+        AdaptiveBatchSize()
+
+
+def test_flow_keeps_loaders_aligned():
+    def load_ints() -> List[int]:
+        return list(range(200))
+
+    def load_strs() -> List[str]:
+        return [str(i) for i in range(200)]
+
+    def check(i: int, s: str) -> int:
+        assert str(i) == s
+        return i
+
+    results: List[int] = []
+
+    def dump(i: int) -> None:
+        results.append(i)
+
+    ints: LoaderNode[int] = LoaderNode(func=load_ints, batch_size=2)
+    strs: LoaderNode[str] = LoaderNode(func=load_strs, batch_size=2, prefetch=3)
+    task: TaskNode[int] = TaskNode(func=check)
+    task.set_upstream_node('i', ints)
+    task.set_upstream_node('s', strs)
+    task.debug = True
+    dump_node: DumpNode = DumpNode(func=dump)
+    dump_node.set_upstream_node('i', task)
+    sizer = AdaptiveBatchSize(target_latency=1., max_size=64)
+    Flow(dump_nodes=[dump_node], debug=True).run(adaptive=sizer)
+    assert results == list(range(200))
+    assert sizer.current == 64
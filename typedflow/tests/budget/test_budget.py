@@ -0,0 +1,76 @@
+import time
+from typing import List
+
+import pytest
+
+from typedflow.budget import FlowBudget
+from typedflow.exceptions import StallError
+from typedflow.flow import Flow
+from typedflow.nodes import DumpNode, LoaderNode, TaskNode
+
+
+def build(dump_func, observe=None) -> Flow:
+    def load() -> List[int]:
+        return list(range(20))
+
+    def double(i: int) -> int:
+        if observe is not None:
+            observe()
+        return i * 2
+
+    loader: LoaderNode[int] = LoaderNode(func=load, batch_size=2)
+    task: TaskNode[int] = TaskNode(func=double)
+    task.set_upstream_node('i', loader)
+    dump: DumpNode = DumpNode(func=dump_func)
+    dump.set_upstream_node('i', task)
+    return Flow(dump_nodes=[dump], debug=True)
+
+
+def test_admit():
+    budget = FlowBudget(max_in_flight=1)
+    assert budget.admit(0)
+    assert not budget.admit(1, timeout=0.01)
+    budget.done(0)
+    assert budget.admit(1, timeout=0.01)
+
+
+def test_memory():
+    budget = FlowBudget(max_memory=10)
+    assert budget.admit(0)
+    budget.add('node', 20)
+    assert not budget.admit(1, timeout=0.01)
+    assert 'node: 20' in budget.report()
+    budget.release('node', 20)
+    assert budget.admit(1, timeout=0.01)
+    assert budget.in_flight() == [0, 1]
+
+
+def test_stall():
+    budget = FlowBudget(max_in_flight=1, stall_timeout=0.05)
+    budget.admit(0)
+    with pytest.raises(StallError):
+        budget.admit(1)
+
+
+def test_flow_in_flight():
+    budget = FlowBudget(max_in_flight=1, max_memory=1)
+    in_flight: List[int] = []
+    results: List[int] = []
+
+    def dump(i: int) -> None:
+        results.append(i)
+
+    flow: Flow = build(dump, observe=lambda: in_flight.append(len(budget.in_flight())))
+    flow.run(prefetch=4, budget=budget)
+    assert results == [i * 2 for i in range(20)]
+    assert max(in_flight) == 1
+    assert budget.memory() == 0
+
+
+def test_flow_stall():
+    def slow(i: int) -> None:
+        time.sleep(0.3)
+
+    flow: Flow = build(slow)
+    with pytest.raises(StallError):
+        flow.run(prefetch=2, budget=FlowBudget(max_in_flight=1, stall_timeout=0.1))
@@ -0,0 +1,176 @@
+import json
+from typing import Iterator, List
+
+import pytest
+
+from typedflow.checkpoint import Checkpointer
+from typedflow.flow import Flow
+from typedflow.nodes import CsvDumpNode, DumpNode, JsonlDumpNode, LoaderNode, TaskNode
+
+
+def build(out: List[int],
+          calls: List[int],
+          fail_at: int = -1,
+          seek: bool = False) -> Flow:
+    read: List[int] = []
+
+    def load() -> Iterator[int]:
+        for i in range(10):
+            read.append(i)
+            yield i
+
+    def load_from(offset: int) -> Iterator[int]:
+        return iter(range(offset, 10))
+
+    def double(i: int) -> int:
+        calls.append(i)
+        return i * 2
+
+    def dump(i: int) -> None:
+        if i == fail_at:
+            raise RuntimeError()
+        out.append(i)
+
+    loader: LoaderNode[int] = LoaderNode(func=load, batch_size=3,
+                                         seek=load_from if seek else None)
+    task = TaskNode(double)({'i': loader})
+    flow = Flow([DumpNode(dump)({'i': task}), ])
+    flow.read = read
+    return flow
+
+
+@pytest.mark.parametrize('prefetch', [0, 2])
+def test_resume(tmp_path, prefetch):
+    path = tmp_path / 'ckpt.json'
+    out: List[int] = []
+    calls: List[int] = []
+    with pytest.raises(RuntimeError):
+        build(out, calls, fail_at=14).run(checkpoint=path, prefetch=prefetch)
+    assert out == [0, 2, 4, 6, 8, 10, 12]
+    with open(path) as fin:
+        assert json.load(fin)['batch_id'] == 1
+
+    out: List[int] = []
+    calls: List[int] = []
+    flow = build(out, calls)
+    flow.run(checkpoint=path, resume=True, prefetch=prefetch)
+    assert out == [12, 14, 16, 18]
+    assert calls == [6, 7, 8, 9]
+    # items of skipped batches are read without running tasks
+    assert flow.read == list(range(10))
+
+    # nothing to do after the flow has completed
+    out: List[int] = []
+    build(out, calls).run(checkpoint=path, resume=True, prefetch=prefetch)
+    assert out == []
+
+
+def test_resume_with_seek(tmp_path):
+    path = tmp_path / 'ckpt.json'
+    with pytest.raises(RuntimeError):
+        build([], [], fail_at=8, seek=True).run(checkpoint=path)
+    out: List[int] = []
+    flow = build(out, [], seek=True)
+    flow.run(checkpoint=Checkpointer(path=path), resume=True)
+    assert out == [6, 8, 10, 12, 14, 16, 18]
+    assert flow.read == []
+
+
+def test_checkpoint_every(tmp_path):
+    path = tmp_path / 'ckpt.json'
+    with pytest.raises(RuntimeError):
+        build([], [], fail_at=14).run(checkpoint=Checkpointer(path=path, every=3))
+    assert not path.exists()
+    build([], []).run(checkpoint=Checkpointer(path=path, every=3))
+    # the last batch (the empty one which finds the loader exhausted) is saved
+    # even if it is not a multiple of every
+    with open(path) as fin:
+        assert json.load(fin)['batch_id'] == 4
+
+
+@pytest.mark.parametrize('prefetch', [0, 2])
+def test_checkpoint_every_saves_last_batch(tmp_path, prefetch):
+    path = tmp_path / 'ckpt.json'
+    calls: List[int] = []
+
+    def build_single() -> Flow:
+        def load() -> Iterator[int]:
+            return iter(range(10))
+
+        def double(i: int) -> int:
+            calls.append(i)
+            return i * 2
+
+        def dump(i: int) -> None:
+            pass
+
+        loader: LoaderNode[int] = LoaderNode(func=load, batch_size=1)
+        return Flow([DumpNode(dump)({'i': TaskNode(double)({'i': loader})}), ])
+
+    build_single().run(checkpoint=Checkpointer(path=path, every=3), prefetch=prefetch)
+    with open(path) as fin:
+        assert json.load(fin)['batch_id'] == 10
+    calls.clear()
+    build_single().run(checkpoint=Checkpointer(path=path, every=3), resume=True, prefetch=prefetch)
+    assert calls == []
+
+
+def test_checkpoint_of_another_flow(tmp_path):
+    path = tmp_path / 'ckpt.json'
+    build([], []).run(checkpoint=path)
+
+    def load() -> List[str]:
+        return ['a']
+
+    flow = Flow([DumpNode(print)({'s': LoaderNode(load)}), ])
+    with pytest.raises(AssertionError):
+        flow.run(validate=False, checkpoint=path, resume=True)
+
+
+def test_resume_file_sink(tmp_path):
+    path = tmp_path / 'ckpt.json'
+    out = tmp_path / 'out.jsonl'
+    seen: List[str] = []
+
+    def build_sink(fail: bool) -> Flow:
+        def load() -> Iterator[int]:
+            for i in range(10):
+                if fail and i == 7:
+                    seen.append(out.read_text())
+                    raise RuntimeError()
+                yield i
+
+        loader: LoaderNode[int] = LoaderNode(func=load, batch_size=3)
+        return Flow([JsonlDumpNode(path=out)({'i': loader}), ])
+
+    with pytest.raises(RuntimeError):
+        build_sink(fail=True).run(validate=False, checkpoint=path)
+    # flushed when batch 1 was checkpointed
+    assert seen[0].count('\n') == 6
+    build_sink(fail=False).run(validate=False, checkpoint=path, resume=True)
+    assert [json.loads(line)['i'] for line in out.read_text().splitlines()] == list(range(10))
+
+
+def test_resume_file_sinks_without_duplicates(tmp_path):
+    path = tmp_path / 'ckpt.json'
+    jsonl = tmp_path / 'out.jsonl'
+    csv = tmp_path / 'out.csv'
+
+    def build_sinks(fail: bool) -> Flow:
+        def load() -> Iterator[int]:
+            for i in range(20):
+                if fail and i == 15:
+                    raise RuntimeError()
+                yield i
+
+        loader: LoaderNode[int] = LoaderNode(func=load, batch_size=2)
+        return Flow([JsonlDumpNode(path=jsonl, buffer_size=2)({'i': loader}),
+                     CsvDumpNode(path=csv, buffer_size=2)({'i': loader})])
+
+    with pytest.raises(RuntimeError):
+        build_sinks(fail=True).run(validate=False, checkpoint=Checkpointer(path=path, every=3))
+    # rows after the checkpoint (batch 5) have been written
+    assert jsonl.read_text().count('\n') > 12
+    build_sinks(fail=False).run(validate=False, checkpoint=Checkpointer(path=path, every=3), resume=True)
+    assert [json.loads(line)['i'] for line in jsonl.read_text().splitlines()] == list(range(20))
+    assert csv.read_text().splitlines() == ['i'] + [str(i) for i in range(20)]
@@ -1,5 +1,6 @@
 import pytest
 
+from typedflow.batch import Batch
 from typedflow.counted_cache import CacheTable
 
 
@@ -49,3 +50,65 @@ def test_multiple_keys():
     with pytest.raises(KeyError):
         table.get(2)
     assert len(table.cache_table) == 0
+
+
+def test_spill(tmp_path):
+    table = CacheTable(life=2, budget=100, spill_dir=tmp_path, sizeof=len)
+    table.set(1, 'a' * 60)
+    table.set(2, 'b' * 60)
+    # the older one is spilled
+    assert table.cache_table[1].value is None
+    assert table.memory_size() == 60
+    assert len(list(tmp_path.iterdir())) == 1
+    assert table.get(1) == 'a' * 60
+    assert table.get(1) == 'a' * 60
+    assert len(list(tmp_path.iterdir())) == 0
+    with pytest.raises(KeyError):
+        table.get(1)
+    assert table.get(2) == 'b' * 60
+    assert table.get(2) == 'b' * 60
+    assert len(table) == 0
+    assert table.memory_size() == 0
+
+
+def test_spill_least_recently_used(tmp_path):
+    table = CacheTable(life=2, budget=100, spill_dir=tmp_path, sizeof=len)
+    table.set(1, 'a' * 40)
+    table.set(2, 'b' * 40)
+    table.get(1)
+    table.set(3, 'c' * 40)
+    assert table.cache_table[2].value is None
+    assert table.cache_table[1].value == 'a' * 40
+    assert table.get(2) == 'b' * 40
+
+
+def test_spill_batches(tmp_path):
+    table = CacheTable(life=1, budget=1, spill_dir=tmp_path)
+    for i in range(3):
+        table.set(i, Batch(batch_id=i, data=list(range(100))))
+    assert table.memory_size() == 0
+    assert table.get(1) == Batch(batch_id=1, data=list(range(100)))
+    assert len(list(tmp_path.iterdir())) == 2
+    table.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_close():
+    table = CacheTable(life=1, budget=1, sizeof=len)
+    table.set(1, 'aa')
+    table.set(2, 'bb')
+    spill_dir = table.spill_dir
+    assert len(list(spill_dir.iterdir())) == 2
+    table.close()
+    # the temporary directory is removed with the spilled values
+    assert not spill_dir.exists()
+    assert table.spill_dir is None
+    assert len(table) == 0
+
+
+def test_close_keeps_spill_dir(tmp_path):
+    table = CacheTable(life=1, budget=1, spill_dir=tmp_path, sizeof=len)
+    table.set(1, 'aa')
+    table.set(2, 'bb')
+    table.close()
+    assert tmp_path.exists() and list(tmp_path.iterdir()) == []
@@ -0,0 +1,108 @@
+import functools
+import json
+from multiprocessing.connection import Client
+from pathlib import Path
+import threading
+from typing import Iterator, List
+
+import pytest
+
+from typedflow.distributed import Coordinator, Shard, run_local, work
+from typedflow.flow import Flow
+from typedflow.nodes import JsonlDumpNode, LoaderNode, TaskNode
+
+N_ITEMS = 100
+
+
+def make_flow(out_dir: Path, shard: Shard, n_items: int = N_ITEMS) -> Flow:
+    def load() -> Iterator[int]:
+        return iter(range(n_items))
+
+    def seek(offset: int) -> Iterator[int]:
+        return iter(range(offset, n_items))
+
+    def square(i: int) -> int:
+        return i * i
+
+    loader: LoaderNode[int] = LoaderNode(func=load, seek=seek, batch_size=3)
+    task: TaskNode[int] = TaskNode(func=square)
+    task.set_upstream_node('i', loader)
+    sink: JsonlDumpNode = JsonlDumpNode(path=out_dir / f'{shard.index}.jsonl')
+    sink.set_upstream_node('i', loader)
+    sink.set_upstream_node('square', task)
+    return Flow(dump_nodes=[sink])
+
+
+def broken_flow(shard: Shard) -> Flow:
+    raise ValueError('broken')
+
+
+def read_shards(out_dir: Path, shards: List[Shard]) -> List[int]:
+    items: List[int] = []
+    for shard in shards:
+        path: Path = out_dir / f'{shard.index}.jsonl'
+        if path.exists():
+            items.extend([json.loads(line)['i'] for line in path.read_text().splitlines()])
+    return items
+
+
+def test_run_local(tmp_path):
+    shards: List[Shard] = run_local(functools.partial(make_flow, tmp_path),
+                                    n_workers=3, shard_size=4)
+    assert [shard.index for shard in shards] == list(range(len(shards)))
+    assert read_shards(tmp_path, shards) == list(range(N_ITEMS))
+
+
+def test_run_in_threads(tmp_path):
+    coordinator = Coordinator(shard_size=2)
+    threads = [threading.Thread(target=work,
+                                args=(coordinator.address, coordinator.authkey,
+                                      functools.partial(make_flow, tmp_path)),
+                                kwargs={'prefetch': 1})
+               for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    shards: List[Shard] = coordinator.run()
+    for thread in threads:
+        thread.join()
+    assert read_shards(tmp_path, shards) == list(range(N_ITEMS))
+
+
+def test_end_on_shard_boundary(tmp_path):
+    # 4 shards of 2 batches of 3 items
+    coordinator = Coordinator(shard_size=2)
+    thread = threading.Thread(target=work,
+                              args=(coordinator.address, coordinator.authkey,
+                                    functools.partial(make_flow, tmp_path, n_items=24)))
+    thread.start()
+    shards: List[Shard] = coordinator.run()
+    thread.join()
+    assert [shard.index for shard in shards] == [0, 1, 2, 3]
+    assert read_shards(tmp_path, shards) == list(range(24))
+
+
+def test_error():
+    with pytest.raises(RuntimeError, match='broken'):
+        run_local(broken_flow, n_workers=2)
+
+
+def test_retry_last_shard_on_idle_worker():
+    coordinator = Coordinator(shard_size=2)
+    coordinator.start()
+    try:
+        lost = Client(coordinator.address, authkey=coordinator.authkey)
+        assert lost.recv() == ('run', Shard(index=0, start=0, stop=2))
+        with Client(coordinator.address, authkey=coordinator.authkey) as idle:
+            assert idle.recv() == ('run', Shard(index=1, start=2, stop=4))
+            idle.send(('done', True, True))
+            # shard 0 is still running, so the idle worker is not stopped
+            assert not idle.poll(0.2)
+            lost.close()
+            assert idle.poll(5)
+            assert idle.recv() == ('run', Shard(index=0, start=0, stop=2))
+            idle.send(('done', False, False))
+            assert idle.recv() == ('stop', )
+        assert coordinator.wait(timeout=5)
+    finally:
+        coordinator.close()
+    assert coordinator.shards() == [Shard(index=0, start=0, stop=2)]
@@ -0,0 +1,134 @@
+import json
+import logging
+import pickle
+from pathlib import Path
+from typing import List
+
+from typedflow.batch import Batch, ColumnarBatch
+from typedflow.errors import ErrorSink
+from typedflow.exceptions import FAULT, FaultItem
+from typedflow.flow import Flow
+from typedflow.nodes import BatchTaskNode, DumpNode, LoaderNode, TaskNode
+
+
+def test_fault_is_singleton():
+    assert FaultItem() is FAULT
+    assert pickle.loads(pickle.dumps(FaultItem())) is FAULT
+
+
+def test_fault_mask():
+    batch: Batch = Batch(batch_id=0, data=[1, FAULT, 3, FAULT])
+    assert batch.fault_mask() == 0b1010
+    merged: ColumnarBatch = ColumnarBatch.from_batches(
+        batches=[batch, Batch(batch_id=0, data=[FAULT, 2, 3, 4], faults=1)],
+        keys=['a', 'b'],
+        length=4)
+    assert merged.fault_flags() == [True, True, False, True]
+
+
+def test_rate_limit(caplog):
+    sink: ErrorSink = ErrorSink(rate=0., burst=3)
+    with caplog.at_level(logging.WARNING):
+        for i in range(100):
+            sink.report(node='task', batch_id=0, row=i, error=ValueError(i))
+    assert len(caplog.records) == 3
+    assert sink.suppressed == 97
+    assert sink.counts == {'task: ValueError': 100}
+    sink.close()
+    assert sink.suppressed == 0
+    assert '97 failures were not logged' in caplog.records[-1].getMessage()
+
+
+def test_path(tmp_path: Path):
+    sink: ErrorSink = ErrorSink(burst=2, rate=0., path=tmp_path / 'errors.jsonl')
+    for i in range(5):
+        sink.report(node='task', batch_id=1, row=i, error=KeyError('x'))
+    sink.close()
+    records: List[dict] = [json.loads(line) for line in (tmp_path / 'errors.jsonl').read_text().splitlines()]
+    assert [r['row'] for r in records] == [0, 1]
+    assert records[0]['error'] == 'KeyError'
+    assert records[0]['traceback'] == "KeyError: 'x'\n"
+
+
+def inverse(i: int) -> float:
+    return 1 / i
+
+
+def inverse_all(i: List[int]) -> List[float]:
+    return [1 / x for x in i]
+
+
+def test_reasons():
+    def load() -> List[int]:
+        return [0, 1, 2, 0]
+
+    loader: LoaderNode[int] = LoaderNode(func=load, batch_size=4)
+    task: TaskNode[float] = TaskNode(func=inverse, error_sink=ErrorSink())
+    task.set_upstream_node('i', loader)
+    task.add_succ()
+    batch: Batch = task.get_or_produce_batch(batch_id=0)
+    assert batch.data == [FAULT, 1., .5, FAULT]
+    assert batch.faults == 0b1001
+    assert batch.reasons == {0: 'ZeroDivisionError: division by zero',
+                             3: 'ZeroDivisionError: division by zero'}
+
+
+def test_batch_task_reasons():
+    def load() -> List[int]:
+        return [1, FAULT, 0]
+
+    loader: LoaderNode[int] = LoaderNode(func=load, batch_size=3)
+    task: BatchTaskNode[float] = BatchTaskNode(func=inverse_all)
+    task.set_upstream_node('i', loader)
+    task.add_succ()
+    batch: Batch = task.get_or_produce_batch(batch_id=0)
+    assert batch.data == [FAULT, FAULT, FAULT]
+    assert batch.faults == 0b111
+    assert set(batch.reasons) == {0, 2}
+
+
+def test_flow_sink():
+    def load() -> List[int]:
+        return [0] * 50 + [1]
+
+    results: List[float] = []
+
+    def dump(x: float) -> None:
+        results.append(x)
+
+    task: TaskNode[float] = TaskNode(func=inverse)
+    task.set_upstream_node('i', LoaderNode(func=load, batch_size=8))
+    node: DumpNode = DumpNode(func=dump)
+    node.set_upstream_node('x', task)
+    sink: ErrorSink = ErrorSink(rate=0., burst=1)
+    Flow(dump_nodes=[node], error_sink=sink).run()
+    assert results == [1.]
+    assert sink.counts == {'inverse: ZeroDivisionError': 50}
+
+
+def test_node_sink():
+    def load() -> List[int]:
+        return [0, 1]
+
+    results: List[float] = []
+
+    def dump(x: float, y: float) -> None:
+        results.append(x + y)
+
+    loader: LoaderNode[int] = LoaderNode(func=load, batch_size=2)
+    own: ErrorSink = ErrorSink()
+    task: TaskNode[float] = TaskNode(func=inverse, error_sink=own)
+    task.set_upstream_node('i', loader)
+    other: TaskNode[float] = TaskNode(func=inverse)
+    other.set_upstream_node('i', loader)
+    node: DumpNode = DumpNode(func=dump)
+    node.set_upstream_node('x', task)
+    node.set_upstream_node('y', other)
+    sink: ErrorSink = ErrorSink()
+    Flow(dump_nodes=[node], error_sink=sink).run()
+    assert results == [2.]
+    # a task keeps the sink given to it
+    assert task.error_sink is own
+    assert own.counts == {'inverse: ZeroDivisionError': 1}
+    assert other.error_sink is sink
+    assert sink.counts == {'inverse: ZeroDivisionError': 1}
@@ -3,14 +3,15 @@ Integrated test
 int ----->  len(str) + int ---> print
 str --/                    ---> save_to_file path --/
 """
+import asyncio
 from pathlib import Path
 import tempfile
-from typing import Generator, List, Iterable
+from typing import AsyncGenerator, Callable, Dict, Generator, List, Iterable
 
 import pytest
 
 from typedflow.flow import Flow
-from typedflow.nodes import DumpNode, LoaderNode, TaskNode
+from typedflow.nodes import BatchTaskNode, DumpNode, LoaderNode, TaskNode
 
 
 def str_loader_node() -> LoaderNode[str]:
@@ -165,6 +166,14 @@ def test_arg_inheritance():
     flow.typecheck()
 
 
+def test_is_inherited():
+    flow = Flow(dump_nodes=[])
+    assert flow.is_inherited(List[int], Iterable[int])
+    assert flow.is_inherited(Dict[str, List[int]], Dict[str, Iterable[int]])
+    assert not flow.is_inherited(int, str)
+    assert flow.is_inherited(Callable[[int], int], Callable[[int], int])
+
+
 def test_declare_inputs_when_definition():
     def load() -> List[int]:
         return []
@@ -242,3 +251,132 @@ def test_debug_mode():
     flow.typecheck()
     with pytest.raises(TypeError):
         flow.run()
+
+
+def test_pipelined_run(capsys):
+    def op(s: str, i: int) -> int:
+        return len(s) + i
+
+    def dump_int(i: int) -> None:
+        print(str(i))
+
+    op_node = TaskNode(op)({'s': str_loader_node(), 'i': int_loader_node()})
+    dumper = DumpNode(dump_int)({'i': op_node})
+    flow = Flow(dump_nodes=[dumper, ])
+    flow.run(prefetch=2)
+    captured = capsys.readouterr()
+    assert captured.out == '2\n6\n12\n'
+    assert dumper.finished
+
+
+def test_pipelined_run_with_different_lengths(capsys):
+    def load_long() -> List[int]:
+        return list(range(10, 15))
+
+    def dump_int(i: int) -> None:
+        print(str(i))
+
+    long_loader: LoaderNode[int] = LoaderNode(func=load_long, batch_size=2)
+    long_dumper = DumpNode(dump_int)({'i': long_loader})
+    short_dumper = DumpNode(dump_int)({'i': int_loader_node()})
+    flow = Flow(dump_nodes=[long_dumper, short_dumper])
+    flow.run(prefetch=1)
+    captured = capsys.readouterr()
+    assert captured.out == '10\n11\n0\n1\n12\n13\n2\n14\n'
+    assert long_dumper.finished and short_dumper.finished
+
+
+def test_pipelined_debug_mode():
+    def load_str() -> Generator[str, None, None]:
+        yield 'a'
+        yield 3
+
+    def task(a: str) -> int:
+        return len(a)
+
+    def dump(a: int) -> None:
+        print(str(a))
+
+    node_task = TaskNode(task)({'a': LoaderNode(load_str)})
+    node_dump = DumpNode(dump)({'a': node_task})
+    flow = Flow([node_dump, ], debug=True)
+    with pytest.raises(TypeError):
+        flow.run(prefetch=1)
+
+
+def test_async_run(capsys):
+    async def load_int() -> AsyncGenerator[int, None]:
+        for i in range(5):
+            yield i
+
+    running: List[int] = [0, 0]  # the number of running calls and its peak
+
+    async def slow_double(i: int) -> int:
+        running[0] += 1
+        running[1] = max(running)
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+        return i * 2
+
+    async def dump(s: str, i: int) -> None:
+        await asyncio.sleep(0.01)
+        print(f'{s} {i}')
+
+    double = TaskNode(slow_double)({'i': LoaderNode(load_int, batch_size=2)})
+    dumper = DumpNode(dump)({'s': str_loader_node(), 'i': double})
+    flow = Flow([dumper, ])
+    asyncio.run(flow.arun(concurrency=4))
+    # items in a batch run concurrently
+    assert running[1] == 2
+    captured = capsys.readouterr()
+    assert captured.out == 'hi 0\nhello 2\nkonnichiwa 4\n'
+
+
+def test_async_node_in_sync_run():
+    async def task(s: str) -> int:
+        return len(s)
+
+    def dump(i: int) -> None:
+        print(i)
+
+    dumper = DumpNode(dump)({'i': TaskNode(task)({'s': str_loader_node()})})
+    flow = Flow([dumper, ])
+    with pytest.raises(AssertionError):
+        flow.run()
+
+
+def test_batch_task_typecheck():
+    def lengths(s: List[str]) -> List[int]:
+        return [len(item) for item in s]
+
+    def dump_int(i: int) -> None:
+        print(i)
+
+    def dump_str(s: str) -> None:
+        print(s)
+
+    task = BatchTaskNode(lengths)({'s': str_loader_node()})
+    flow = Flow([DumpNode(dump_int)({'i': task}), ])
+    flow.typecheck()
+    task = BatchTaskNode(lengths)({'s': str_loader_node()})
+    flow = Flow([DumpNode(dump_str)({'s': task}), ])
+    with pytest.raises(AssertionError):
+        flow.typecheck()
+
+
+def test_cache_budget(tmp_path, capsys):
+    def op(s: str, i: int) -> int:
+        return len(s) + i
+
+    def dump_int(i: int) -> None:
+        print(str(i))
+
+    op_node = TaskNode(op)({'s': str_loader_node(), 'i': int_loader_node()})
+    flow = Flow([DumpNode(dump_int)({'i': op_node}), DumpNode(dump_int)({'i': op_node})],
+                cache_budget=1,
+                spill_dir=tmp_path)
+    flow.run()
+    assert op_node.cache_table.budget == 1
+    captured = capsys.readouterr()
+    assert captured.out == '2\n6\n2\n6\n12\n12\n'
+    assert len(list(tmp_path.iterdir())) == 0
@@ -0,0 +1,74 @@
+import gc
+from typing import List
+
+import pytest
+
+from typedflow import gc_policy
+from typedflow.flow import Flow
+from typedflow.gc_policy import GCPolicy
+from typedflow.nodes import DumpNode, LoaderNode
+
+
+@pytest.fixture
+def collections(monkeypatch) -> List[int]:
+    called: List[int] = []
+    monkeypatch.setattr(gc, 'collect', lambda *args: called.append(1))
+    return called
+
+
+def build(policy: GCPolicy) -> Flow:
+    def load() -> List[int]:
+        return list(range(10))
+
+    def dump(i: int) -> None:
+        pass
+
+    node: DumpNode = DumpNode(func=dump)
+    node.set_upstream_node('i', LoaderNode(func=load, batch_size=2))
+    return Flow(dump_nodes=[node], gc_policy=policy)
+
+
+def test_off_by_default(collections):
+    build(GCPolicy()).run()
+    build(GCPolicy()).run(prefetch=1)
+    assert collections == []
+
+
+@pytest.mark.parametrize('prefetch', [0, 1])
+def test_every(collections, prefetch):
+    # 5 batches and the last empty one
+    build(GCPolicy(every=2)).run(prefetch=prefetch)
+    assert len(collections) == 3
+
+
+def test_threshold(collections):
+    policy = GCPolicy(threshold=1)
+    policy.setup()
+    policy.after_batch(0)
+    # RSS is still over the threshold, so not collected after every batch
+    policy.after_batch(1)
+    assert len(collections) == 1
+
+
+def test_threshold_without_rss(collections, monkeypatch):
+    monkeypatch.setattr(gc_policy, '_rss', lambda: None)
+    policy = GCPolicy(threshold=1)
+    policy.setup()
+    policy.after_batch(0)
+    assert collections == []
+
+
+def test_freeze():
+    frozen: List[int] = []
+
+    def dump(i: int) -> None:
+        frozen.append(gc.get_freeze_count())
+
+    def load() -> List[int]:
+        return [1]
+
+    node: DumpNode = DumpNode(func=dump)
+    node.set_upstream_node('i', LoaderNode(func=load))
+    Flow(dump_nodes=[node], gc_policy=GCPolicy(freeze=True)).run()
+    assert frozen[0] > 0
+    assert gc.get_freeze_count() == 0
@@ -0,0 +1,62 @@
+import time
+from typing import List
+
+from typedflow.flow import Flow
+from typedflow.graph import Graph
+from typedflow.nodes import DumpNode, LoaderNode, TaskNode
+
+
+def load() -> List[int]:
+    return list(range(4))
+
+
+def add(a: int, b: int) -> int:
+    return a + b
+
+
+def dump(i: int) -> None:
+    pass
+
+
+def ladder(n_layers: int) -> List[DumpNode]:
+    """
+    Every layer has two tasks which read both tasks of the previous layer,
+    so the number of paths doubles at each layer.
+    All the tasks share the same function.
+    """
+    layer: List = [LoaderNode(func=load, batch_size=2), LoaderNode(func=load, batch_size=2)]
+    for _ in range(n_layers):
+        new_layer: List[TaskNode[int]] = []
+        for _ in range(2):
+            task: TaskNode[int] = TaskNode(func=add)
+            task.set_upstream_node('a', layer[0])
+            task.set_upstream_node('b', layer[1])
+            new_layer.append(task)
+        layer = new_layer
+    node: DumpNode = DumpNode(func=dump)
+    node.set_upstream_node('i', layer[0])
+    return [node]
+
+
+def test_graph():
+    dump_nodes: List[DumpNode] = ladder(2)
+    graph = Graph(dump_nodes=dump_nodes)
+    # 2 loaders, 3 tasks (the last one is not used) and a dump
+    assert len(graph) == 6
+    assert len(graph.loaders) == 2
+    for i, precs in enumerate(graph.precs):
+        assert all([prec < i for prec in precs.values()])
+    dump_id: int = graph.id_of(dump_nodes[0])
+    assert dump_id == len(graph) - 1
+    assert graph.succs[dump_id] == []
+    assert graph.name_of(dump_nodes[0]).endswith(':dump')
+
+
+def test_large_flow_is_validated_quickly():
+    flow = Flow(dump_nodes=ladder(1000))
+    start: float = time.perf_counter()
+    flow.validate()
+    loaders = flow.get_loader_nodes_with_broadcast()
+    assert time.perf_counter() - start < 1.
+    assert len(loaders) == 2
+    assert len(flow.graph) == 2002
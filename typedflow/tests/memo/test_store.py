@@ -0,0 +1,88 @@
+from typing import List
+
+from typedflow.batch import ColumnarBatch
+from typedflow.memo import ResultStore, batch_digest, func_digest
+from typedflow.nodes import LoaderNode, TaskNode
+
+
+def load() -> List[str]:
+    return ['hi', 'hello', 'konnichiwa']
+
+
+def batch(strs: List[str]) -> ColumnarBatch:
+    return ColumnarBatch.from_columns(batch_id=0, columns={'s': strs}, length=len(strs))
+
+
+def test_digests():
+    def f(s: str) -> int:
+        return len(s)
+
+    def g(s: str) -> int:
+        return len(s) + 1
+
+    assert func_digest(f) == func_digest(f)
+    assert func_digest(f) != func_digest(g)
+    assert batch_digest(batch(['a', 'b'])) == batch_digest(batch(['a', 'b']))
+    assert batch_digest(batch(['a', 'b'])) != batch_digest(batch(['a', 'c']))
+
+
+def test_put_and_get(tmp_path):
+    store = ResultStore(path=tmp_path / 'store.db')
+    key = store.make_key('f', batch(['a']))
+    assert store.get(key) is None
+    store.put(key, [1])
+    assert store.get(key) == [1]
+    store.close()
+    # persistent
+    store = ResultStore(path=tmp_path / 'store.db')
+    assert store.get(key) == [1]
+
+
+def test_lru_eviction(tmp_path):
+    store = ResultStore(path=tmp_path / 'store.db', max_bytes=100)
+    store.put('a', ['a' * 30])
+    store.put('b', ['b' * 30])
+    store.get('a')
+    store.put('c', ['c' * 30])
+    assert store.total_size() <= 100
+    assert store.get('b') is None
+    assert store.get('a') is not None
+    assert store.get('c') is not None
+
+
+def test_memoized_task(tmp_path):
+    calls: List[str] = []
+
+    def count(s: str) -> int:
+        calls.append(s)
+        return len(s)
+
+    def run() -> List[int]:
+        node = TaskNode(count, store=ResultStore(path=tmp_path / 'store.db'))
+        node.set_upstream_node('s', LoaderNode(func=load, batch_size=2))
+        node.add_succ()
+        return node.get_or_produce_batch(0).data + node.get_or_produce_batch(1).data
+
+    assert run() == [2, 5, 10]
+    assert calls == ['hi', 'hello', 'konnichiwa']
+    assert run() == [2, 5, 10]
+    assert len(calls) == 3
+
+
+def test_faults_are_not_memoized(tmp_path):
+    calls: List[str] = []
+
+    def fail_once(s: str) -> int:
+        calls.append(s)
+        if len(calls) == 1:
+            raise ValueError()
+        return len(s)
+
+    store = ResultStore(path=tmp_path / 'store.db')
+    for _ in range(2):
+        node = TaskNode(fail_once, store=store)
+        node.set_upstream_node('s', LoaderNode(func=load, batch_size=2))
+        node.add_succ()
+        node.get_or_produce_batch(0)
+    assert len(store) == 1
+    assert calls == ['hi', 'hello', 'hi', 'hello']
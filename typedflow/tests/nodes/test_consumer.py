@@ -2,7 +2,8 @@ from typing import Generator, List, TypedDict
 
 import pytest
 
-from typedflow.batch import Batch
+from typedflow.batch import Batch, ColumnarBatch
+from typedflow.exceptions import FaultItem
 from typedflow.nodes import DumpNode, LoaderNode, TaskNode
 
 
@@ -174,3 +175,61 @@ def test_batch_failrure(capsys):
     dumper.run_and_dump(batch_id=1)
     captured = capsys.readouterr()
     assert captured.out == 'ohoh\n2\n4\n10\n14\n'
+
+
+def test_columnar_merging():
+    node = int_str_dump_node()
+    node.set_upstream_node('s', str_loader_node())
+    node.set_upstream_node('i', int_loader_node())
+    strs = ['hi', FaultItem(), 'bye']
+    ints = [1, 2, FaultItem()]
+    batch = node._merge_batches({'s': Batch(batch_id=0, data=strs),
+                                 'i': Batch(batch_id=0, data=ints)})
+    assert isinstance(batch, ColumnarBatch)
+    # ordered as the parameters of the function, without copies
+    assert batch.keys() == ['i', 's']
+    assert batch.columns['s'] is strs
+    assert batch.fault_flags() == [False, True, True]
+    assert batch.valid_positions() == [0]
+
+
+def test_dump_columnar_batch(capsys):
+    node = int_str_dump_node()
+    batch = ColumnarBatch.from_columns(batch_id=0,
+                                       columns={'s': ['a', 'b', 'c'], 'i': [1, FaultItem(), 3, 4]},
+                                       length=3)
+    node.dump(batch)
+    out, _ = capsys.readouterr()
+    assert out == '1 a\n3 c\n'
+
+
+def test_keyword_only_arguments(capsys):
+    def printer(*, s: str, i: int) -> None:
+        print(f'{str(i)} {s}')
+
+    node: DumpNode = DumpNode(func=printer)
+    (node < int_loader_node())('i')
+    (node < str_loader_node())('s')
+    node.run_and_dump(batch_id=0)
+    out, _ = capsys.readouterr()
+    assert out == '1 hi\n2 hello\n'
+
+
+def test_call_plan(monkeypatch):
+    node = int_str_dump_node()
+    sl = str_loader_node()
+    node.set_upstream_node('s', sl)
+    assert node.call_plan.keys == ['s']
+    assert not node.call_plan.positional
+    il = int_loader_node()
+    node.set_upstream_node('i', il)
+    plan = node.call_plan
+    assert plan.keys == ['i', 's']
+    assert plan.positional
+    assert plan.precs[0] is il
+    assert plan.arg_types == {'i': int, 's': str}
+    # no reflection per batch
+    monkeypatch.setattr('inspect.signature', None)
+    monkeypatch.setattr('typedflow.nodes.base.get_type_hints', None)
+    assert node.accept(batch_id=0).data == [{'i': 1, 's': 'hi'}, {'i': 2, 's': 'hello'}]
+    assert node.call_plan is plan
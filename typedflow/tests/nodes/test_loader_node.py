@@ -1,3 +1,4 @@
+import time
 from typing import Generator, List, TypedDict
 
 import pytest
@@ -104,3 +105,82 @@ def test_loader_with_multiple_targets():
     last_task.accept(batch_id=0)
     with pytest.raises(EndOfBatch):
         last_task.accept(batch_id=0)
+
+
+def test_batch_id_of_produced_batches(loader_node):
+    node = loader_node
+    node.add_succ()
+    assert node.get_or_produce_batch(0).batch_id == 0
+    assert node.get_or_produce_batch(1).batch_id == 1
+    with pytest.raises(EndOfBatch):
+        node.get_or_produce_batch(2)
+    assert node.finished
+
+
+def test_batch_id_mismatch(loader_node):
+    node = loader_node
+    node.add_succ()
+    with pytest.raises(AssertionError):
+        node.get_or_produce_batch(1)
+
+
+def test_prefetch():
+    read: List[int] = []
+
+    def gen() -> Generator[int, None, None]:
+        for i in range(10):
+            read.append(i)
+            yield i
+
+    node: LoaderNode[int] = LoaderNode(func=gen, batch_size=2, prefetch=2)
+    node.add_succ()
+    assert len(read) == 0  # the thread starts lazily
+    assert node.get_or_produce_batch(0).data == [0, 1]
+    time.sleep(0.1)
+    # 1 batch has been consumed and the next 2 batches are in the queue
+    assert len(read) >= 6
+    assert node.get_or_produce_batch(1).data == [2, 3]
+    node.close()
+
+
+def test_prefetch_till_the_end():
+    node: LoaderNode[str] = LoaderNode(func=load, batch_size=2, prefetch=4)
+    node.add_succ()
+    assert node.get_or_produce_batch(0).data == ['hi', 'hello']
+    assert node.get_or_produce_batch(1).data == ['konnichiwa']
+    with pytest.raises(EndOfBatch):
+        node.get_or_produce_batch(2)
+    node.close()
+
+
+def test_prefetch_error():
+    def gen() -> Generator[int, None, None]:
+        yield 1
+        raise ValueError()
+
+    node: LoaderNode[int] = LoaderNode(func=gen, batch_size=2, prefetch=1)
+    node.add_succ()
+    with pytest.raises(ValueError):
+        node.get_or_produce_batch(0)
+    node.close()
+
+
+def test_opened_lazily():
+    opened: List[int] = []
+
+    def numbers() -> List[int]:
+        opened.append(1)
+        return list(range(10))
+
+    node: LoaderNode[int] = LoaderNode(func=numbers, batch_size=2)
+    assert opened == []
+    node.cache_table.life = 1
+    assert node.get_or_produce_batch(batch_id=0).data == [0, 1]
+    assert opened == [1]
+
+    # never opened when restarted by seek
+    node = LoaderNode(func=numbers, batch_size=2, seek=lambda offset: range(offset, 10))
+    node.skip_to(batch_id=2, offset=4)
+    node.cache_table.life = 1
+    assert node.get_or_produce_batch(batch_id=2).data == [4, 5]
+    assert opened == [1]
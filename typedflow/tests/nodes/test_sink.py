@@ -0,0 +1,107 @@
+import csv
+from dataclasses import dataclass
+import json
+import subprocess
+import sys
+from typing import List
+
+import pytest
+
+from typedflow.batch import Batch
+from typedflow.exceptions import FaultItem
+from typedflow.flow import Flow
+from typedflow.io import open_file
+from typedflow.nodes import CsvDumpNode, JsonlDumpNode, LoaderNode, ParquetDumpNode, TaskNode
+
+
+@dataclass
+class Item:
+    name: str
+    value: float
+
+
+def build(sink) -> Flow:
+    def load() -> List[int]:
+        return list(range(10))
+
+    def invert(i: int) -> float:
+        return 1 / i
+
+    def to_item(i: int) -> Item:
+        return Item(name=str(i), value=i / 2)
+
+    loader: LoaderNode[int] = LoaderNode(func=load, batch_size=3)
+    inv: TaskNode[float] = TaskNode(func=invert)
+    inv.set_upstream_node('i', loader)
+    item: TaskNode[Item] = TaskNode(func=to_item)
+    item.set_upstream_node('i', loader)
+    sink.set_upstream_node('inv', inv)
+    sink.set_upstream_node('item', item)
+    return Flow(dump_nodes=[sink])
+
+
+@pytest.mark.parametrize('suffix', ['', '.gz', '.bz2', '.xz'])
+def test_jsonl(tmp_path, suffix):
+    path = tmp_path / f'out.jsonl{suffix}'
+    build(JsonlDumpNode(path=path, buffer_size=4)).run()
+    with open_file(path, 'rt') as fin:
+        rows = [json.loads(line) for line in fin]
+    # the first row (1 / 0) is a fault
+    assert len(rows) == 9
+    assert rows[0] == {'inv': 1.0, 'item': {'name': '1', 'value': 0.5}}
+
+
+def test_buffering(tmp_path):
+    path = tmp_path / 'out.jsonl'
+    node = JsonlDumpNode(path=path, buffer_size=3)
+    node.dump(Batch(batch_id=0, data=[{'a': 1}, {'a': 2}]))
+    assert not path.exists()
+    node.dump(Batch(batch_id=1, data=[{'a': 3}, FaultItem()]))
+    # flushed into the handle
+    assert path.exists()
+    node.dump(Batch(batch_id=2, data=[{'a': 4}]))
+    node.close()
+    assert [json.loads(line)['a'] for line in path.read_text().splitlines()] == [1, 2, 3, 4]
+
+
+def test_csv(tmp_path):
+    path = tmp_path / 'out.csv'
+    node = CsvDumpNode(path=path, delimiter='\t')
+    node.dump(Batch(batch_id=0, data=[{'a': 1, 'b': 'x'}, FaultItem(), {'a': 2, 'b': 'y'}]))
+    node.close()
+    with open(path, newline='') as fin:
+        assert list(csv.reader(fin, delimiter='\t')) == [['a', 'b'], ['1', 'x'], ['2', 'y']]
+
+
+def test_csv_reopen(tmp_path):
+    # a node is closed at the end of every run and opened again by the next one
+    path = tmp_path / 'out.csv'
+    node = CsvDumpNode(path=path)
+    for i in range(2):
+        node.dump(Batch(batch_id=0, data=[{'a': i}]))
+        node.close()
+        assert path.read_text().splitlines() == ['a', str(i)]
+
+
+def test_csv_append(tmp_path):
+    path = tmp_path / 'out.csv'
+    for i in range(2):
+        node = CsvDumpNode(path=path, append=i > 0)
+        node.dump(Batch(batch_id=0, data=[{'a': i}]))
+        node.close()
+    assert path.read_text().splitlines() == ['a', '0', '1']
+
+
+def test_parquet(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    path = tmp_path / 'out.parquet'
+    node = ParquetDumpNode(path=path, buffer_size=2)
+    node.dump(Batch(batch_id=0, data=[{'a': i, 'b': str(i)} for i in range(5)]))
+    node.close()
+    assert pq.read_table(str(path)).to_pydict() == {'a': list(range(5)), 'b': [str(i) for i in range(5)]}
+
+
+def test_sinks_import_pyarrow_lazily():
+    # a fresh interpreter, because test_parquet may import it
+    code: str = 'import sys; from typedflow.nodes import CsvDumpNode; print("pyarrow" in sys.modules)'
+    assert subprocess.check_output([sys.executable, '-c', code], text=True).strip() == 'False'
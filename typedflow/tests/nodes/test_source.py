@@ -0,0 +1,220 @@
+import csv
+import gzip
+import json
+import struct
+from typing import Any, Dict, List
+
+import pytest
+
+from typedflow.flow import Flow
+from typedflow.nodes import (
+    CsvLoaderNode,
+    DumpNode,
+    JsonlLoaderNode,
+    LoaderNode,
+    RecordLoaderNode,
+    TextLoaderNode,
+)
+
+
+def read_all(node: LoaderNode) -> List[Any]:
+    items: List[Any] = []
+    for batch in node.load():
+        assert len(batch.data) <= node.batch_size
+        items.extend(batch.data)
+    return items
+
+
+@pytest.mark.parametrize('use_mmap', [False, True])
+def test_text(tmp_path, use_mmap):
+    path = tmp_path / 'in.txt'
+    lines = [f'line {i} ' + 'x' * i for i in range(100)]
+    path.write_text('\n'.join(lines) + '\n')
+    node = TextLoaderNode(path=path, batch_size=7, chunk_size=64, use_mmap=use_mmap)
+    assert read_all(node) == lines
+
+
+def test_text_without_trailing_newline(tmp_path):
+    path = tmp_path / 'in.txt'
+    path.write_text('a\nb')
+    assert read_all(TextLoaderNode(path=path, chunk_size=1)) == ['a', 'b']
+
+
+def test_lazy(tmp_path):
+    # the file is not opened until the first batch
+    TextLoaderNode(path=tmp_path / 'not_exists.txt')
+
+
+def test_jsonl_gzip(tmp_path):
+    path = tmp_path / 'in.jsonl.gz'
+    rows = [{'i': i, 's': 'é' * i} for i in range(50)]
+    with gzip.open(path, 'wt') as fout:
+        fout.write('\n'.join([json.dumps(row) for row in rows]) + '\n\n')
+    assert read_all(JsonlLoaderNode(path=path, batch_size=8, chunk_size=100)) == rows
+
+
+def test_jsonl_invalid(tmp_path):
+    path = tmp_path / 'in.jsonl'
+    path.write_text('{"a": 1}\n{"a": \n')
+    with pytest.raises(json.JSONDecodeError):
+        read_all(JsonlLoaderNode(path=path))
+
+
+def test_jsonl_two_values_in_line(tmp_path):
+    path = tmp_path / 'in.jsonl'
+    path.write_text('{"a": 1}\n{"a": 2}, {"a": 3}\n')
+    with pytest.raises(json.JSONDecodeError):
+        read_all(JsonlLoaderNode(path=path))
+
+
+def test_csv(tmp_path):
+    path = tmp_path / 'in.csv'
+    with open(path, 'w', newline='') as fout:
+        writer = csv.writer(fout)
+        writer.writerow(['a', 'b'])
+        writer.writerows([[str(i), f'multi\nline {i}'] for i in range(10)])
+    node = CsvLoaderNode(path=path, batch_size=3)
+    assert node.get_return_type() == Dict[str, str]
+    assert read_all(node) == [{'a': str(i), 'b': f'multi\nline {i}'} for i in range(10)]
+    assert read_all(CsvLoaderNode(path=path, header=False))[0] == ['a', 'b']
+
+
+def test_records(tmp_path):
+    fixed = tmp_path / 'fixed.bin'
+    fixed.write_bytes(b''.join([bytes([i]) * 4 for i in range(10)]))
+    assert read_all(RecordLoaderNode(path=fixed, record_size=4, chunk_size=7)) == \
+        [bytes([i]) * 4 for i in range(10)]
+
+    prefixed = tmp_path / 'prefixed.bin'
+    records = [b'r' * i for i in range(20)]
+    prefixed.write_bytes(b''.join([struct.pack('<I', len(r)) + r for r in records]))
+    assert read_all(RecordLoaderNode(path=prefixed, chunk_size=10)) == records
+
+
+@pytest.mark.parametrize('use_mmap', [False, True])
+def test_records_seek(tmp_path, use_mmap):
+    path = tmp_path / 'fixed.bin'
+    path.write_bytes(b''.join([bytes([i]) * 4 for i in range(10)]))
+    node = RecordLoaderNode(path=path, record_size=4, batch_size=3, chunk_size=7, use_mmap=use_mmap)
+    starts: List[int] = []
+    read_chunks = node._read_chunks
+
+    def record_start(start: int = 0):
+        starts.append(start)
+        return read_chunks(start)
+
+    node._read_chunks = record_start
+    node.skip_to(batch_id=2, offset=6)
+    assert read_all(node) == [bytes([i]) * 4 for i in range(6, 10)]
+    # the skipped records are not read
+    assert starts == [24]
+
+
+def record_starts(node: LoaderNode) -> List[int]:
+    starts: List[int] = []
+    parse = node._parse
+
+    def record_start(start: int = 0, skip: int = 0):
+        starts.append(start)
+        return parse(start, skip)
+
+    node._parse = record_start
+    return starts
+
+
+@pytest.mark.parametrize('use_mmap', [False, True])
+def test_text_seek(tmp_path, use_mmap):
+    path = tmp_path / 'in.txt'
+    lines = [f'line {i}' for i in range(100)]
+    path.write_text('\n'.join(lines))
+    node = TextLoaderNode(path=path, batch_size=3, chunk_size=64, use_mmap=use_mmap)
+    starts: List[int] = record_starts(node)
+    node.skip_to(batch_id=20, offset=60)
+    assert read_all(node) == lines[60:]
+    # the file is read from the chunk including the 60th line
+    assert len(starts) == 1
+    assert 0 < starts[0] <= len('\n'.join(lines[:60])) + 1 < starts[0] + 64
+
+    node = TextLoaderNode(path=path, batch_size=3, chunk_size=64, use_mmap=use_mmap)
+    node.skip_to(batch_id=40, offset=120)
+    assert read_all(node) == []
+
+
+def test_jsonl_seek(tmp_path):
+    path = tmp_path / 'in.jsonl'
+    rows = [{'i': i} for i in range(50)]
+    path.write_text('\n\n'.join([json.dumps(row) for row in rows]) + '\n')
+    for offset in [0, 1, 17, 49, 50]:
+        node = JsonlLoaderNode(path=path, batch_size=4, chunk_size=32)
+        node.skip_to(batch_id=1, offset=offset)
+        assert read_all(node) == rows[offset:]
+
+
+@pytest.mark.parametrize('header', [False, True])
+def test_csv_seek(tmp_path, monkeypatch, header):
+    monkeypatch.setattr(CsvLoaderNode, 'csv_index_every', 3)
+    path = tmp_path / 'in.csv'
+    rows = [[str(i), f'multi\r\nline é {i}'] for i in range(10)]
+    with open(path, 'w', newline='', encoding='utf-8-sig') as fout:
+        writer = csv.writer(fout)
+        if header:
+            writer.writerow(['a', 'b'])
+        writer.writerows(rows)
+    for offset in range(11):
+        node = CsvLoaderNode(path=path, header=header, encoding='utf-8-sig', batch_size=2)
+        starts: List[int] = record_starts(node)
+        node.skip_to(batch_id=1, offset=offset)
+        expected = [dict(zip(['a', 'b'], row)) for row in rows[offset:]] if header else rows[offset:]
+        assert read_all(node) == expected
+        assert (starts[0] > 0) == (offset >= 3 or header)
+
+
+def test_index_is_built_once(tmp_path):
+    path = tmp_path / 'in.txt'
+    path.write_text('\n'.join([str(i) for i in range(10)]))
+    scans: List[int] = []
+
+    def skip(offset: int) -> List[str]:
+        node = TextLoaderNode(path=path, batch_size=3)
+        scan = node._scan
+
+        def count_scan():
+            scans.append(offset)
+            return scan()
+
+        node._scan = count_scan
+        node.skip_to(batch_id=1, offset=offset)
+        return read_all(node)
+
+    assert skip(3) == ['3', '4', '5', '6', '7', '8', '9']
+    assert skip(6) == ['6', '7', '8', '9']
+    assert scans == [3]
+    # the index is rebuilt when the file is modified
+    path.write_text('\n'.join([str(i) for i in range(20)]))
+    assert skip(15) == ['15', '16', '17', '18', '19']
+    assert scans == [3, 15]
+
+
+def test_compressed_text_skip(tmp_path):
+    # compressed files cannot be sought, so the skipped lines are read
+    path = tmp_path / 'in.txt.gz'
+    with gzip.open(path, 'wt') as fout:
+        fout.write('\n'.join([str(i) for i in range(10)]))
+    node = TextLoaderNode(path=path, batch_size=3)
+    assert node.seek is None
+    node.skip_to(batch_id=2, offset=6)
+    assert read_all(node) == ['6', '7', '8', '9']
+
+
+def test_flow(tmp_path):
+    path = tmp_path / 'in.jsonl'
+    path.write_text('\n'.join([json.dumps({'i': i}) for i in range(10)]))
+    total: List[int] = []
+
+    def dump(row: Dict[str, Any]) -> None:
+        total.append(row['i'])
+
+    dump_node: DumpNode = DumpNode(func=dump)
+    dump_node.set_upstream_node('row', JsonlLoaderNode(path=path, batch_size=4))
+    Flow(dump_nodes=[dump_node]).run()
+    assert total == list(range(10))
@@ -1,7 +1,13 @@
-from typing import List, Union
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Union
 
-from typedflow.exceptions import FaultItem
-from typedflow.nodes import TaskNode, LoaderNode, DumpNode
+import pytest
+
+from typedflow.batch import Batch
+from typedflow.exceptions import FAULT, FaultItem
+from typedflow.flow import Flow
+from typedflow.nodes import BatchTaskNode, TaskNode, LoaderNode, DumpNode
 
 
 def lst() -> List[str]:
@@ -58,6 +64,32 @@ def test_fault_item():
     assert batch.data[1] == len('konnichiwa')
 
 
+def test_all_fault_batch():
+    # the product has the same length even if no rows tell the keys
+    for node in [TaskNode(func=count_chars), tasknode()]:
+        product = node.process(Batch(batch_id=0, data=[FAULT, FAULT]))
+        assert product.data == [FAULT, FAULT]
+
+
+def test_async_returns_exception():
+    # an exception returned by func is a product, not a failure
+    async def to_error(s: str) -> Exception:
+        if s == 'hello':
+            raise ValueError(s)
+        return ValueError(s)
+
+    node: TaskNode[Exception] = TaskNode(func=to_error)
+    node.set_upstream_node('s', str_loader_node())
+    node.add_succ()
+
+    async def run() -> Batch:
+        return await node.aget_or_produce_batch(batch_id=0, semaphore=asyncio.Semaphore(2))
+    batch: Batch = asyncio.run(run())
+    assert isinstance(batch.data[0], ValueError) and batch.data[0].args == ('hi', )
+    assert batch.data[1] is FAULT
+    assert batch.reasons == {1: batch.reasons[1]} and batch.reasons[1].startswith('ValueError')
+
+
 def test_lt_and_gt():
     loader: LoaderNode[str] = LoaderNode(func=lst_with_fi, batch_size=2)
     node = tasknode()
@@ -111,3 +143,98 @@ def test_with_fault_item():
     res = c.get_or_produce_batch(batch_id=0)
     assert len(res.data) == 5
     assert res.data == [FaultItem(), '3', '5', FaultItem(), FaultItem()]
+
+
+def fail_on_hello(s: str) -> int:
+    if s == 'hello':
+        raise ValueError(s)
+    return len(s)
+
+
+def test_process_pool_executor():
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        loader: LoaderNode[str] = LoaderNode(func=lst_with_fi, batch_size=4)
+        node: TaskNode[int] = TaskNode(func=fail_on_hello,
+                                       executor=executor,
+                                       chunksize=2)
+        (node < loader)('s')
+        node.add_succ()
+        batch = node.get_or_produce_batch(batch_id=0)
+    assert batch.data == [2, FaultItem(), FaultItem(), len('konnichiwa')]
+
+
+def test_process_pool_executor_debug():
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        node: TaskNode[int] = TaskNode(func=fail_on_hello, executor=executor)
+        (node < str_loader_node())('s')
+        node.add_succ()
+        node.debug = True
+        with pytest.raises(ValueError):
+            node.get_or_produce_batch(batch_id=0)
+
+
+def count_chars_of_column(s: List[str]) -> List[int]:
+    return [len(item) for item in s]
+
+
+def test_batch_task():
+    calls: List[List[str]] = []
+
+    def count(s: List[str]) -> List[int]:
+        calls.append(s)
+        return count_chars_of_column(s)
+
+    loader: LoaderNode[str] = LoaderNode(func=lst_with_fi, batch_size=4)
+    node: BatchTaskNode[int] = BatchTaskNode(func=count)
+    (node < loader)('s')
+    node.add_succ()
+    assert node.get_arg_types() == {'s': str}
+    assert node.get_return_type() == int
+    batch = node.get_or_produce_batch(batch_id=0)
+    assert batch.data == [2, 5, FaultItem(), len('konnichiwa')]
+    assert calls == [['hi', 'hello', 'konnichiwa']]
+
+
+def test_batch_task_cannot_modify_shared_input():
+    out: List[int] = []
+
+    def negate_first(i: List[int]) -> List[int]:
+        i[0] = -1
+        return i
+
+    def dump(i: int) -> None:
+        out.append(i)
+
+    loader: LoaderNode[int] = LoaderNode(func=lambda: [1, 2, 3], batch_size=3)
+    task: BatchTaskNode[int] = BatchTaskNode(func=negate_first)({'i': loader})
+    flow = Flow([DumpNode(lambda i: None)({'i': task}), DumpNode(dump)({'i': loader})])
+    flow.run(validate=False)
+    assert out == [1, 2, 3]
+
+
+def test_batch_task_with_converter():
+    def total(s: Tuple[str, ...], i: Tuple[int, ...]) -> List[str]:
+        assert isinstance(s, tuple)
+        return [f'{a}{b}' for a, b in zip(s, i)]
+
+    node: BatchTaskNode[str] = BatchTaskNode(func=total, to_column=tuple)
+    node.set_upstream_node('s', str_loader_node())
+    node.set_upstream_node('i', LoaderNode(func=lambda: [1, 2, 3], batch_size=2))
+    node.add_succ()
+    assert node.get_or_produce_batch(batch_id=0).data == ['hi1', 'hello2']
+
+
+def test_batch_task_failure():
+    def fail(s: List[str]) -> List[int]:
+        raise ValueError()
+
+    node: BatchTaskNode[int] = BatchTaskNode(func=fail)
+    node.set_upstream_node('s', str_loader_node())
+    node.add_succ()
+    assert node.get_or_produce_batch(batch_id=0).data == [FaultItem(), FaultItem()]
+
+    node: BatchTaskNode[int] = BatchTaskNode(func=lambda s: [1])
+    node.set_upstream_node('s', str_loader_node())
+    node.add_succ()
+    with pytest.raises(AssertionError):
+        node.get_or_produce_batch(batch_id=0)
@@ -0,0 +1,123 @@
+import threading
+from typing import Dict, List
+
+import pytest
+
+from typedflow.flow import Flow
+from typedflow.nodes import DumpNode, LoaderNode, TaskNode
+from typedflow.plan import ExecutionPlan
+
+
+def load_int() -> List[int]:
+    return list(range(5))
+
+
+def load_short() -> List[int]:
+    return list(range(3))
+
+
+def increment(i: int) -> int:
+    return i + 1
+
+
+def add(a: int, b: int) -> int:
+    return a + b
+
+
+def test_topological_order():
+    loader: LoaderNode[int] = LoaderNode(func=load_int, batch_size=2)
+    a = TaskNode(increment)({'i': loader})
+    b = TaskNode(increment)({'i': a})
+    c = TaskNode(add)({'a': a, 'b': b})
+    dumper = DumpNode(print)({'a': c, 'b': loader})
+    plan = ExecutionPlan(dump_nodes=[dumper, ])
+    ids = [id(node) for node in plan.order]
+    assert len(ids) == 5
+    for node in plan.order:
+        for prec in getattr(node, 'precs', {}).values():
+            assert ids.index(id(prec)) < ids.index(id(node))
+    assert ids[-1] == id(dumper)
+
+
+def test_deep_chain_without_recursion():
+    out: List[int] = []
+
+    def dump(i: int) -> None:
+        out.append(i)
+
+    # deeper than the recursion limit if batches were pulled recursively
+    node = LoaderNode(func=load_int, batch_size=2)
+    for _ in range(500):
+        node = TaskNode(lambda i: i + 1)({'i': node})
+    flow = Flow([DumpNode(dump)({'i': node}), ])
+    flow.run(validate=False)
+    assert out == [500, 501, 502, 503, 504]
+
+
+def test_cache_is_released():
+    out: List[int] = []
+
+    def dump(a: int) -> None:
+        out.append(a)
+
+    long_loader: LoaderNode[int] = LoaderNode(func=load_int, batch_size=2)
+    short_loader: LoaderNode[int] = LoaderNode(func=load_short, batch_size=2)
+    inc = TaskNode(increment)({'i': long_loader})
+    both = TaskNode(add)({'a': inc, 'b': short_loader})
+    only_long = DumpNode(dump)({'a': inc})
+    only_short = DumpNode(dump)({'a': both})
+    flow = Flow([only_long, only_short])
+    flow.run()
+    assert out == [1, 2, 1, 3, 3, 4, 5, 5]
+    for node in [long_loader, short_loader, inc, both]:
+        assert len(node.cache_table) == 0
+
+
+def test_parallel_branches():
+    out: Dict[int, List[int]] = {k: [] for k in range(4)}
+    # every call waits for the ones of the other branches,
+    # which is broken (after timeout) if the branches run one after another
+    barrier: threading.Barrier = threading.Barrier(4, timeout=5)
+
+    def make_branch(k: int) -> DumpNode:
+        def slow(i: int) -> int:
+            barrier.wait()
+            return i * k
+
+        def dump(i: int) -> None:
+            out[k].append(i)
+        return DumpNode(dump)({'i': TaskNode(slow)({'i': loader})})
+
+    loader: LoaderNode[int] = LoaderNode(func=load_int, batch_size=5)
+    flow = Flow([make_branch(k) for k in range(4)])
+    flow.run(workers=4)
+    assert out == {k: [i * k for i in range(5)] for k in range(4)}
+    assert len(loader.cache_table) == 0
+
+
+def test_parallel_diamond():
+    out: List[int] = []
+
+    def dump(i: int) -> None:
+        out.append(i)
+
+    loader: LoaderNode[int] = LoaderNode(func=load_int, batch_size=2)
+    a = TaskNode(increment)({'i': loader})
+    b = TaskNode(increment)({'i': loader})
+    c = TaskNode(add)({'a': a, 'b': b})
+    short = TaskNode(add)({'a': c, 'b': LoaderNode(func=load_short, batch_size=2)})
+    flow = Flow([DumpNode(dump)({'i': c}), DumpNode(dump)({'i': short})])
+    flow.run(workers=3)
+    assert out == [2, 4, 2, 5, 6, 8, 8, 10]
+
+
+def test_parallel_error():
+    def fail(i: int) -> int:
+        raise ValueError()
+
+    loader: LoaderNode[int] = LoaderNode(func=load_int, batch_size=2)
+    dumpers = [DumpNode(print)({'i': TaskNode(fail)({'i': loader})}),
+               DumpNode(print)({'i': TaskNode(increment)({'i': loader})})]
+    flow = Flow(dumpers, debug=True)
+    with pytest.raises(ValueError):
+        flow.run(validate=False, workers=2)
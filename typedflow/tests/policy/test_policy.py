@@ -0,0 +1,164 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from typing import List
+
+import pytest
+
+from typedflow.batch import Batch
+from typedflow.exceptions import CircuitOpenError, FAULT
+from typedflow.nodes import LoaderNode, TaskNode
+from typedflow.policy import call_with_timeout, CircuitBreaker, Retry
+
+
+def test_retry_delays():
+    retry: Retry = Retry(attempts=4, on=(ValueError, ), backoff=1., factor=2., max_backoff=3.)
+    assert [retry.delay(i, ValueError()) for i in range(4)] == [1., 2., 3., None]
+    assert retry.delay(0, KeyError()) is None
+    assert retry.delay(0, CircuitOpenError()) is None
+
+
+def test_breaker():
+    breaker: CircuitBreaker = CircuitBreaker(threshold=0.5, window=4, cooldown=0.05)
+    for ok in [True, False, True, False]:
+        breaker.before()
+        breaker.record(ok)
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        breaker.before()
+    time.sleep(0.06)
+    breaker.before()  # a probe
+    with pytest.raises(CircuitOpenError):
+        breaker.before()
+    breaker.record(True)
+    assert breaker.state == 'closed'
+
+
+def test_call_with_timeout():
+    event: threading.Event = threading.Event()
+    assert call_with_timeout(lambda: 1, timeout=1.) == 1
+    with pytest.raises(TimeoutError):
+        call_with_timeout(event.wait, timeout=0.05)
+    # a new thread takes over the hung one
+    assert call_with_timeout(lambda: 2, timeout=1.) == 2
+    event.set()
+
+
+def loader(data: List[int]) -> LoaderNode[int]:
+    def load() -> List[int]:
+        return data
+    return LoaderNode(func=load, batch_size=len(data))
+
+
+def produce(node: TaskNode, data: List[int]) -> Batch:
+    node.set_upstream_node('i', loader(data))
+    node.add_succ()
+    return node.get_or_produce_batch(batch_id=0)
+
+
+def test_timeout():
+    event: threading.Event = threading.Event()
+
+    def hang(i: int) -> int:
+        if i == 0:
+            event.wait()
+        return i
+
+    batch: Batch = produce(TaskNode(func=hang, timeout=0.05), [1, 0, 2])
+    event.set()
+    assert batch.data == [1, FAULT, 2]
+    assert batch.reasons[1].startswith('TimeoutError')
+
+
+def test_retry():
+    calls: List[int] = []
+
+    def flaky(i: int) -> int:
+        calls.append(i)
+        if calls.count(i) < 3:
+            raise ConnectionError()
+        return i
+
+    batch: Batch = produce(TaskNode(func=flaky, retry=Retry(attempts=3, backoff=0.)), [1, 2])
+    assert batch.data == [1, 2]
+    assert len(calls) == 6
+
+
+def test_retry_with_executor():
+    calls: List[int] = []
+
+    def flaky(i: int) -> int:
+        calls.append(i)
+        if calls.count(i) < 2:
+            raise ConnectionError()
+        return i
+
+    with ThreadPoolExecutor(2) as executor:
+        node: TaskNode[int] = TaskNode(func=flaky, executor=executor,
+                                       retry=Retry(attempts=2, backoff=0.))
+        assert produce(node, [1, 2, 3]).data == [1, 2, 3]
+
+
+def test_breaker_fails_fast():
+    calls: List[int] = []
+
+    def down(i: int) -> int:
+        calls.append(i)
+        raise ConnectionError()
+
+    node: TaskNode[int] = TaskNode(func=down, breaker=CircuitBreaker(window=4, cooldown=60.))
+    batch: Batch = produce(node, list(range(100)))
+    assert batch.data == [FAULT] * 100
+    assert len(calls) == 4
+    assert batch.reasons[99].startswith('CircuitOpenError')
+
+
+def test_timeout_with_executor():
+    # only the hanging item of a chunk times out
+    event: threading.Event = threading.Event()
+
+    def hang(i: int) -> int:
+        if i == 0:
+            event.wait()
+        return i
+
+    with ThreadPoolExecutor(2) as executor:
+        node: TaskNode[int] = TaskNode(func=hang, executor=executor, chunksize=3, timeout=0.05)
+        batch: Batch = produce(node, [1, 0, 2, 3])
+        event.set()
+    assert batch.data == [1, FAULT, 2, 3]
+    assert batch.reasons[1].startswith('TimeoutError')
+
+
+def test_breaker_with_executor_fails_fast():
+    calls: List[int] = []
+
+    def down(i: int) -> int:
+        calls.append(i)
+        raise ConnectionError()
+
+    with ThreadPoolExecutor(2) as executor:
+        node: TaskNode[int] = TaskNode(func=down, executor=executor, chunksize=2,
+                                       breaker=CircuitBreaker(window=4, cooldown=60.))
+        batch: Batch = produce(node, list(range(100)))
+    assert batch.data == [FAULT] * 100
+    # 4 chunks open the circuit, and one more may be running then
+    assert len(calls) <= 5 * 2
+    assert batch.reasons[99].startswith('CircuitOpenError')
+
+
+def test_async_timeout():
+    async def slow(i: int) -> int:
+        await asyncio.sleep(i)
+        return i
+
+    node: TaskNode[int] = TaskNode(func=slow, timeout=0.05)
+    node.set_upstream_node('i', loader([0, 10]))
+    node.add_succ()
+
+    async def run() -> Batch:
+        return await node.aget_or_produce_batch(batch_id=0, semaphore=asyncio.Semaphore(2))
+    batch: Batch = asyncio.run(run())
+    assert batch.data == [0, FAULT]
+    assert batch.reasons[1].startswith('TimeoutError')
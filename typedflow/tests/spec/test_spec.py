@@ -0,0 +1,62 @@
+import json
+from pathlib import Path
+import subprocess
+import sys
+from typing import List
+
+import pytest
+
+from typedflow.spec import FlowSpec, main, NodeSpec
+
+
+def load() -> List[int]:
+    return list(range(5))
+
+
+def square(i: int) -> int:
+    return i * i
+
+
+def declare(out: Path) -> FlowSpec:
+    return FlowSpec(nodes={
+        'load': NodeSpec(kind='LoaderNode', func=f'{__name__}:load', params={'batch_size': 2}),
+        'square': NodeSpec(kind='TaskNode', func=f'{__name__}:square', inputs={'i': 'load'}),
+        'out': NodeSpec(kind='JsonlDumpNode', inputs={'square': 'square'}, params={'path': str(out)}),
+    })
+
+
+def test_run(tmp_path: Path):
+    declare(tmp_path / 'out.jsonl').run()
+    assert [json.loads(line)['square'] for line in (tmp_path / 'out.jsonl').read_text().splitlines()]\
+        == [0, 1, 4, 9, 16]
+
+
+def test_save_and_main(tmp_path: Path):
+    declare(tmp_path / 'out.jsonl').save(tmp_path / 'flow.json')
+    assert FlowSpec.load(tmp_path / 'flow.json') == declare(tmp_path / 'out.jsonl')
+    main([str(tmp_path / 'flow.json')])
+    assert len((tmp_path / 'out.jsonl').read_text().splitlines()) == 5
+
+
+def test_imports_on_build(tmp_path: Path):
+    spec: FlowSpec = FlowSpec.from_dict({'nodes': {
+        'load': {'kind': 'LoaderNode', 'func': 'heavy_module_not_imported:load'},
+        'out': {'kind': 'typedflow.nodes:DumpNode', 'func': 'heavy_module_not_imported:dump',
+                'inputs': {'x': 'load'}},
+    }})
+    spec.save(tmp_path / 'flow.json')
+    assert 'heavy_module_not_imported' not in sys.modules
+    with pytest.raises(ModuleNotFoundError):
+        spec.build()
+
+
+def test_unknown_input():
+    with pytest.raises(AssertionError):
+        FlowSpec(nodes={'out': NodeSpec(kind='DumpNode', func=f'{__name__}:square', inputs={'i': 'load'})})
+
+
+def test_task_imports_lazily():
+    # a fresh interpreter, because other tests import them
+    code: str = ('import sys; from typedflow.nodes import TaskNode; import typedflow.flow; '
+                 'print(sorted({"numpy", "sqlite3", "typedflow.memo", "typedflow.transport"} & set(sys.modules)))')
+    assert subprocess.check_output([sys.executable, '-c', code], text=True).strip() == '[]'
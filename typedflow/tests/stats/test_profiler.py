@@ -0,0 +1,58 @@
+import json
+from typing import Dict, List
+
+from typedflow.flow import Flow
+from typedflow.nodes import DumpNode, LoaderNode, TaskNode
+from typedflow.stats import NodeStats, Profiler
+
+
+def build() -> Flow:
+    def load() -> List[int]:
+        return list(range(5))
+
+    def invert(i: int) -> float:
+        return 1 / i
+
+    def dump(x: float) -> None:
+        pass
+
+    loader: LoaderNode[int] = LoaderNode(func=load, batch_size=2)
+    task: TaskNode[float] = TaskNode(func=invert)
+    task.set_upstream_node('i', loader)
+    dump_node: DumpNode = DumpNode(func=dump)
+    dump_node.set_upstream_node('x', task)
+    return Flow(dump_nodes=[dump_node])
+
+
+def test_stats():
+    flow: Flow = build()
+    assert flow.stats() == dict()
+    flow.run(profile=True)
+    stats: Dict[str, NodeStats] = flow.stats()
+    loader, task, dump = [stats[name] for name in sorted(stats)]
+    assert loader.name.endswith('load')
+    assert (loader.batches, loader.items, loader.faults) == (3, 5, 0)
+    assert (task.batches, task.items, task.faults) == (3, 5, 1)  # 1 / 0
+    assert (dump.batches, dump.items, dump.faults) == (3, 5, 1)
+    assert sum(task.latency) == 3
+    assert task.cache_hits == 3
+    assert task.cache_misses == 0
+    assert task.wall_time > 0
+    assert task.items_per_sec() > 0
+
+
+def test_no_stats_without_profile():
+    flow: Flow = build()
+    flow.run()
+    assert flow.stats() == dict()
+
+
+def test_sink(tmp_path):
+    path = tmp_path / 'stats.jsonl'
+    flow: Flow = build()
+    flow.run(profile=Profiler(sink=path, interval=0.), prefetch=1)
+    lines: List[dict] = [json.loads(line) for line in path.read_text().splitlines()]
+    # every batch and the end of the run
+    assert [line['batch_id'] for line in lines[:3]] == [0, 1, 2]
+    assert lines[-1]['batch_id'] is None
+    assert sum([stats['items'] for stats in lines[-1]['nodes'].values()]) == 15
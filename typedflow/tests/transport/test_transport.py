@@ -0,0 +1,173 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
+import pickle
+from typing import Any, List
+
+import pytest
+
+from typedflow.batch import Batch
+from typedflow.exceptions import FAULT
+from typedflow.flow import Flow
+from typedflow.nodes import DumpNode, LoaderNode, TaskNode
+from typedflow.transport import Shared, ShmTransport
+
+
+@pytest.fixture
+def transport(tmp_path) -> ShmTransport:
+    return ShmTransport(directory=tmp_path, min_size=16)
+
+
+def test_bytes(transport: ShmTransport):
+    payload: bytes = b'x' * 1000
+    handle: Shared = transport.export(payload)
+    assert isinstance(handle, Shared)
+    assert len(pickle.dumps(handle)) < 200
+    assert transport.resolve(handle) == payload
+    assert transport.export(b'small') == b'small'
+    transport.remove([handle.path])
+    assert os.listdir(transport.directory) == []
+
+
+def test_memoryview(tmp_path):
+    transport: ShmTransport = ShmTransport(directory=tmp_path, min_size=1, copy_bytes=False)
+    view: memoryview = transport.resolve(transport.export(b'abc'))
+    assert isinstance(view, memoryview)
+    assert view.tobytes() == b'abc'
+
+
+def test_ndarray(transport: ShmTransport):
+    numpy = pytest.importorskip('numpy')
+    arr = numpy.arange(100, dtype='float32').reshape(10, 10)
+    handle, new = transport.share(arr[:, ::2])  # not contiguous
+    assert new
+    mapped = transport.resolve(handle)
+    assert (mapped == arr[:, ::2]).all()
+    # sent again by the same handle without a new file
+    assert transport.share(mapped) == (handle, False)
+    forwarded, holds = transport.share(mapped, retain=True)
+    assert forwarded == handle and holds
+    assert os.listdir(transport.directory) == [os.path.basename(handle.path)]
+    # the file is removed when both the holders release it
+    transport.remove([handle.path])
+    assert (transport.resolve(forwarded) == arr[:, ::2]).all()
+    transport.remove([forwarded.path])
+    assert os.listdir(transport.directory) == []
+    # written again if the file is already removed
+    rewritten, new = transport.share(mapped)
+    assert new and (transport.resolve(rewritten) == arr[:, ::2]).all()
+
+
+def reverse(b: bytes) -> bytes:
+    return bytes(reversed(b))
+
+
+def test_task(transport: ShmTransport):
+    def load() -> List[bytes]:
+        return [bytes([i]) * 100 for i in range(4)]
+
+    loader: LoaderNode[bytes] = LoaderNode(func=load, batch_size=4)
+    with ProcessPoolExecutor(2) as executor:
+        node: TaskNode[bytes] = TaskNode(func=reverse, executor=executor,
+                                         chunksize=2, transport=transport)
+        node.set_upstream_node('b', loader)
+        node.add_succ()
+        assert node.produce_batch(batch_id=0).data == load()
+    # inputs are removed after the chunks, and results after they are read
+    assert len(os.listdir(transport.directory)) == 4
+    batch: Batch = node.get_or_produce_batch(batch_id=0)
+    assert batch.data == load()
+    assert os.listdir(transport.directory) == []
+
+
+def double(arr):
+    return arr * 2
+
+
+def identity(arr):
+    return arr
+
+
+def test_forward_ndarray(transport: ShmTransport):
+    numpy = pytest.importorskip('numpy')
+
+    def load() -> List[Any]:
+        return [numpy.full(100, i, dtype='float32') for i in range(4)]
+
+    loader: LoaderNode = LoaderNode(func=load, batch_size=4)
+    with ProcessPoolExecutor(2) as executor:
+        first: TaskNode = TaskNode(func=double, executor=executor, transport=transport)
+        first.set_upstream_node('arr', loader)
+        # forwards arrays mapped from the files of the first task
+        second: TaskNode = TaskNode(func=identity, executor=executor, transport=transport)
+        second.set_upstream_node('arr', first)
+        second.add_succ()
+        batch: Batch = second.produce_batch(batch_id=0)
+    assert batch.faults == 0
+    for i, arr in enumerate(batch.data):
+        assert (arr == 2 * i).all()
+    # the arrays are sent back by the handles of the files of the first task
+    assert len(os.listdir(transport.directory)) == 4
+    second.get_or_produce_batch(batch_id=0)
+    assert os.listdir(transport.directory) == []
+
+
+def test_forward_ndarray_without_new_files(transport: ShmTransport):
+    numpy = pytest.importorskip('numpy')
+
+    def load() -> List[Any]:
+        return [numpy.full(100, i, dtype='float32') for i in range(4)]
+
+    loader: LoaderNode = LoaderNode(func=load, batch_size=4)
+    with ProcessPoolExecutor(2) as executor:
+        first: TaskNode = TaskNode(func=double, executor=executor, transport=transport)
+        first.set_upstream_node('arr', loader)
+        first.add_succ()
+        produced: Batch = first.produce_batch(batch_id=0)
+        n_files: int = len(os.listdir(transport.directory))
+        assert n_files == 4
+        # arrays mapped from the files are forwarded to another task
+        second: TaskNode = TaskNode(func=identity, executor=executor, transport=transport)
+        second.set_upstream_node('arr', LoaderNode(func=lambda: produced.data, batch_size=4))
+        second.add_succ()
+        batch: Batch = second.produce_batch(batch_id=0)
+        assert len(os.listdir(transport.directory)) == n_files
+    for i, arr in enumerate(batch.data):
+        assert (arr == 2 * i).all()
+    # the files are removed when both the products are read
+    first.get_or_produce_batch(batch_id=0)
+    assert len(os.listdir(transport.directory)) == n_files
+    second.get_or_produce_batch(batch_id=0)
+    assert os.listdir(transport.directory) == []
+
+
+def test_missing_file(transport: ShmTransport):
+    def load() -> List[Shared]:
+        return [Shared(path=os.path.join(transport.directory, 'missing'), kind='bytes', size=100),
+                b'x' * 100]
+
+    loader: LoaderNode = LoaderNode(func=load, batch_size=2)
+    with ProcessPoolExecutor(1) as executor:
+        node: TaskNode[bytes] = TaskNode(func=reverse, executor=executor, transport=transport)
+        node.set_upstream_node('b', loader)
+        node.add_succ()
+        batch: Batch = node.produce_batch(batch_id=0)
+    # only the row whose file is missing fails
+    assert batch.data == [FAULT, b'x' * 100]
+    assert batch.reasons[0].startswith('FileNotFoundError')
+
+
+def test_flow_closes():
+    def load() -> List[bytes]:
+        return [bytes([i]) * 100 for i in range(4)]
+
+    transport: ShmTransport = ShmTransport(min_size=16)
+    loader: LoaderNode[bytes] = LoaderNode(func=load, batch_size=2)
+    with ProcessPoolExecutor(1) as executor:
+        task: TaskNode[bytes] = TaskNode(func=reverse, executor=executor, transport=transport)
+        task.set_upstream_node('b', loader)
+        dumped: List[bytes] = []
+        dump: DumpNode = DumpNode(func=lambda b: dumped.append(b))
+        dump.set_upstream_node('b', task)
+        Flow(dump_nodes=[dump]).run(validate=False)
+    assert dumped == load()
+    assert not os.path.exists(transport.directory)
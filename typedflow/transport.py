@@ -0,0 +1,227 @@
+"""
+Passing large payloads to worker processes by handles of memory-mapped files
+instead of pickling them through pipes
+"""
+from dataclasses import dataclass, field
+import logging
+import mmap
+import os
+from pathlib import Path
+import shutil
+import sys
+import tempfile
+import threading
+import uuid
+import weakref
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+__all__ = ['Shared', 'ShmTransport']
+logger = logging.getLogger(__file__)
+# id of an array mapped from a file -> (weakref to it, its handle).
+# An array passed on to another process is sent by the same handle
+# without copying it.
+_views: Dict[int, Tuple[weakref.ref, 'Shared']] = dict()
+_views_lock: threading.Lock = threading.Lock()
+# path of a file -> the number of its holders besides the first one
+# (in the process which removes files)
+_refs: Dict[str, int] = dict()
+_refs_lock: threading.Lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Shared:
+    """
+    Handle of a payload written in a file. Only this is pickled.
+    """
+    path: str
+    kind: str  # 'bytes' or 'ndarray'
+    size: int
+    dtype: Optional[str] = None
+    shape: Tuple[int, ...] = ()
+
+    def open(self, copy_bytes: bool = True) -> Any:
+        """
+        Map the file. Arrays are views of the mapping (copy-on-write),
+        and bytes are copied unless copy_bytes is False (then a memoryview).
+        """
+        with open(self.path, 'rb') as fin:
+            mm: mmap.mmap = mmap.mmap(fin.fileno(), self.size, access=mmap.ACCESS_COPY)
+        if self.kind == 'bytes':
+            if not copy_bytes:
+                return memoryview(mm)
+            with mm:
+                return mm[:]
+        import numpy
+        arr: Any = numpy.frombuffer(mm, dtype=numpy.dtype(self.dtype)).reshape(self.shape)
+        key: int = id(arr)
+        with _views_lock:
+            _views[key] = (weakref.ref(arr, lambda _: _forget(key)), self)
+        return arr
+
+
+def _forget(key: int) -> None:
+    with _views_lock:
+        _views.pop(key, None)
+
+
+def _origin(value: Any) -> Optional[Shared]:
+    with _views_lock:
+        entry: Optional[Tuple[weakref.ref, Shared]] = _views.get(id(value))
+    if entry is None or entry[0]() is not value:
+        return None
+    return entry[1]
+
+
+@dataclass
+class ShmTransport:
+    """
+    Arrays (numpy.ndarray) and bytes of at least min_size bytes are written
+    once into files under directory (in /dev/shm, i.e. memory, if available)
+    and sent as `Shared` handles. Receivers map the files, so arrays are
+    not copied at all, and an array received from a file is sent on
+    by the same handle (while the file exists) without a new file.
+    A file may have several holders (see `retain`), and it is removed
+    when all of them have called `remove`.
+
+    The transport is pickled to workers with the directory,
+    so all the processes share it. Files are removed by `remove`
+    (TaskNode does it when its product leaves the cache table)
+    and the directory by `close` (Flow does it at the end of a run).
+
+    Parameters
+    -----
+    directory
+        A new temporary directory by default
+    min_size
+        Smaller payloads are pickled as usual
+    copy_bytes
+        Deliver bytes as bytes (copied once from the mapping).
+        Otherwise as memoryview without copying.
+    """
+    directory: Optional[Path] = None
+    min_size: int = 1 << 16
+    copy_bytes: bool = True
+    _own_directory: bool = field(default=False, repr=False)
+
+    def __post_init__(self):
+        assert self.min_size > 0, 'min_size should be positive'
+        if self.directory is None:
+            base: Optional[str] = '/dev/shm' if os.path.isdir('/dev/shm') else None
+            self.directory: Path = Path(tempfile.mkdtemp(prefix='typedflow-', dir=base))
+            self._own_directory: bool = True
+
+    def _new_path(self) -> str:
+        os.makedirs(self.directory, exist_ok=True)  # in case it is closed and used again
+        return os.path.join(self.directory, uuid.uuid4().hex)
+
+    def _write(self, payload: Any) -> str:
+        path: str = self._new_path()
+        with open(path, 'wb') as fout:
+            fout.write(payload)
+        return path
+
+    def share(self,
+              value: Any,
+              retain: bool = False) -> Tuple[Any, bool]:
+        """
+        Return the handle of value (or value itself if it is not shared)
+        and whether the caller holds its file (i.e. has to `remove` it).
+        A file is written unless value is an array mapped from a file
+        which still exists. Then the file is held by the caller if retain is True.
+        """
+        if isinstance(value, (bytes, bytearray)) and len(value) >= self.min_size:
+            return Shared(path=self._write(value), kind='bytes', size=len(value)), True
+        # value cannot be an array unless numpy has been imported (by the caller)
+        numpy: Any = sys.modules.get('numpy')
+        if numpy is not None and isinstance(value, numpy.ndarray)\
+                and value.nbytes >= self.min_size and not value.dtype.hasobject:
+            origin: Optional[Shared] = _origin(value)
+            if origin is not None and (self.retain(origin.path) if retain else os.path.exists(origin.path)):
+                return origin, retain
+            value = numpy.ascontiguousarray(value)
+            return Shared(path=self._write(memoryview(value).cast('B')), kind='ndarray',
+                          size=value.nbytes, dtype=value.dtype.str, shape=value.shape), True
+        return value, False
+
+    def export(self, value: Any) -> Any:
+        return self.share(value)[0]
+
+    def resolve(self, value: Any) -> Any:
+        """
+        The payload of a handle (other values as they are)
+        """
+        if isinstance(value, Shared):
+            return value.open(copy_bytes=self.copy_bytes)
+        return value
+
+    def export_rows(self,
+                    rows: Iterable[Tuple[Any, ...]]) -> Tuple[List[Tuple[Any, ...]], List[str]]:
+        """
+        Rows with their payloads replaced by handles, and the files held for them
+        (written, or retained so that they are not removed while the rows are sent)
+        """
+        held: List[str] = []
+        exported: List[Tuple[Any, ...]] = []
+        for args in rows:
+            shared: List[Any] = []
+            for arg in args:
+                if isinstance(arg, Shared):
+                    handle, holds = arg, self.retain(arg.path)
+                else:
+                    handle, holds = self.share(arg, retain=True)
+                shared.append(handle)
+                if holds:
+                    held.append(handle.path)
+            exported.append(tuple(shared))
+        return exported, held
+
+    def resolve_row(self,
+                    args: Tuple[Any, ...]) -> Tuple[Any, ...]:
+        return tuple([self.resolve(arg) for arg in args])
+
+    def resolve_rows(self,
+                     rows: Iterable[Tuple[Any, ...]]) -> List[Tuple[Any, ...]]:
+        return [self.resolve_row(args) for args in rows]
+
+    @staticmethod
+    def retain(path: str) -> bool:
+        """
+        Add a holder of the file unless it is already removed.
+        Return whether it is added.
+        """
+        with _refs_lock:
+            if not os.path.exists(path):
+                return False
+            _refs[path] = _refs.get(path, 0) + 1
+            return True
+
+    @staticmethod
+    def remove(paths: Iterable[str]) -> None:
+        """
+        Release files, which are removed when no one else holds them.
+        Mappings which are already open stay valid.
+        """
+        with _refs_lock:
+            for path in paths:
+                n: int = _refs.pop(path, 0)
+                if n > 1:
+                    _refs[path] = n - 1
+                if n > 0:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def close(self) -> None:
+        """
+        Remove the directory if it is created by the transport.
+        Called by Flow at the end of a run.
+        """
+        if self._own_directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            prefix: str = os.path.join(self.directory, '')
+            with _refs_lock:
+                for path in [path for path in _refs if path.startswith(prefix)]:
+                    del _refs[path]
@@ -1,10 +1,15 @@
 """
-Utilities class
+Utilities class.
+For writing many batches into a file, dump nodes in
+`typedflow.nodes.sink` (e.g. JsonlDumpNode) are faster.
 """
+import importlib
 from pathlib import Path
-from typing import Callable, List
+from typing import Any, Callable, List
 
-from typedflow.typedflow import Batch, FaultItem, T
+from typedflow.batch import Batch
+from typedflow.exceptions import FaultItem
+from typedflow.types import T
 
 
 def dump_to_each_file(batch: Batch[T],
@@ -24,8 +29,7 @@ def dump_to_each_file(batch: Batch[T],
     data: List[str] = [item.to_json() for item in batch.data
                        if not isinstance(item, FaultItem)]
     with open(path, 'w') as fout:
-        for js in data:
-            fout.write(js + '\n')
+        fout.write(''.join([js + '\n' for js in data]))
 
 
 def dump_to_one_file(batch: Batch[T],
@@ -37,11 +41,24 @@ def dump_to_one_file(batch: Batch[T],
     data: List[str] = [item.to_json() for item in batch.data
                        if not isinstance(item, FaultItem)]
     with open(path, 'a') as fout:
-        for js in data:
-            fout.write(js + '\n')
+        fout.write(''.join([js + '\n' for js in data]))
 
 
 def dump_print(batch: Batch[T]) -> None:
     for item in batch.data:
         if not isinstance(item, FaultItem):
             print(item)
+
+
+def import_string(path: str) -> Any:
+    """
+    Import an object from 'package.module:name' (or 'package.module.name')
+    """
+    if ':' in path:
+        module, name = path.split(':', 1)
+    else:
+        module, _, name = path.rpartition('.')
+    obj: Any = importlib.import_module(module)
+    for attr in name.split('.'):
+        obj = getattr(obj, attr)
+    return obj